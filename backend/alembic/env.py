@@ -1,11 +1,12 @@
 from logging.config import fileConfig
 
-from sqlalchemy import engine_from_config
+from sqlalchemy import engine_from_config, inspect
 from sqlalchemy import pool
 
 from alembic import context
 
 # Import your models Base
+from app.config import settings
 from app.database import Base
 from app.models import User, RefreshToken, Prescription
 
@@ -13,6 +14,10 @@ from app.models import User, RefreshToken, Prescription
 # access to the values within the .ini file in use.
 config = context.config
 
+# Migrate the database the app is configured for (DATABASE_URL), not just
+# the default in alembic.ini; "%" is escaped for the ini interpolation
+config.set_main_option("sqlalchemy.url", settings.DATABASE_URL.replace("%", "%%"))
+
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
 if config.config_file_name is not None:
@@ -52,6 +57,25 @@ def run_migrations_offline() -> None:
         context.run_migrations()
 
 
+def stamp_unversioned_database(connection) -> None:
+    """Stamp databases created by the app's old import-time create_all.
+
+    They have the tables but no alembic_version, so upgrading would try to
+    create `users` again. The old create_all made the schema of revision
+    001, or 6130bece6316 once the models had structured_data.
+    """
+    migration_context = context.get_context()
+    if migration_context.get_current_heads():
+        return
+    inspector = inspect(connection)
+    if not inspector.has_table("users"):
+        return
+    columns = {column["name"] for column in inspector.get_columns("prescriptions")}
+    revision = "6130bece6316" if "structured_data" in columns else "001"
+    print(f"Existing tables without an Alembic version: stamping {revision}")
+    migration_context.stamp(context.script, revision)
+
+
 def run_migrations_online() -> None:
     """Run migrations in 'online' mode.
 
@@ -71,6 +95,7 @@ def run_migrations_online() -> None:
         )
 
         with context.begin_transaction():
+            stamp_unversioned_database(connection)
             context.run_migrations()
 
 
@@ -0,0 +1,68 @@
+"""add_change_sequence_for_delta_sync
+
+Revision ID: 7b2d9e4c1a53
+Revises: 6130bece6316
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2d9e4c1a53'
+down_revision: Union[str, None] = '6130bece6316'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Monotonic change sequence on prescriptions for /prescriptions/changes
+    op.add_column('prescriptions', sa.Column('change_seq', sa.Integer(), nullable=True))
+    op.create_index(
+        'ix_prescriptions_user_id_change_seq', 'prescriptions', ['user_id', 'change_seq'], unique=False
+    )
+
+    # Deleted prescriptions, so device caches can drop them
+    op.create_table(
+        'prescription_tombstones',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('prescription_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('change_seq', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_prescription_tombstones_id'), 'prescription_tombstones', ['id'], unique=False)
+    op.create_index(
+        'ix_prescription_tombstones_user_id_change_seq',
+        'prescription_tombstones',
+        ['user_id', 'change_seq'],
+        unique=False
+    )
+
+    # Single-row counter the sequence numbers are drawn from
+    op.create_table(
+        'change_sequence',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # Existing rows get their id as sequence number, in creation order
+    op.execute("UPDATE prescriptions SET change_seq = id")
+    op.execute(
+        "INSERT INTO change_sequence (id, value) "
+        "SELECT 1, COALESCE(MAX(id), 0) FROM prescriptions"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('change_sequence')
+    op.drop_index('ix_prescription_tombstones_user_id_change_seq', table_name='prescription_tombstones')
+    op.drop_index(op.f('ix_prescription_tombstones_id'), table_name='prescription_tombstones')
+    op.drop_table('prescription_tombstones')
+    op.drop_index('ix_prescriptions_user_id_change_seq', table_name='prescriptions')
+    op.drop_column('prescriptions', 'change_seq')
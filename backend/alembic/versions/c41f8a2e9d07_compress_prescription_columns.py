@@ -0,0 +1,66 @@
+"""compress_prescription_columns_and_add_archive
+
+Revision ID: c41f8a2e9d07
+Revises: 7b2d9e4c1a53
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41f8a2e9d07'
+down_revision: Union[str, None] = '7b2d9e4c1a53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # analysis and structured_data now hold zstd-compressed bytes. SQLite
+    # columns are dynamically typed, so existing TEXT values simply stay
+    # readable as legacy rows (`python -m app.cli compact` rewrites them).
+    if op.get_bind().dialect.name != 'sqlite':
+        op.alter_column(
+            'prescriptions', 'analysis', type_=sa.LargeBinary(),
+            postgresql_using="convert_to(analysis, 'UTF8')"
+        )
+        op.alter_column(
+            'prescriptions', 'structured_data', type_=sa.LargeBinary(),
+            postgresql_using="convert_to(structured_data::text, 'UTF8')"
+        )
+
+    # Cold storage for old prescriptions
+    op.create_table(
+        'prescriptions_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('filename', sa.String(), nullable=False),
+        sa.Column('analysis', sa.LargeBinary(), nullable=True),
+        sa.Column('structured_data', sa.LargeBinary(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('change_seq', sa.Integer(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        op.f('ix_prescriptions_archive_user_id'), 'prescriptions_archive', ['user_id'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_prescriptions_archive_user_id'), table_name='prescriptions_archive')
+    op.drop_table('prescriptions_archive')
+    # Compressed values are not converted back; run this only on data
+    # written before the upgrade.
+    if op.get_bind().dialect.name != 'sqlite':
+        op.alter_column(
+            'prescriptions', 'structured_data', type_=sa.JSON(),
+            postgresql_using="convert_from(structured_data, 'UTF8')::json"
+        )
+        op.alter_column(
+            'prescriptions', 'analysis', type_=sa.String(),
+            postgresql_using="convert_from(analysis, 'UTF8')"
+        )
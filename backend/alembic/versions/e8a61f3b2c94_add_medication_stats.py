@@ -0,0 +1,46 @@
+"""add_medication_stats_tables
+
+Revision ID: e8a61f3b2c94
+Revises: c41f8a2e9d07
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8a61f3b2c94'
+down_revision: Union[str, None] = 'c41f8a2e9d07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Running totals behind /prescriptions/stats. Existing history is not
+    # counted until `python -m app.cli rebuild-stats` has been run.
+    op.create_table(
+        'user_medication_stats',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('drug_key', sa.String(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('prescriptions', sa.Integer(), nullable=False),
+        sa.Column('total_units', sa.Integer(), nullable=False),
+        sa.Column('last_prescribed', sa.Date(), nullable=True),
+        sa.Column('active_until', sa.Date(), nullable=True),
+        sa.PrimaryKeyConstraint('user_id', 'drug_key')
+    )
+    op.create_table(
+        'user_monthly_stats',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('month', sa.String(length=7), nullable=False),
+        sa.Column('prescriptions', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'month')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('user_monthly_stats')
+    op.drop_table('user_medication_stats')
@@ -0,0 +1,48 @@
+"""add_model_usage_table
+
+Revision ID: f3c7a9d21b58
+Revises: e8a61f3b2c94
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c7a9d21b58'
+down_revision: Union[str, None] = 'e8a61f3b2c94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # One row per model call made by /prescriptions/analyze
+    op.create_table(
+        'model_usage',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('prescription_id', sa.Integer(), nullable=True),
+        sa.Column('model', sa.String(), nullable=False),
+        sa.Column('prompt_tokens', sa.Integer(), nullable=False),
+        sa.Column('output_tokens', sa.Integer(), nullable=False),
+        sa.Column('total_tokens', sa.Integer(), nullable=False),
+        sa.Column('image_bytes', sa.Integer(), nullable=False),
+        sa.Column('model_ms', sa.Float(), nullable=False),
+        sa.Column('queue_ms', sa.Float(), nullable=False),
+        sa.Column('cost', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_model_usage_id'), 'model_usage', ['id'], unique=False)
+    op.create_index(op.f('ix_model_usage_prescription_id'), 'model_usage', ['prescription_id'], unique=False)
+    op.create_index('ix_model_usage_user_id_created_at', 'model_usage', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_model_usage_user_id_created_at', table_name='model_usage')
+    op.drop_index(op.f('ix_model_usage_prescription_id'), table_name='model_usage')
+    op.drop_index(op.f('ix_model_usage_id'), table_name='model_usage')
+    op.drop_table('model_usage')
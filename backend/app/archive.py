@@ -0,0 +1,98 @@
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, select, type_coerce, update
+from sqlalchemy.orm import Session
+from sqlalchemy.types import NullType
+from app.compression import decompress, is_compressed
+from app.models import Prescription, PrescriptionArchive
+
+# Moves old prescriptions into prescriptions_archive and rewrites legacy
+# uncompressed rows. Both work in id-ordered batches with plain Core
+# statements: archiving is not a deletion as far as device sync is
+# concerned, so it must not produce tombstones or change sequence bumps.
+
+_COLUMNS = ["id", "user_id", "filename", "analysis", "structured_data", "created_at", "change_seq"]
+
+def archive_older_than(db: Session, days: int, batch_size: int = 500) -> tuple[int, set[int]]:
+    """
+    Move prescriptions created more than `days` ago to the archive table.
+    Returns the number moved and the ids of the users they belong to.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    table = Prescription.__table__
+    moved = 0
+    user_ids: set[int] = set()
+    while True:
+        rows = db.execute(
+            select(table.c.id, table.c.user_id)
+            .where(table.c.created_at < cutoff)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return moved, user_ids
+        ids = [row.id for row in rows]
+        user_ids.update(row.user_id for row in rows)
+
+        db.execute(
+            insert(PrescriptionArchive.__table__).from_select(
+                _COLUMNS,
+                select(*[table.c[name] for name in _COLUMNS]).where(table.c.id.in_(ids))
+            )
+        )
+        db.execute(delete(table).where(table.c.id.in_(ids)))
+        db.commit()
+        moved += len(ids)
+
+def compact_legacy_rows(db: Session, batch_size: int = 500) -> int:
+    """Compress rows written before the columns were compressed."""
+    table = Prescription.__table__
+    rewritten = 0
+    last_id = 0
+    while True:
+        # Coerce to NullType to see the stored values, not the decoded ones
+        rows = db.execute(
+            select(
+                table.c.id,
+                type_coerce(table.c.analysis, NullType()).label("analysis"),
+                type_coerce(table.c.structured_data, NullType()).label("structured_data"),
+            )
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return rewritten
+
+        for row in rows:
+            legacy = {}
+            if row.analysis is not None and not is_compressed(row.analysis):
+                legacy["analysis"] = decompress(row.analysis).decode("utf-8")
+            if row.structured_data is not None and not is_compressed(row.structured_data):
+                # Legacy JSON "null" becomes SQL NULL here
+                legacy["structured_data"] = json.loads(decompress(row.structured_data))
+            if legacy:
+                # Binding through the column types compresses the values
+                db.execute(update(table).where(table.c.id == row.id).values(**legacy))
+                rewritten += 1
+        db.commit()
+        last_id = rows[-1].id
+
+def storage_report(db: Session) -> dict:
+    """Stored bytes of the large columns, live and archived."""
+    report = {}
+    for name, model in (("prescriptions", Prescription), ("prescriptions_archive", PrescriptionArchive)):
+        table = model.__table__
+        rows, analysis_bytes, structured_bytes = db.execute(
+            select(
+                func.count(),
+                func.coalesce(func.sum(func.length(table.c.analysis)), 0),
+                func.coalesce(func.sum(func.length(table.c.structured_data)), 0),
+            )
+        ).one()
+        report[name] = {
+            "rows": rows,
+            "analysis_bytes": analysis_bytes,
+            "structured_data_bytes": structured_bytes,
+        }
+    return report
@@ -1,7 +1,6 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
@@ -9,16 +8,33 @@ from app.config import settings
 from app.database import get_db
 from app.models import User, RefreshToken
 from app.schemas import TokenData
+from app import hashing
 import secrets
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    return hashing.check_password(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+    return hashing.hash_password(password, settings.BCRYPT_ROUNDS)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the hashing process pool."""
+    return await hashing.check_password_async(plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the hashing process pool."""
+    return await hashing.hash_password_async(password)
+
+async def rehash_password(plain_password: str, hashed_password: str) -> Optional[str]:
+    """
+    A new hash of a verified password if it was stored with a different
+    cost factor, else None.
+    """
+    if not hashing.needs_rehash(hashed_password):
+        return None
+    return await get_password_hash_async(plain_password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -73,6 +89,14 @@ async def get_current_user(
     
     return user
 
+def authenticate_token(token: str, db: Session) -> Optional[User]:
+    """Resolve an access token outside the Depends chain (e.g. for WebSockets)."""
+    try:
+        token_data = verify_token(token, HTTPException(status_code=status.HTTP_401_UNAUTHORIZED))
+    except HTTPException:
+        return None
+    return db.query(User).filter(User.username == token_data.username).first()
+
 def verify_refresh_token(token: str, db: Session) -> Optional[User]:
     db_token = db.query(RefreshToken).filter(RefreshToken.token == token).first()
     
@@ -0,0 +1,228 @@
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+from sqlalchemy import LargeBinary, String, or_, type_coerce
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.formulary import normalize_medications
+from app.models import Prescription, PrescriptionArchive
+
+# Backfill of structured_data for prescriptions that have none: rows from
+# before the structured_data column existed, and rows whose model answer
+# could not be parsed (SQL NULL, or JSON "null" in rows not yet compacted).
+#
+# Two stages, each walking the prescriptions and archive tables in id order:
+#   reparse  parse the stored analysis text again (no model calls)
+#   model    re-run the model on the stored upload (UPLOAD_DIR) of rows
+#            that are still empty; rows without an image are skipped
+# The last id finished per stage and table is written to a checkpoint file
+# after every committed batch, so an interrupted run picks up where it
+# stopped. Rows that still fail are passed over; `--reset` retries them.
+#
+# Live prescriptions are updated through the ORM, so dispensing machines
+# receive them through delta sync; archived rows are updated in place.
+
+STAGES = ("reparse", "model")
+TABLES = {"prescriptions": Prescription, "prescriptions_archive": PrescriptionArchive}
+
+def image_dir(user_id: int) -> Path:
+    return Path(settings.UPLOAD_DIR) / str(user_id)
+
+def save_image(user_id: int, prescription_id: int, filename: Optional[str], contents: bytes):
+    """Store an uploaded image as UPLOAD_DIR/<user id>/<prescription id><ext>."""
+    directory = image_dir(user_id)
+    directory.mkdir(parents=True, exist_ok=True)
+    suffix = os.path.splitext(filename or "")[1].lower()[:8]
+    temporary = directory / f".{prescription_id}.tmp"
+    temporary.write_bytes(contents)
+    os.replace(temporary, directory / f"{prescription_id}{suffix}")
+
+def find_image(user_id: int, prescription_id: int) -> Optional[Path]:
+    if not settings.UPLOAD_DIR:
+        return None
+    directory = image_dir(user_id)
+    for path in [directory / str(prescription_id), *directory.glob(f"{prescription_id}.*")]:
+        if path.is_file():
+            return path
+    return None
+
+class Checkpoint:
+    """Last finished id per stage and table, kept in a small JSON file."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.positions: dict = {}
+        if self.path.exists():
+            self.positions = json.loads(self.path.read_text())
+
+    def get(self, stage: str, table: str) -> int:
+        return self.positions.get(stage, {}).get(table, 0)
+
+    def set(self, stage: str, table: str, last_id: int):
+        self.positions.setdefault(stage, {})[table] = last_id
+        temporary = self.path.with_name(self.path.name + ".tmp")
+        temporary.write_text(json.dumps(self.positions, indent=2))
+        os.replace(temporary, self.path)
+
+    def reset(self):
+        self.positions = {}
+        self.path.unlink(missing_ok=True)
+
+class Progress:
+    """Prints processed rows, throughput and an ETA at most every `interval` seconds."""
+
+    def __init__(self, stage: str, total: int, output: Callable[[str], None] = print, interval: float = 2.0):
+        self.stage = stage
+        self.total = total
+        self.output = output
+        self.interval = interval
+        self.done = 0
+        self.fixed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+        self._printed = 0.0
+
+    def update(self, done: int, fixed: int = 0, skipped: int = 0, failed: int = 0, final: bool = False):
+        self.done += done
+        self.fixed += fixed
+        self.skipped += skipped
+        self.failed += failed
+        now = time.perf_counter()
+        if not final and (now - self._printed < self.interval or self.done >= self.total):
+            return
+        self._printed = now
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate > 0 and self.total > self.done else 0.0
+        self.output(
+            f"{self.stage}: {self.done}/{self.total} rows, {self.fixed} fixed, "
+            f"{self.skipped} skipped, {self.failed} failed, {rate:.1f} rows/s"
+            + ("" if final else f", ETA {eta:.0f}s")
+        )
+
+def _missing_structured_data(db: Session, model):
+    """
+    SQL NULL, or the JSON text "null" that the old uncompressed JSON column
+    stored for failed parses (until `python -m app.cli compact` rewrites it).
+    """
+    column = model.structured_data
+    if db.get_bind().dialect.name == "sqlite":
+        # Legacy values are TEXT; compressed ones are BLOBs and never equal it
+        legacy_null = type_coerce(column, String) == "null"
+    else:
+        # The compression migration converted the column to bytes as-is
+        legacy_null = type_coerce(column, LargeBinary) == b"null"
+    return or_(column.is_(None), legacy_null)
+
+def _pending_query(db: Session, model, user_id: Optional[int]):
+    query = db.query(model.id, model.user_id).filter(_missing_structured_data(db, model))
+    if user_id is not None:
+        query = query.filter(model.user_id == user_id)
+    return query
+
+def _next_batch(db: Session, model, user_id: Optional[int], last_id: int, batch_size: int) -> list:
+    return _pending_query(db, model, user_id).filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+
+def _store(db: Session, model, row_id: int, structured_data: dict, analysis: Optional[str] = None):
+    normalize_medications(structured_data)
+    prescription = db.get(model, row_id)
+    prescription.structured_data = structured_data
+    if analysis is not None:
+        prescription.analysis = analysis
+
+def _reparse_batch(db: Session, model, rows: list) -> tuple[list, int, int]:
+    """(rows fixed, rows skipped, rows failed) for one batch."""
+    from app.model_client import parse_analysis
+
+    texts = dict(db.query(model.id, model.analysis).filter(model.id.in_([row.id for row in rows])))
+    fixed = []
+    for row in rows:
+        structured_data = parse_analysis(texts.get(row.id))
+        if isinstance(structured_data, dict):
+            _store(db, model, row.id, structured_data)
+            fixed.append(row)
+    return fixed, len(rows) - len(fixed), 0
+
+def _analyze_image(client, path: Path):
+    from PIL import Image
+    from app.model_client import PRESCRIPTION_PROMPT
+
+    contents = path.read_bytes()
+    image = Image.open(io.BytesIO(contents))
+    image.load()
+    started = time.perf_counter()
+    result = client.generate(PRESCRIPTION_PROMPT, image)
+    return result, len(contents), time.perf_counter() - started
+
+def _model_batch(
+    db: Session, model, rows: list, pool: ThreadPoolExecutor, output: Callable[[str], None]
+) -> tuple[list, int, int]:
+    from app.model_client import get_model_client, parse_analysis
+    from app.usage import record_usage
+
+    client = get_model_client()
+    images = [(row, find_image(row.user_id, row.id)) for row in rows]
+    futures = [(row, pool.submit(_analyze_image, client, path)) for row, path in images if path is not None]
+    fixed = []
+    failed = 0
+    for row, future in futures:
+        try:
+            result, image_bytes, seconds = future.result()
+        except Exception as exc:
+            output(f"  {model.__tablename__} {row.id}: model call failed: {exc}")
+            failed += 1
+            continue
+        record_usage(db, row.user_id, row.id, client.name, result.usage, image_bytes, seconds)
+        structured_data = parse_analysis(result.text)
+        if isinstance(structured_data, dict):
+            _store(db, model, row.id, structured_data, analysis=result.text)
+            fixed.append(row)
+        else:
+            failed += 1
+    return fixed, len(rows) - len(futures), failed
+
+def run_backfill(
+    db: Session,
+    checkpoint: Checkpoint,
+    stages: tuple = STAGES,
+    user_id: Optional[int] = None,
+    batch_size: int = 100,
+    concurrency: int = 2,
+    output: Callable[[str], None] = print
+) -> set[int]:
+    """Run the given stages; returns the ids of users whose rows changed."""
+    changed_users: set[int] = set()
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="backfill")
+    try:
+        for stage in stages:
+            if stage == "model" and not settings.UPLOAD_DIR:
+                output("model: UPLOAD_DIR is not set, no stored images to re-analyze")
+                continue
+            for table, model in TABLES.items():
+                last_id = checkpoint.get(stage, table)
+                total = _pending_query(db, model, user_id).filter(model.id > last_id).count()
+                if not total:
+                    continue
+                progress = Progress(f"{stage} {table}", total, output)
+                while True:
+                    rows = _next_batch(db, model, user_id, last_id, batch_size)
+                    if not rows:
+                        break
+                    if stage == "reparse":
+                        fixed, skipped, failed = _reparse_batch(db, model, rows)
+                    else:
+                        fixed, skipped, failed = _model_batch(db, model, rows, pool, output)
+                    db.commit()
+                    changed_users.update(row.user_id for row in fixed)
+                    last_id = rows[-1].id
+                    checkpoint.set(stage, table, last_id)
+                    progress.update(len(rows), len(fixed), skipped, failed)
+                progress.update(0, final=True)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+    return changed_users
@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Hashable, Optional
+from starlette.concurrency import run_in_threadpool
+from app.state import get_state
+
+class LRUCache:
+    """A small thread-safe LRU mapping with a fixed number of entries."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return None
+            return self._data[key]
+
+    def set(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class SingleFlight:
+    """
+    Collapse concurrent loads of the same key into one.
+    The first caller runs `func` on the thread pool; callers arriving while
+    it runs wait for the same result instead of hitting the database too.
+    """
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, func: Callable[..., Any], *args) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await run_in_threadpool(func, *args)
+        except BaseException as exc:
+            if isinstance(exc, Exception):
+                future.set_exception(exc)
+                # Mark retrieved so an unawaited failure is not logged twice
+                future.exception()
+            else:
+                future.cancel()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+
+async def user_generation(user_id: int) -> int:
+    """
+    Version of a user's prescriptions, bumped by invalidate_user(). Kept in
+    the shared state, so a change made through one worker (or a CLI run)
+    invalidates what every worker has cached for the user.
+    """
+    value = await get_state().get(f"generation:user:{user_id}")
+    return int(value or 0)
+
+async def invalidate_user(user_id: int):
+    await get_state().incr(f"generation:user:{user_id}")
+
+class UserPageCache:
+    """
+    Serialized per-user pages with write-through invalidation.
+    The user's generation number is part of the cache key; invalidate()
+    bumps it, so stale pages are never served and simply age out of the
+    LRU. A page loaded while an invalidation lands is stored under the old
+    generation and is never served either.
+    """
+
+    def __init__(self, maxsize: int):
+        self.pages = LRUCache(maxsize)
+        self._flight = SingleFlight()
+
+    async def generation(self, user_id: int) -> int:
+        return await user_generation(user_id)
+
+    async def invalidate(self, user_id: int):
+        await invalidate_user(user_id)
+
+    def clear(self):
+        self.pages.clear()
+
+    async def get(self, user_id: int, page_key: Hashable, load: Callable[[], bytes]) -> bytes:
+        key = (user_id, await self.generation(user_id), page_key)
+        body = self.pages.get(key)
+        if body is None:
+            body = await self._flight.do(key, load)
+            self.pages.set(key, body)
+        return body
+
+def make_etag(*parts: Any) -> str:
+    """Build a strong ETag from the values that identify a representation."""
+    raw = "|".join(
+        part.isoformat() if isinstance(part, datetime) else str(part) for part in parts
+    )
+    return '"' + hashlib.blake2b(raw.encode("utf-8"), digest_size=12).hexdigest() + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header value against an ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored
+    return any(
+        (candidate[2:] if candidate.startswith("W/") else candidate) == etag
+        for candidate in candidates
+    )
@@ -0,0 +1,248 @@
+"""
+PharmaBot maintenance commands
+
+Run from the backend directory:
+  python -m app.cli export --format csv --output history.csv
+  python -m app.cli export --format parquet --user alice --output alice.parquet
+  python -m app.cli archive --older-than-days 365
+  python -m app.cli compact --vacuum
+  python -m app.cli rebuild-stats
+  python -m app.cli storage
+  python -m app.cli usage --days 30
+  python -m app.cli backfill --concurrency 4
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from sqlalchemy import text
+from app.config import settings
+from app.database import SessionLocal
+from app.models import User
+
+def _resolve_user_id(username: str) -> int:
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.username == username).first()
+        if user is None:
+            raise SystemExit(f"Unknown user: {username}")
+        return user.id
+    finally:
+        db.close()
+
+def cmd_export(args) -> int:
+    from app.export import parquet_available, stream_export
+
+    if args.format == "parquet" and not parquet_available():
+        print("Parquet export requires pyarrow (pip install pyarrow)", file=sys.stderr)
+        return 1
+
+    user_id = _resolve_user_id(args.user) if args.user else None
+    output = open(args.output, "wb") if args.output != "-" else sys.stdout.buffer
+    started = time.perf_counter()
+    written = 0
+    try:
+        for chunk in stream_export(args.format, user_id):
+            output.write(chunk)
+            written += len(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Exported {written} bytes of {args.format} in {elapsed:.2f}s",
+        file=sys.stderr
+    )
+    return 0
+
+def _print_storage(db):
+    from app.archive import storage_report
+
+    for table, stats in storage_report(db).items():
+        print(
+            f"{table}: {stats['rows']} rows, "
+            f"analysis {stats['analysis_bytes']} bytes, "
+            f"structured_data {stats['structured_data_bytes']} bytes"
+        )
+
+async def _invalidate_users(user_ids):
+    from app.cache import invalidate_user
+    from app.state import close_state
+
+    try:
+        for user_id in user_ids:
+            await invalidate_user(user_id)
+    finally:
+        await close_state()
+
+def cmd_archive(args) -> int:
+    from app.archive import archive_older_than
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        moved, user_ids = archive_older_than(db, args.older_than_days, args.batch_size)
+        # Archived rows leave /history; drop the cached pages that still list them
+        asyncio.run(_invalidate_users(user_ids))
+        print(f"Archived {moved} prescriptions older than {args.older_than_days} days "
+              f"of {len(user_ids)} users in {time.perf_counter() - started:.2f}s")
+        _print_storage(db)
+    finally:
+        db.close()
+    return 0
+
+def cmd_compact(args) -> int:
+    from app.archive import compact_legacy_rows, storage_report
+
+    db = SessionLocal()
+    try:
+        before = storage_report(db)["prescriptions"]
+        started = time.perf_counter()
+        rewritten = compact_legacy_rows(db, args.batch_size)
+        after = storage_report(db)["prescriptions"]
+        before_bytes = before["analysis_bytes"] + before["structured_data_bytes"]
+        after_bytes = after["analysis_bytes"] + after["structured_data_bytes"]
+        print(f"Compressed {rewritten} legacy rows in {time.perf_counter() - started:.2f}s")
+        if before_bytes:
+            print(f"Column storage: {before_bytes} -> {after_bytes} bytes "
+                  f"({1 - after_bytes / before_bytes:.0%} saved)")
+        if args.vacuum and db.bind.dialect.name == "sqlite":
+            db.execute(text("VACUUM"))
+    finally:
+        db.close()
+    return 0
+
+def cmd_rebuild_stats(args) -> int:
+    from app.stats import rebuild_stats
+
+    user_id = _resolve_user_id(args.user) if args.user else None
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        processed = rebuild_stats(db, user_id, args.batch_size)
+        print(f"Rebuilt statistics from {processed} prescriptions "
+              f"in {time.perf_counter() - started:.2f}s")
+    finally:
+        db.close()
+    return 0
+
+def cmd_storage(args) -> int:
+    db = SessionLocal()
+    try:
+        _print_storage(db)
+    finally:
+        db.close()
+    return 0
+
+def cmd_usage(args) -> int:
+    from datetime import datetime, timedelta
+    from app.usage import users_usage
+
+    since = datetime.utcnow() - timedelta(days=args.days) if args.days else None
+    db = SessionLocal()
+    try:
+        rows = users_usage(db, since)
+        names = dict(db.query(User.id, User.username).filter(User.id.in_([row["user_id"] for row in rows])))
+    finally:
+        db.close()
+    print(f"{'user':<24}{'calls':>8}{'tokens':>14}{'cost USD':>12}{'mean ms':>10}")
+    for row in rows:
+        mean_ms = row["mean_model_ms"] or 0.0
+        print(f"{names.get(row['user_id'], row['user_id'])!s:<24}{row['calls']:>8}"
+              f"{row['total_tokens']:>14}{row['cost']:>12.4f}{mean_ms:>10.0f}")
+    print(f"{'total':<24}{sum(row['calls'] for row in rows):>8}"
+          f"{sum(row['total_tokens'] for row in rows):>14}{sum(row['cost'] for row in rows):>12.4f}")
+    return 0
+
+def cmd_backfill(args) -> int:
+    from app.backfill import STAGES, Checkpoint, run_backfill
+    from app.stats import rebuild_stats
+
+    user_id = _resolve_user_id(args.user) if args.user else None
+    checkpoint = Checkpoint(args.checkpoint)
+    if args.reset:
+        checkpoint.reset()
+    stages = ("reparse",) if args.no_model else STAGES
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        changed_users = run_backfill(db, checkpoint, stages, user_id, args.batch_size, args.concurrency)
+        # Statistics only counted these prescriptions without their medications
+        for changed_user in sorted(changed_users):
+            rebuild_stats(db, changed_user, args.batch_size)
+        # Running workers drop their cached responses (with STATE_BACKEND=redis)
+        asyncio.run(_invalidate_users(changed_users))
+        print(f"Backfill finished in {time.perf_counter() - started:.2f}s; "
+              f"rebuilt statistics of {len(changed_users)} users")
+    finally:
+        db.close()
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.cli",
+        description="PharmaBot maintenance commands"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Stream prescription history to a file")
+    export.add_argument(
+        "--format", choices=["ndjson", "csv", "parquet"], default="ndjson",
+        help="Output format (default: ndjson)"
+    )
+    export.add_argument("--user", help="Only export this username (default: all users)")
+    export.add_argument("--output", "-o", default="-", help="Output file (default: stdout)")
+    export.set_defaults(func=cmd_export)
+
+    archive = commands.add_parser("archive", help="Move old prescriptions to the archive table")
+    archive.add_argument(
+        "--older-than-days", type=int, default=settings.ARCHIVE_AFTER_DAYS,
+        help=f"Archive rows created before this many days ago (default: {settings.ARCHIVE_AFTER_DAYS})"
+    )
+    archive.add_argument("--batch-size", type=int, default=500)
+    archive.set_defaults(func=cmd_archive)
+
+    compact = commands.add_parser("compact", help="Compress rows stored before compression")
+    compact.add_argument("--batch-size", type=int, default=500)
+    compact.add_argument("--vacuum", action="store_true", help="Run VACUUM afterwards (SQLite)")
+    compact.set_defaults(func=cmd_compact)
+
+    rebuild_stats = commands.add_parser(
+        "rebuild-stats", help="Recompute medication statistics from history"
+    )
+    rebuild_stats.add_argument("--user", help="Only rebuild this username (default: all users)")
+    rebuild_stats.add_argument("--batch-size", type=int, default=500)
+    rebuild_stats.set_defaults(func=cmd_rebuild_stats)
+
+    storage = commands.add_parser("storage", help="Report stored bytes per table")
+    storage.set_defaults(func=cmd_storage)
+
+    usage = commands.add_parser("usage", help="Report model tokens and cost per user")
+    usage.add_argument("--days", type=int, default=30, help="Look back this many days (0 = all time)")
+    usage.set_defaults(func=cmd_usage)
+
+    backfill = commands.add_parser(
+        "backfill", help="Fill in missing structured data by re-parsing or re-analyzing"
+    )
+    backfill.add_argument("--user", help="Only backfill this username (default: all users)")
+    backfill.add_argument("--batch-size", type=int, default=100)
+    backfill.add_argument(
+        "--concurrency", type=int, default=2, help="Model calls at once for stored images (default: 2)"
+    )
+    backfill.add_argument("--no-model", action="store_true", help="Only re-parse stored analysis text")
+    backfill.add_argument(
+        "--checkpoint", default="backfill.checkpoint.json", help="Progress file for resuming"
+    )
+    backfill.add_argument("--reset", action="store_true", help="Start over, retrying skipped rows")
+    backfill.set_defaults(func=cmd_backfill)
+
+    return parser
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
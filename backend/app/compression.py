@@ -0,0 +1,178 @@
+import json
+import threading
+import orjson
+import zstandard
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+# Transparent zstd compression for the large prescription columns.
+#
+# Stored values start with a one byte header naming the codec. Version 1
+# uses a raw-content dictionary built from the keys and common values of
+# the prescription JSON schema, which is what both the raw model output
+# and structured_data mostly consist of; small documents compress far
+# better with it than on their own. A dictionary must never change once
+# rows have been written with it: add a new header version instead.
+#
+# Values without a known header are legacy uncompressed rows (TEXT in
+# SQLite, or bytes after a column type change) and are returned as-is.
+
+HEADER_ZSTD = b"\x00"
+HEADER_ZSTD_DICT_V1 = b"\x01"
+
+COMPRESSION_LEVEL = 3
+
+_DICTIONARY_V1 = b"""```json
+{
+  "prescription_id": null,
+  "prescription_date": "2025-01-01",
+  "doctor_name": "Dr. ",
+  "doctor_registration": null,
+  "hospital_clinic": "Hospital",
+  "patient": {
+    "patient_name": null,
+    "patient_age": null,
+    "patient_gender": "male",
+    "patient_id": null
+  },
+  "medications": [
+    {
+      "medicine_name": "",
+      "generic_name": null,
+      "strength": "500mg",
+      "dosage_form": "tablet",
+      "quantity_per_dose": 1,
+      "frequency": "3 times daily",
+      "frequency_code": "TID",
+      "timing": ["08:00", "14:00", "20:00"],
+      "duration_days": 7,
+      "total_quantity": 21,
+      "before_after_food": "after",
+      "special_instructions": null
+    },
+    {
+      "medicine_name": "",
+      "generic_name": null,
+      "strength": "20mg",
+      "dosage_form": "capsule",
+      "quantity_per_dose": 1,
+      "frequency": "2 times daily",
+      "frequency_code": "BID",
+      "timing": ["08:00", "20:00"],
+      "duration_days": 14,
+      "total_quantity": 28,
+      "before_after_food": "before",
+      "special_instructions": null
+    },
+    {
+      "medicine_name": "",
+      "generic_name": null,
+      "strength": "10ml",
+      "dosage_form": "syrup",
+      "quantity_per_dose": 1,
+      "frequency": "Once daily",
+      "frequency_code": "QD",
+      "timing": ["08:00"],
+      "duration_days": 5,
+      "total_quantity": 5,
+      "before_after_food": "with",
+      "special_instructions": null
+    }
+  ],
+  "diagnosis": null,
+  "allergies": null,
+  "warnings": null,
+  "follow_up_date": null,
+  "emergency_contact": null
+}
+```
+{"prescription_id":null,"prescription_date":null,"doctor_name":null,"doctor_registration":null,"hospital_clinic":null,"patient":{"patient_name":null,"patient_age":null,"patient_gender":"female","patient_id":null},"medications":[{"medicine_name":"","generic_name":null,"strength":"","dosage_form":"injection","quantity_per_dose":1,"frequency":"4 times daily","frequency_code":"QID","timing":["06:00","12:00","18:00","00:00"],"duration_days":30,"total_quantity":1,"before_after_food":"empty stomach","special_instructions":null}],"diagnosis":null,"allergies":null,"warnings":null,"follow_up_date":null,"emergency_contact":null}
+"""
+
+_dictionaries = {
+    HEADER_ZSTD_DICT_V1: zstandard.ZstdCompressionDict(
+        _DICTIONARY_V1, dict_type=zstandard.DICT_TYPE_RAWCONTENT
+    ),
+}
+
+# zstandard (de)compressor objects are not thread safe, so keep one set per thread
+_local = threading.local()
+
+def _compressor() -> zstandard.ZstdCompressor:
+    compressor = getattr(_local, "compressor", None)
+    if compressor is None:
+        compressor = _local.compressor = zstandard.ZstdCompressor(
+            level=COMPRESSION_LEVEL, dict_data=_dictionaries[HEADER_ZSTD_DICT_V1]
+        )
+    return compressor
+
+def _decompressor(header: bytes) -> zstandard.ZstdDecompressor:
+    decompressors = getattr(_local, "decompressors", None)
+    if decompressors is None:
+        decompressors = _local.decompressors = {}
+    decompressor = decompressors.get(header)
+    if decompressor is None:
+        dictionary = _dictionaries.get(header)
+        decompressor = decompressors[header] = (
+            zstandard.ZstdDecompressor(dict_data=dictionary)
+            if dictionary is not None else zstandard.ZstdDecompressor()
+        )
+    return decompressor
+
+def compress(data: bytes) -> bytes:
+    return HEADER_ZSTD_DICT_V1 + _compressor().compress(data)
+
+def decompress(value) -> bytes:
+    """Return the original bytes of a stored value (legacy values pass through)."""
+    if isinstance(value, str):
+        return value.encode("utf-8")
+    value = bytes(value)
+    header = value[:1]
+    if header == HEADER_ZSTD or header in _dictionaries:
+        return _decompressor(header).decompress(value[1:])
+    return value
+
+def is_compressed(value) -> bool:
+    return isinstance(value, (bytes, memoryview)) and (
+        bytes(value[:1]) == HEADER_ZSTD or bytes(value[:1]) in _dictionaries
+    )
+
+class _CompressedType(TypeDecorator):
+    impl = LargeBinary
+    cache_ok = True
+
+    def result_processor(self, dialect, coltype):
+        # Bypass LargeBinary's own result processing: legacy rows come back
+        # from SQLite as str, which it would reject.
+        def process(value):
+            return self.process_result_value(value, dialect)
+        return process
+
+class CompressedText(_CompressedType):
+    """Text stored zstd-compressed."""
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress(value.encode("utf-8"))
+
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, str):
+            return value
+        return decompress(value).decode("utf-8")
+
+class CompressedJSON(_CompressedType):
+    """JSON document stored zstd-compressed. None is stored as SQL NULL."""
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress(orjson.dumps(value))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return json.loads(value)
+        return orjson.loads(decompress(value))
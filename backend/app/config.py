@@ -11,5 +11,109 @@ class Settings:
     REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "http://localhost:3000")
+    # bcrypt cost factor; existing hashes are upgraded on the next login
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    # Size of the password hashing process pool (0 = no pool, hash on the thread pool)
+    PASSWORD_HASH_WORKERS: int = int(
+        os.getenv("PASSWORD_HASH_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) - 1))))
+    )
+    # Server-side LRU of serialized prescription reads and client cache lifetime
+    PRESCRIPTION_CACHE_SIZE: int = int(os.getenv("PRESCRIPTION_CACHE_SIZE", "512"))
+    PRESCRIPTION_CACHE_MAX_AGE: int = int(os.getenv("PRESCRIPTION_CACHE_MAX_AGE", "3600"))
+    # Maximum ids accepted by /prescriptions/structured:batch
+    STRUCTURED_BATCH_MAX_IDS: int = int(os.getenv("STRUCTURED_BATCH_MAX_IDS", "100"))
+    # Push feed: pub/sub backend ("memory" or "redis"), per-subscriber backlog
+    # and keep-alive interval
+    EVENT_BROKER: str = os.getenv("EVENT_BROKER", "memory")
+    EVENT_QUEUE_SIZE: int = int(os.getenv("EVENT_QUEUE_SIZE", "256"))
+    FEED_HEARTBEAT_SECONDS: float = float(os.getenv("FEED_HEARTBEAT_SECONDS", "15"))
+    # Maximum changes returned per /prescriptions/changes page
+    SYNC_PAGE_SIZE: int = int(os.getenv("SYNC_PAGE_SIZE", "500"))
+    # Default age at which `app.cli archive` moves prescriptions to cold storage
+    ARCHIVE_AFTER_DAYS: int = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+    # Serialized /prescriptions/history pages kept in memory (0 disables)
+    HISTORY_CACHE_SIZE: int = int(os.getenv("HISTORY_CACHE_SIZE", "1024"))
+    # Largest page size accepted by /prescriptions/history
+    HISTORY_PAGE_MAX: int = int(os.getenv("HISTORY_PAGE_MAX", "200"))
+    # Drug formulary (CSV or JSON) used to normalize medication names; empty disables
+    FORMULARY_PATH: str = os.getenv(
+        "FORMULARY_PATH",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "formulary.csv")
+    )
+    # Drug interaction pairs checked against a user's active courses; empty disables
+    INTERACTIONS_PATH: str = os.getenv(
+        "INTERACTIONS_PATH",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "interactions.csv")
+    )
+    # Bearer token required by /metrics (empty = no authentication)
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
+    # Requests sent with `X-Profile: <token>` are profiled (empty disables the header)
+    PROFILING_TOKEN: str = os.getenv("PROFILING_TOKEN", "")
+    # Fraction of requests profiled at random (0 disables)
+    PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    # Requests slower than this many seconds get stack samples captured (0 disables)
+    SLOW_REQUEST_SECONDS: float = float(os.getenv("SLOW_REQUEST_SECONDS", "0"))
+    # Seconds between stack samples while profiling
+    PROFILE_INTERVAL: float = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+    # Where profiles are written (collapsed stack format)
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "profiles")
+    # Span export: "file" (OTLP/JSON lines in TRACE_FILE), "otlp" (OTLP/HTTP) or empty to disable
+    TRACE_EXPORT: str = os.getenv("TRACE_EXPORT", "")
+    TRACE_FILE: str = os.getenv("TRACE_FILE", "traces/traces.jsonl")
+    TRACE_OTLP_ENDPOINT: str = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+    # Finished spans waiting for export; more are dropped rather than blocking requests
+    TRACE_QUEUE_SIZE: int = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+    # Vision model backend: "gemini" or "fake" (canned answers, for load tests)
+    MODEL_BACKEND: str = os.getenv("MODEL_BACKEND", "gemini")
+    GEMINI_MODEL: str = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-lite")
+    # Seconds the fake model takes per call, and the +/- fraction it varies by
+    FAKE_MODEL_LATENCY: float = float(os.getenv("FAKE_MODEL_LATENCY", "1.0"))
+    FAKE_MODEL_JITTER: float = float(os.getenv("FAKE_MODEL_JITTER", "0.2"))
+    # JSON log level and destination (empty = stdout; "{pid}" in the name is
+    # replaced with the worker's pid, so each worker rotates its own file)
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FILE: str = os.getenv("LOG_FILE", "")
+    # Size at which LOG_FILE is rotated, and how many rotated files are kept
+    LOG_MAX_BYTES: int = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    LOG_BACKUPS: int = int(os.getenv("LOG_BACKUPS", "5"))
+    # Log records waiting to be written; more are dropped rather than blocking requests
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    # Access log sampling for noisy routes ("route=rate,..."); errors are always logged
+    LOG_SAMPLE_RATES: str = os.getenv("LOG_SAMPLE_RATES", "/health=0.01,/metrics=0.01")
+    # Model calls running at once per worker, and at most this many per user
+    MODEL_CONCURRENCY: int = int(os.getenv("MODEL_CONCURRENCY", "8"))
+    MODEL_USER_CONCURRENCY: int = int(os.getenv("MODEL_USER_CONCURRENCY", "2"))
+    # Analyses one user may have waiting for a model slot (429 beyond)
+    MODEL_USER_MAX_QUEUED: int = int(os.getenv("MODEL_USER_MAX_QUEUED", "32"))
+    # Seconds a request waits for a model slot before giving up with 503
+    MODEL_QUEUE_TIMEOUT: float = float(os.getenv("MODEL_QUEUE_TIMEOUT", "120"))
+    # Fair-queueing weight of each X-Priority class
+    MODEL_PRIORITY_WEIGHTS: str = os.getenv("MODEL_PRIORITY_WEIGHTS", "urgent=4,normal=1,backfill=0.25")
+    # Usernames allowed to send priorities weighted above normal (comma separated)
+    MODEL_PRIORITY_USERS: str = os.getenv("MODEL_PRIORITY_USERS", "")
+    # Per-user analyze rate limit: tokens per second and bucket size (0 disables)
+    MODEL_USER_RATE: float = float(os.getenv("MODEL_USER_RATE", "0"))
+    MODEL_USER_BURST: float = float(os.getenv("MODEL_USER_BURST", "10"))
+    # Model price in USD per million prompt / output tokens, used to cost each call
+    MODEL_INPUT_COST_PER_MTOK: float = float(os.getenv("MODEL_INPUT_COST_PER_MTOK", "0.075"))
+    MODEL_OUTPUT_COST_PER_MTOK: float = float(os.getenv("MODEL_OUTPUT_COST_PER_MTOK", "0.30"))
+    # Per-user model budgets per UTC day and calendar month, in tokens and
+    # USD; analyze answers 429 once one is used up (0 = no limit)
+    USAGE_DAILY_TOKEN_BUDGET: int = int(os.getenv("USAGE_DAILY_TOKEN_BUDGET", "0"))
+    USAGE_MONTHLY_TOKEN_BUDGET: int = int(os.getenv("USAGE_MONTHLY_TOKEN_BUDGET", "0"))
+    USAGE_DAILY_COST_BUDGET: float = float(os.getenv("USAGE_DAILY_COST_BUDGET", "0"))
+    USAGE_MONTHLY_COST_BUDGET: float = float(os.getenv("USAGE_MONTHLY_COST_BUDGET", "0"))
+    # Keep uploaded images here ("<user id>/<prescription id>.<ext>") so the
+    # backfill can re-run the model on them (empty = images are not kept)
+    UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "")
+    # Rate limits, cache invalidation and idempotency keys: "memory" (this
+    # process only) or "redis" (shared by every worker and node)
+    STATE_BACKEND: str = os.getenv("STATE_BACKEND", "memory")
+    # Redis server for STATE_BACKEND=redis and EVENT_BROKER=redis, and the
+    # prefix of every key and channel the app uses there
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    REDIS_KEY_PREFIX: str = os.getenv("REDIS_KEY_PREFIX", "pharmabot:")
+    # Seconds a finished analyze request answers repeats of its Idempotency-Key
+    IDEMPOTENCY_TTL: int = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
 
 settings = Settings()
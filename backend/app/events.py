@@ -0,0 +1,209 @@
+import asyncio
+import logging
+from typing import Optional
+import orjson
+from app.config import settings
+from app import serialization
+
+# Pub/sub for pushing new prescriptions to connected devices. Channels are
+# per user ("user:<id>"). Events carry a cursor (the prescription's
+# change_seq, the same cursor as GET /prescriptions/changes) so a
+# subscriber that falls behind or reconnects can catch up from the
+# database; the broker itself never has to retain history.
+#
+# EVENT_BROKER=memory only reaches subscribers in the same process;
+# EVENT_BROKER=redis fans events out through Redis pub/sub to every worker.
+
+logger = logging.getLogger(__name__)
+
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+def prescription_event(prescription) -> dict:
+    return {
+        "cursor": prescription.change_seq,
+        "prescription_id": prescription.id,
+        "filename": prescription.filename,
+        "created_at": prescription.created_at,
+        "data": prescription.structured_data,
+    }
+
+class SubscriptionOverflow(Exception):
+    """Raised to a subscriber that fell too far behind and lost messages."""
+
+class Subscription:
+    def __init__(self, broker: "Broker", channel: str, queue_size: int):
+        self.broker = broker
+        self.channel = channel
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def deliver(self, message: dict):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.resync()
+
+    def resync(self):
+        """Drop the backlog and let the consumer catch up from its cursor."""
+        if self.overflowed:
+            return
+        self.overflowed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Wait for the next message, or return None after `timeout` seconds."""
+        try:
+            message = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if message is None and self.overflowed:
+            raise SubscriptionOverflow(self.channel)
+        return message
+
+    async def __aenter__(self) -> "Subscription":
+        await self.broker.attach(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.broker.detach(self)
+
+class Broker:
+    """Interface for pub/sub backends; see InMemoryBroker for the reference."""
+
+    async def publish(self, channel: str, message: dict):
+        raise NotImplementedError
+
+    async def attach(self, subscription: Subscription):
+        raise NotImplementedError
+
+    async def detach(self, subscription: Subscription):
+        raise NotImplementedError
+
+    def subscribe(self, channel: str) -> Subscription:
+        return Subscription(self, channel, settings.EVENT_QUEUE_SIZE)
+
+    async def close(self):
+        pass
+
+class InMemoryBroker(Broker):
+    """Delivers messages to subscribers in this process only (single worker)."""
+
+    def __init__(self):
+        self._subscriptions: dict[str, set[Subscription]] = {}
+
+    async def publish(self, channel: str, message: dict):
+        for subscription in list(self._subscriptions.get(channel, ())):
+            subscription.deliver(message)
+
+    async def attach(self, subscription: Subscription):
+        self._subscriptions.setdefault(subscription.channel, set()).add(subscription)
+
+    async def detach(self, subscription: Subscription):
+        subscribers = self._subscriptions.get(subscription.channel)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscriptions[subscription.channel]
+
+class RedisBroker(Broker):
+    """
+    Publishes through Redis pub/sub so subscribers on every worker and node
+    receive each event. Each process holds one pub/sub connection, subscribed
+    to the channels its local subscribers listen on, and hands incoming
+    messages to them through an InMemoryBroker.
+    """
+
+    def __init__(self):
+        from app.state import redis_client
+
+        self._redis = redis_client()
+        self._pubsub = self._redis.pubsub()
+        self._prefix = settings.REDIS_KEY_PREFIX + "events:"
+        self._local = InMemoryBroker()
+        self._reader: Optional[asyncio.Task] = None
+
+    async def publish(self, channel: str, message: dict):
+        try:
+            await self._redis.publish(self._prefix + channel, serialization.encode_json(message))
+        except Exception:
+            # Devices pick the event up from the database when they resync
+            logger.warning("Publishing to %s failed", channel, exc_info=True)
+
+    async def attach(self, subscription: Subscription):
+        first = subscription.channel not in self._local._subscriptions
+        await self._local.attach(subscription)
+        if first:
+            await self._pubsub.subscribe(self._prefix + subscription.channel)
+        if self._reader is None:
+            self._reader = asyncio.create_task(self._read())
+
+    async def detach(self, subscription: Subscription):
+        await self._local.detach(subscription)
+        if subscription.channel not in self._local._subscriptions:
+            try:
+                await self._pubsub.unsubscribe(self._prefix + subscription.channel)
+            except Exception:
+                logger.warning("Unsubscribing from %s failed", subscription.channel, exc_info=True)
+
+    async def _read(self):
+        while True:
+            if not self._pubsub.subscribed:
+                await asyncio.sleep(0.1)
+                continue
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Messages may have been lost while disconnected: make every
+                # subscriber catch up from the database (the client
+                # resubscribes on reconnect)
+                logger.warning("Redis pub/sub connection lost", exc_info=True)
+                for subscriptions in self._local._subscriptions.values():
+                    for subscription in subscriptions:
+                        subscription.resync()
+                await asyncio.sleep(1.0)
+                continue
+            if message is None or message.get("type") != "message":
+                continue
+            channel = message["channel"].decode("utf-8")[len(self._prefix):]
+            await self._local.publish(channel, orjson.loads(message["data"]))
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+        await self._pubsub.aclose()
+        await self._redis.aclose()
+
+BROKERS = {
+    "memory": InMemoryBroker,
+    "redis": RedisBroker,
+}
+
+_broker: Optional[Broker] = None
+
+def get_broker() -> Broker:
+    global _broker
+    if _broker is None:
+        _broker = BROKERS[settings.EVENT_BROKER]()
+    return _broker
+
+def set_broker(broker: Optional[Broker]):
+    """Replace the process-wide broker (e.g. in tests)."""
+    global _broker
+    _broker = broker
+
+async def close_broker():
+    global _broker
+    if _broker is not None:
+        await _broker.close()
+        _broker = None
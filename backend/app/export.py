@@ -0,0 +1,220 @@
+import csv
+import io
+from typing import Iterator, Optional
+import orjson
+from app.database import SessionLocal
+from app.models import Prescription, PrescriptionArchive
+
+# Flattened export of prescription history: one record per medication (or
+# one record with empty medication fields when nothing could be parsed).
+# Rows are read from the database a page at a time and written out in
+# small chunks, so memory stays flat however long the history is.
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Rows fetched per round trip while streaming
+EXPORT_BATCH_SIZE = 500
+
+# (column, kind) in output order; kind drives coercion and the Parquet schema
+EXPORT_COLUMNS = [
+    ("prescription_id", "int"),
+    ("user_id", "int"),
+    ("filename", "str"),
+    ("created_at", "str"),
+    ("prescription_date", "str"),
+    ("doctor_name", "str"),
+    ("hospital_clinic", "str"),
+    ("patient_name", "str"),
+    ("patient_age", "int"),
+    ("patient_gender", "str"),
+    ("diagnosis", "str"),
+    ("medication_index", "int"),
+    ("medicine_name", "str"),
+    ("generic_name", "str"),
+    ("strength", "str"),
+    ("dosage_form", "str"),
+    ("quantity_per_dose", "int"),
+    ("frequency", "str"),
+    ("frequency_code", "str"),
+    ("timing", "str"),
+    ("duration_days", "int"),
+    ("total_quantity", "int"),
+    ("before_after_food", "str"),
+    ("special_instructions", "str"),
+]
+
+MEDICATION_FIELDS = [
+    "medicine_name", "generic_name", "strength", "dosage_form", "quantity_per_dose",
+    "frequency", "frequency_code", "timing", "duration_days", "total_quantity",
+    "before_after_food", "special_instructions",
+]
+
+def _as_int(value) -> Optional[int]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _as_str(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, list):
+        return ";".join(str(item) for item in value)
+    return str(value)
+
+_COERCE = {"int": _as_int, "str": _as_str}
+
+def flatten_prescription(row) -> Iterator[dict]:
+    """Yield one flat record per medication of a prescription row."""
+    data = row.structured_data if isinstance(row.structured_data, dict) else {}
+    patient = data.get("patient") if isinstance(data.get("patient"), dict) else {}
+    medications = [m for m in data.get("medications") or [] if isinstance(m, dict)] or [{}]
+
+    base = {
+        "prescription_id": row.id,
+        "user_id": row.user_id,
+        "filename": row.filename,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "prescription_date": data.get("prescription_date"),
+        "doctor_name": data.get("doctor_name"),
+        "hospital_clinic": data.get("hospital_clinic"),
+        "patient_name": patient.get("patient_name"),
+        "patient_age": patient.get("patient_age"),
+        "patient_gender": patient.get("patient_gender"),
+        "diagnosis": data.get("diagnosis"),
+    }
+    for index, medication in enumerate(medications):
+        record = dict(base)
+        record["medication_index"] = index if medication else None
+        for field in MEDICATION_FIELDS:
+            record[field] = medication.get(field)
+        yield {column: _COERCE[kind](record.get(column)) for column, kind in EXPORT_COLUMNS}
+
+def _fetch_batch(model, user_id: Optional[int], after_id: int) -> list:
+    db = SessionLocal()
+    try:
+        query = db.query(
+            model.id,
+            model.user_id,
+            model.filename,
+            model.created_at,
+            model.structured_data
+        ).filter(model.id > after_id)
+        if user_id is not None:
+            query = query.filter(model.user_id == user_id)
+        return query.order_by(model.id).limit(EXPORT_BATCH_SIZE).all()
+    finally:
+        db.close()
+
+def iter_export_records(user_id: Optional[int] = None) -> Iterator[dict]:
+    """Stream flattened records for one user (or everyone), archive included."""
+    # Archived (older) rows first, then live ones
+    for model in (PrescriptionArchive, Prescription):
+        last_id = 0
+        while True:
+            # Keyset pages with a short session each: no transaction (and on
+            # SQLite no read lock) stays open while the client reads
+            rows = _fetch_batch(model, user_id, last_id)
+            for row in rows:
+                yield from flatten_prescription(row)
+            if len(rows) < EXPORT_BATCH_SIZE:
+                break
+            last_id = rows[-1].id
+
+def _write_ndjson(records: Iterator[dict]) -> Iterator[bytes]:
+    chunk = []
+    for record in records:
+        chunk.append(orjson.dumps(record))
+        if len(chunk) >= EXPORT_BATCH_SIZE:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
+
+def _write_csv(records: Iterator[dict]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=[column for column, _ in EXPORT_COLUMNS])
+    writer.writeheader()
+    for count, record in enumerate(records, start=1):
+        writer.writerow(record)
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back in chunks."""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def _write_parquet(records: Iterator[dict]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"int": pa.int64(), "str": pa.string()}
+    schema = pa.schema([(column, types[kind]) for column, kind in EXPORT_COLUMNS])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd")
+
+    def write_row_group(batch: list[dict]):
+        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            write_row_group(batch)
+            batch = []
+            yield sink.drain()
+    if batch:
+        write_row_group(batch)
+    writer.close()
+    yield sink.drain()
+
+_WRITERS = {
+    "ndjson": _write_ndjson,
+    "csv": _write_csv,
+    "parquet": _write_parquet,
+}
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def stream_export(fmt: str, user_id: Optional[int] = None) -> Iterator[bytes]:
+    """Yield the encoded export in chunks."""
+    return _WRITERS[fmt](iter_export_records(user_id))
@@ -0,0 +1,241 @@
+import bisect
+import csv
+import json
+import os
+import re
+import threading
+from collections import Counter
+from typing import Iterable, NamedTuple, Optional
+from app.cache import LRUCache
+from app.config import settings
+
+# Local drug formulary used to map free-text medication names from the
+# model (brand names, misspellings, "Tab. Napa 500mg") to a canonical drug id.
+#
+# The formulary file is compiled once into an in-memory index:
+#   - exact: normalized name -> entry, for every canonical name and synonym
+#   - a sorted name list for prefix lookups (bisect)
+#   - trigram posting lists for fuzzy candidates, confirmed with a
+#     bounded edit distance
+# Resolved queries are memoized, so repeated names cost a dict lookup.
+#
+# CSV files have the columns drug_id, canonical_name, synonyms
+# (";"-separated) and optionally drug_class. JSON files hold a list of
+# objects with the same keys, where synonyms is a list.
+
+# Dosage-form words and abbreviations dropped before matching
+_FORM_WORDS = {
+    "tab", "tabs", "tablet", "tablets", "cap", "caps", "capsule", "capsules",
+    "syp", "syr", "syrup", "susp", "suspension", "inj", "injection", "drop",
+    "drops", "cream", "ointment", "gel", "sachet", "inhaler", "er", "sr", "xr", "ds",
+}
+_NON_WORD = re.compile(r"[^a-z0-9+]+")
+
+# Fuzzy matches may be at most this many edits per 4 characters of the query
+EDITS_PER_4_CHARS = 1
+
+class FormularyEntry(NamedTuple):
+    drug_id: str
+    canonical_name: str
+    drug_class: Optional[str] = None  # Therapeutic class, for duplicate therapy checks
+
+class FormularyMatch(NamedTuple):
+    drug_id: str
+    canonical_name: str
+    matched_name: str  # Normalized formulary name that matched
+    method: str  # "exact", "prefix" or "fuzzy"
+    score: float  # 1.0 for exact matches, 1 - edits / length otherwise
+
+def normalize_name(name: str) -> str:
+    """Lowercase, strip punctuation, strengths and dosage-form words."""
+    tokens = _NON_WORD.sub(" ", name.lower()).split()
+    kept = [
+        token for token in tokens
+        if token not in _FORM_WORDS and not any(char.isdigit() for char in token)
+    ]
+    return " ".join(kept)
+
+def _trigrams(name: str) -> set[str]:
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, giving up (returning limit + 1) once it exceeds `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+class Formulary:
+    def __init__(self, entries: Iterable[tuple[str, str, list[str], Optional[str]]], memo_size: int = 8192):
+        self._exact: dict[str, FormularyEntry] = {}
+        self._drugs: dict[str, FormularyEntry] = {}
+        for drug_id, canonical_name, synonyms, drug_class in entries:
+            entry = FormularyEntry(drug_id, canonical_name, drug_class)
+            self._drugs.setdefault(drug_id, entry)
+            for name in [canonical_name, drug_id, *synonyms]:
+                key = normalize_name(name)
+                # First entry wins when two drugs share a synonym
+                if key and key not in self._exact:
+                    self._exact[key] = entry
+
+        self._names = sorted(self._exact)
+        self._postings: dict[str, list[int]] = {}
+        for index, name in enumerate(self._names):
+            for gram in _trigrams(name):
+                self._postings.setdefault(gram, []).append(index)
+
+        self._memo = LRUCache(memo_size)
+        self.drugs = len(self._drugs)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def drug(self, drug_id: str) -> Optional[FormularyEntry]:
+        return self._drugs.get(drug_id)
+
+    def exact(self, name: str) -> Optional[FormularyMatch]:
+        key = normalize_name(name)
+        entry = self._exact.get(key)
+        if entry is None:
+            return None
+        return FormularyMatch(entry.drug_id, entry.canonical_name, key, "exact", 1.0)
+
+    def prefix(self, prefix: str, limit: int = 10) -> list[FormularyMatch]:
+        """Formulary names starting with `prefix`, in alphabetical order."""
+        key = normalize_name(prefix)
+        if not key:
+            return []
+        matches = []
+        start = bisect.bisect_left(self._names, key)
+        for name in self._names[start:start + limit]:
+            if not name.startswith(key):
+                break
+            entry = self._exact[name]
+            matches.append(FormularyMatch(entry.drug_id, entry.canonical_name, name, "prefix", 1.0))
+        return matches
+
+    def fuzzy(self, name: str) -> Optional[FormularyMatch]:
+        key = normalize_name(name)
+        if not key:
+            return None
+        max_edits = max(1, len(key) * EDITS_PER_4_CHARS // 4)
+
+        # One edit changes at most 3 trigrams, so a name within max_edits
+        # shares at least len(grams) - 3 * max_edits of the query's trigrams
+        # (the count filter); only those survive to the edit distance check.
+        grams = _trigrams(key)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        required = max(1, len(grams) - 3 * max_edits)
+        candidates = sorted(
+            (index for index, count in shared.items() if count >= required),
+            key=shared.__getitem__,
+            reverse=True
+        )
+
+        best = None
+        limit = max_edits
+        for index in candidates:
+            candidate = self._names[index]
+            if abs(len(candidate) - len(key)) > limit:
+                continue
+            distance = edit_distance(key, candidate, limit)
+            if distance > limit:
+                continue
+            if best is None or (distance, candidate) < best:
+                best = (distance, candidate)
+                limit = distance
+        if best is None:
+            return None
+
+        distance, candidate = best
+        entry = self._exact[candidate]
+        score = round(1 - distance / max(len(key), len(candidate)), 3)
+        return FormularyMatch(entry.drug_id, entry.canonical_name, candidate, "fuzzy", score)
+
+    def lookup(self, name: str) -> Optional[FormularyMatch]:
+        """Exact match, else the closest fuzzy match, else None. Memoized."""
+        if not name:
+            return None
+        found = self._memo.get(name)
+        if found is None:
+            match = self.exact(name) or self.fuzzy(name)
+            # Cache misses too, as False
+            self._memo.set(name, match or False)
+            return match
+        return found or None
+
+    def normalize_medication(self, medication: dict) -> dict:
+        """Set drug_id and canonical_name on a medication dict (None when unknown)."""
+        names = [
+            value for value in (medication.get("medicine_name"), medication.get("generic_name"))
+            if isinstance(value, str) and value.strip()
+        ]
+        # A certain match on either name beats a fuzzy one on the brand name
+        match = next(filter(None, (self.exact(name) for name in names)), None)
+        if match is None:
+            match = next(filter(None, (self.lookup(name) for name in names)), None)
+        medication["drug_id"] = match.drug_id if match else None
+        medication["canonical_name"] = match.canonical_name if match else None
+        return medication
+
+def _read_entries(path: str) -> list[tuple[str, str, list[str], Optional[str]]]:
+    if path.endswith(".json"):
+        with open(path, encoding="utf-8") as file:
+            return [
+                (
+                    item["drug_id"],
+                    item["canonical_name"],
+                    list(item.get("synonyms") or []),
+                    item.get("drug_class") or None
+                )
+                for item in json.load(file)
+            ]
+    with open(path, newline="", encoding="utf-8") as file:
+        return [
+            (
+                row["drug_id"],
+                row["canonical_name"],
+                [name.strip() for name in (row.get("synonyms") or "").split(";") if name.strip()],
+                row.get("drug_class") or None
+            )
+            for row in csv.DictReader(file)
+        ]
+
+def load_formulary(path: str) -> Formulary:
+    return Formulary(_read_entries(path))
+
+_formulary: Optional[Formulary] = None
+_lock = threading.Lock()
+
+def get_formulary() -> Formulary:
+    """The configured formulary, compiled on first use (empty if not configured)."""
+    global _formulary
+    if _formulary is None:
+        with _lock:
+            if _formulary is None:
+                path = settings.FORMULARY_PATH
+                _formulary = load_formulary(path) if path and os.path.exists(path) else Formulary([])
+    return _formulary
+
+def normalize_medications(structured_data) -> None:
+    """Normalize every medication of a parsed prescription in place."""
+    if not isinstance(structured_data, dict):
+        return
+    formulary = get_formulary()
+    for medication in structured_data.get("medications") or []:
+        if isinstance(medication, dict):
+            formulary.normalize_medication(medication)
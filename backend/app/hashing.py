@@ -0,0 +1,77 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import bcrypt
+from app.config import settings
+
+# bcrypt is deliberately slow and CPU bound. Running it on the shared
+# Starlette thread pool lets a burst of logins starve every other sync
+# endpoint, so it runs in a dedicated, bounded process pool instead.
+#
+# This module is deliberately light: worker processes import it to
+# unpickle the task functions and must not pull in the app.
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def hash_password(password: str, rounds: int) -> str:
+    salt = bcrypt.gensalt(rounds=rounds)
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+def check_password(plain_password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+def get_hash_rounds(hashed_password: str) -> Optional[int]:
+    """Return the cost factor encoded in a bcrypt hash ("$2b$12$..." -> 12)."""
+    try:
+        return int(hashed_password.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+def needs_rehash(hashed_password: str) -> bool:
+    return get_hash_rounds(hashed_password) != settings.BCRYPT_ROUNDS
+
+def get_pool() -> Optional[ProcessPoolExecutor]:
+    """Return the hashing pool, creating it on first use.
+
+    A pool size of 0 disables the pool: sync callers hash on their own
+    thread and async callers on the shared thread pool, which is what
+    tests and one-off scripts usually want.
+    """
+    global _pool
+    if _pool is None and settings.PASSWORD_HASH_WORKERS > 0:
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+def start_pool():
+    """Create the pool and spawn its workers ahead of the first login."""
+    pool = get_pool()
+    if pool is not None:
+        futures = [pool.submit(get_hash_rounds, "") for _ in range(settings.PASSWORD_HASH_WORKERS)]
+        for future in futures:
+            future.result()
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+async def _run(func, *args):
+    pool = get_pool()
+    if pool is None:
+        # Never on the event loop itself
+        from starlette.concurrency import run_in_threadpool
+
+        return await run_in_threadpool(func, *args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, func, *args)
+
+async def hash_password_async(password: str) -> str:
+    return await _run(hash_password, password, settings.BCRYPT_ROUNDS)
+
+async def check_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run(check_password, plain_password, hashed_password)
@@ -0,0 +1,132 @@
+import csv
+import os
+import threading
+from datetime import date
+from typing import Iterable, NamedTuple, Optional
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.formulary import get_formulary
+from app.stats import active_courses
+
+# Drug interaction and duplicate therapy checks for newly analyzed
+# prescriptions.
+#
+# Interacting pairs are loaded once from a local CSV (drug_a, drug_b,
+# severity, description, keyed by formulary drug id) into an adjacency
+# map, so checking a pair is two dict lookups. The user's current
+# medications come from the active_until column of the statistics
+# table, which already tracks when each course ends; nothing is decoded
+# from past prescriptions at request time.
+
+class Interaction(NamedTuple):
+    severity: str  # "major", "moderate" or "minor"
+    description: str
+
+class InteractionIndex:
+    def __init__(self, rows: Iterable[tuple[str, str, str, str]]):
+        self._pairs: dict[str, dict[str, Interaction]] = {}
+        for drug_a, drug_b, severity, description in rows:
+            interaction = Interaction(severity, description)
+            self._pairs.setdefault(drug_a, {})[drug_b] = interaction
+            self._pairs.setdefault(drug_b, {})[drug_a] = interaction
+
+    def __len__(self) -> int:
+        return sum(len(partners) for partners in self._pairs.values()) // 2
+
+    def between(self, drug_a: str, drug_b: str) -> Optional[Interaction]:
+        return self._pairs.get(drug_a, {}).get(drug_b)
+
+def load_interactions(path: str) -> InteractionIndex:
+    with open(path, newline="", encoding="utf-8") as file:
+        return InteractionIndex(
+            (row["drug_a"], row["drug_b"], row["severity"], row["description"])
+            for row in csv.DictReader(file)
+        )
+
+_interactions: Optional[InteractionIndex] = None
+_lock = threading.Lock()
+
+def get_interactions() -> InteractionIndex:
+    """The configured interaction index, loaded on first use (empty if not configured)."""
+    global _interactions
+    if _interactions is None:
+        with _lock:
+            if _interactions is None:
+                path = settings.INTERACTIONS_PATH
+                _interactions = load_interactions(path) if path and os.path.exists(path) else InteractionIndex([])
+    return _interactions
+
+class _Drug(NamedTuple):
+    key: str
+    name: str
+    drug_class: Optional[str]
+    active_until: Optional[date]  # Set for courses the user is already taking
+
+def _describe(drug: _Drug) -> str:
+    if drug.active_until is None:
+        return drug.name
+    return f"{drug.name} (current course until {drug.active_until.isoformat()})"
+
+def _conflict(new: _Drug, other: _Drug) -> Optional[str]:
+    interaction = get_interactions().between(new.key, other.key)
+    if interaction is not None:
+        return (
+            f"Interaction ({interaction.severity}): {_describe(new)} and "
+            f"{_describe(other)}: {interaction.description}"
+        )
+    if new.key == other.key:
+        # The same drug twice on one prescription is usually two strengths
+        if other.active_until is None:
+            return None
+        return f"Duplicate therapy: {new.name} is already being taken until {other.active_until.isoformat()}"
+    if new.drug_class and new.drug_class == other.drug_class:
+        return (
+            f"Duplicate therapy: {_describe(new)} and {_describe(other)} "
+            f"are in the same class ({new.drug_class})"
+        )
+    return None
+
+def check_prescription(db: Session, user_id: int, structured_data) -> list[str]:
+    """
+    Flag interactions and duplicate therapy between the medications of a
+    new prescription and the user's active courses (and among themselves).
+    Warnings are appended to structured_data["warnings"] and returned.
+    Medications must already carry formulary drug ids.
+    """
+    if not isinstance(structured_data, dict):
+        return []
+    formulary = get_formulary()
+
+    new_drugs = []
+    for medication in structured_data.get("medications") or []:
+        if isinstance(medication, dict) and medication.get("drug_id"):
+            entry = formulary.drug(medication["drug_id"])
+            new_drugs.append(_Drug(
+                medication["drug_id"],
+                medication.get("canonical_name") or medication["drug_id"],
+                entry.drug_class if entry else None,
+                None
+            ))
+    if not new_drugs:
+        return []
+
+    current = []
+    for course in active_courses(db, user_id):
+        entry = formulary.drug(course.drug_key)
+        if entry is not None:
+            current.append(_Drug(course.drug_key, course.name, entry.drug_class, course.active_until))
+
+    found = []
+    for index, new in enumerate(new_drugs):
+        for other in new_drugs[index + 1:] + current:
+            warning = _conflict(new, other)
+            if warning and warning not in found:
+                found.append(warning)
+    if not found:
+        return []
+
+    warnings = structured_data.get("warnings")
+    if not isinstance(warnings, list):
+        warnings = structured_data["warnings"] = [warnings] if warnings else []
+    warnings.extend(found)
+    return found
@@ -0,0 +1,182 @@
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import secrets
+import sys
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+from app.config import settings
+from app import metrics, tracing
+
+# Structured JSON logging.
+#
+# Records are handed to a bounded queue on the calling thread and written
+# by a QueueListener thread, so request handlers never wait on disk or a
+# slow pipe; when the queue is full records are dropped and counted in
+# log_records_dropped_total. Output goes to stdout, or to LOG_FILE with
+# size-based rotation ("{pid}" in the name gives each worker its own file,
+# since several processes must not rotate the same file).
+#
+# AccessLogMiddleware writes one line per request. Routes listed in
+# LOG_SAMPLE_RATES (health checks, metrics scrapes) are sampled; their
+# errors are always logged.
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "trace_id"}
+
+_request_id: ContextVar[Optional[str]] = ContextVar("log_request_id", default=None)
+
+LOG_RECORDS_DROPPED = metrics.Counter(
+    "log_records_dropped_total", "Log records dropped because the log queue was full"
+)
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in ("request_id", "trace_id"):
+            value = getattr(record, key, None)
+            if value:
+                entry[key] = value
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve everything that depends on the calling thread or context
+        # here; formatting to JSON happens on the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.request_id = _request_id.get()
+        current = tracing.current_span()
+        if current is not None:
+            record.trace_id = current.trace_id
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def _output_handler() -> logging.Handler:
+    if not settings.LOG_FILE:
+        return logging.StreamHandler(sys.stdout)
+    path = settings.LOG_FILE.format(pid=os.getpid())
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return logging.handlers.RotatingFileHandler(
+        path, maxBytes=settings.LOG_MAX_BYTES, backupCount=settings.LOG_BACKUPS, encoding="utf-8"
+    )
+
+def start_logging():
+    """Route the root logger (and uvicorn's) through the JSON queue handler."""
+    global _listener
+    if _listener is not None:
+        return
+    output = _output_handler()
+    output.setFormatter(JsonFormatter())
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=False)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.handlers = [_QueueHandler(log_queue)]
+    root.setLevel(settings.LOG_LEVEL.upper())
+    for name in ("uvicorn", "uvicorn.error", "gunicorn.error"):
+        logger = logging.getLogger(name)
+        logger.handlers = []
+        logger.propagate = True
+    # AccessLogMiddleware replaces the plain-text access log
+    logging.getLogger("uvicorn.access").disabled = True
+
+def stop_logging():
+    """Write out queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
+
+def parse_sample_rates(text: str) -> dict[str, float]:
+    rates = {}
+    for part in text.split(","):
+        route, _, rate = part.strip().partition("=")
+        if route and rate:
+            rates[route] = float(rate)
+    return rates
+
+access_logger = logging.getLogger("app.access")
+
+class AccessLogMiddleware:
+    """Pure ASGI middleware logging one JSON line per HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+        self.sample_rates = parse_sample_rates(settings.LOG_SAMPLE_RATES)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        current = tracing.current_span()
+        if current is not None:
+            request_id = current.request_id
+        else:
+            headers = dict(scope["headers"])
+            request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:128] or secrets.token_hex(8)
+        token = _request_id.set(request_id)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = getattr(scope.get("route"), "path", "unmatched")
+            rate = self.sample_rates.get(route, 1.0)
+            if status >= 500 or rate >= 1.0 or random.random() < rate:
+                client = scope.get("client")
+                access_logger.log(
+                    logging.ERROR if status >= 500 else logging.INFO,
+                    "%s %s %s", scope["method"], scope["path"], status,
+                    extra={
+                        "method": scope["method"],
+                        "route": route,
+                        "path": scope["path"],
+                        "status": status,
+                        "duration_ms": round(elapsed * 1000, 2),
+                        "client": client[0] if client else None,
+                        "sample_rate": rate,
+                    }
+                )
+            _request_id.reset(token)
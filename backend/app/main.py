@@ -1,16 +1,48 @@
-from fastapi import FastAPI
+import os
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
-from app.database import engine, Base
-from app.routers import auth, prescriptions
+from app.database import engine
+from app.routers import auth, feed, prescriptions, usage
+from app.hashing import start_pool, shutdown_pool
+from app.events import close_broker
+from app.state import close_state
+from app.formulary import get_formulary
+from app.interactions import get_interactions
+from app.model_client import get_model_client
+from app import logs, metrics, tracing
+from app.profiling import ProfilingMiddleware, profiling_enabled
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# The schema is managed by Alembic (`alembic upgrade head`), not at import
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logs.start_logging()
+    start_pool()
+    # Compile the formulary and interaction indexes before the first analyze request
+    get_formulary()
+    get_interactions()
+    # Load the image decoders and the model SDK here rather than at import
+    # time, so importing the app stays cheap for the CLI, scripts and preload
+    from PIL import Image
+    Image.init()
+    get_model_client()
+    tracing.start_tracing()
+    yield
+    tracing.shutdown_tracing()
+    # Stop password hashing workers with the app
+    shutdown_pool()
+    await close_broker()
+    await close_state()
+    logs.stop_logging()
 
 app = FastAPI(
     title="PharmaBot API",
     description="AI-powered prescription scanning and analysis",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -22,9 +54,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request metrics for /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument_engine(engine)
+
+# One JSON line per request (sampled for noisy routes)
+app.add_middleware(logs.AccessLogMiddleware)
+
+# Opt-in profiling; not installed at all unless configured
+if profiling_enabled():
+    app.add_middleware(ProfilingMiddleware)
+
+# Stage and SQL spans; not installed at all unless TRACE_EXPORT is set
+if tracing.tracing_enabled():
+    app.add_middleware(tracing.TracingMiddleware)
+    tracing.instrument_engine(engine)
+
 # Include routers
 app.include_router(auth.router)
+# Fixed /prescriptions/... paths must be registered before /prescriptions/{id}
+app.include_router(feed.router)
 app.include_router(prescriptions.router)
+app.include_router(usage.router)
 
 @app.get("/")
 def read_root():
@@ -32,4 +83,12 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
+    # The worker pid lets rolling restarts tell which worker answered
+    return {"status": "healthy", "worker": os.getpid()}
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus text format metrics for this worker process."""
+    if settings.METRICS_TOKEN and authorization != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,184 @@
+import json
+import random
+import re
+import threading
+import time
+from typing import NamedTuple, Optional
+from app.config import settings
+
+# Backends for the vision model that reads prescription images.
+#
+# MODEL_BACKEND=gemini (the default) calls Google Gemini. MODEL_BACKEND=fake
+# answers with a canned prescription after FAKE_MODEL_LATENCY seconds
+# (+/- FAKE_MODEL_JITTER), which lets load tests and local development
+# exercise /prescriptions/analyze without an API key or quota.
+
+# Structured prompt for machine-readable output
+PRESCRIPTION_PROMPT = """
+        Analyze this prescription image and extract data in valid JSON format for automatic medication dispensing.
+
+        Return ONLY valid JSON (no markdown, no code blocks) with this exact structure:
+        {
+          "prescription_id": "string or null",
+          "prescription_date": "YYYY-MM-DD or null",
+          "doctor_name": "string or null",
+          "doctor_registration": "string or null",
+          "hospital_clinic": "string or null",
+          "patient": {
+            "patient_name": "string or null",
+            "patient_age": number or null,
+            "patient_gender": "string or null",
+            "patient_id": "string or null"
+          },
+          "medications": [
+            {
+              "medicine_name": "string",
+              "generic_name": "string or null",
+              "strength": "e.g., 500mg, 10ml",
+              "dosage_form": "tablet/capsule/syrup/injection",
+              "quantity_per_dose": number,
+              "frequency": "e.g., 3 times daily",
+              "frequency_code": "TID/BID/QD/QID/Q8H/Q12H",
+              "timing": ["HH:MM", "HH:MM"],
+              "duration_days": number,
+              "total_quantity": number,
+              "before_after_food": "before/after/with/empty stomach or null",
+              "special_instructions": "string or null"
+            }
+          ],
+          "diagnosis": "string or null",
+          "allergies": ["string"] or null,
+          "warnings": ["string"] or null,
+          "follow_up_date": "YYYY-MM-DD or null",
+          "emergency_contact": "string or null"
+        }
+
+        FREQUENCY CODES:
+        - QD = Once daily, TID = 3 times daily, BID = 2 times daily, QID = 4 times daily
+        - Q8H = Every 8 hours, Q12H = Every 12 hours
+        
+        For timing, use 24-hour format. Example: ["08:00", "14:00", "20:00"] for TID
+        Calculate total_quantity = quantity_per_dose × frequency_per_day × duration_days
+        
+        If data is not visible, use null. Return ONLY the JSON, no other text.
+        """
+
+def parse_analysis(analysis_text: str) -> Optional[dict]:
+    """Parse the model's JSON answer, tolerating markdown code fences."""
+    try:
+        # Remove markdown code blocks if present
+        json_text = re.sub(r'```json\s*|\s*```', '', analysis_text)
+        return json.loads(json_text.strip())
+    except (TypeError, ValueError):
+        return None
+
+class ModelUsage(NamedTuple):
+    prompt_token_count: int
+    candidates_token_count: int
+    total_token_count: int
+
+class ModelResult(NamedTuple):
+    text: str
+    usage: Optional[object]  # Gemini usage_metadata or ModelUsage
+
+class ModelClient:
+    name = ""
+
+    def generate(self, prompt: str, image) -> ModelResult:
+        """Blocking call; run it on the thread pool from async code."""
+        raise NotImplementedError
+
+class GeminiClient(ModelClient):
+    def __init__(self, model_name: str, api_key: str):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.name = model_name
+        self._model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt: str, image) -> ModelResult:
+        response = self._model.generate_content([prompt, image])
+        return ModelResult(response.text, getattr(response, "usage_metadata", None))
+
+_FAKE_MEDICATIONS = [
+    ("Napa", "Paracetamol", "500mg", "tablet"),
+    ("Seclo", "Omeprazole", "20mg", "capsule"),
+    ("Amoxil", "Amoxicillin", "250mg", "capsule"),
+    ("Fexo", "Fexofenadine", "120mg", "tablet"),
+]
+
+class FakeModelClient(ModelClient):
+    """Answers like the real model would, after a configurable delay."""
+
+    name = "fake"
+
+    def __init__(self, latency: float, jitter: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str, image) -> ModelResult:
+        with self._lock:
+            delay = self.latency * (1 + self._random.uniform(-self.jitter, self.jitter))
+            count = self._random.randint(1, len(_FAKE_MEDICATIONS))
+            duration = self._random.choice([3, 5, 7, 14])
+        time.sleep(max(delay, 0.0))
+
+        medications = [
+            {
+                "medicine_name": brand,
+                "generic_name": generic,
+                "strength": strength,
+                "dosage_form": form,
+                "quantity_per_dose": 1,
+                "frequency": "2 times daily",
+                "frequency_code": "BID",
+                "timing": ["08:00", "20:00"],
+                "duration_days": duration,
+                "total_quantity": 2 * duration,
+                "before_after_food": "after",
+                "special_instructions": None,
+            }
+            for brand, generic, strength, form in _FAKE_MEDICATIONS[:count]
+        ]
+        text = json.dumps({
+            "prescription_id": None,
+            "prescription_date": time.strftime("%Y-%m-%d"),
+            "doctor_name": "Dr. Fake",
+            "doctor_registration": None,
+            "hospital_clinic": None,
+            "patient": {"patient_name": None, "patient_age": None, "patient_gender": None, "patient_id": None},
+            "medications": medications,
+            "diagnosis": None,
+            "allergies": None,
+            "warnings": None,
+            "follow_up_date": None,
+            "emergency_contact": None,
+        }, indent=2)
+        # Roughly what a small image plus the prompt costs on the real model
+        usage = ModelUsage(1800, len(text) // 4, 1800 + len(text) // 4)
+        return ModelResult(f"```json\n{text}\n```", usage)
+
+_client: Optional[ModelClient] = None
+_lock = threading.Lock()
+
+def get_model_client() -> ModelClient:
+    """The configured model backend, created on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                if settings.MODEL_BACKEND == "fake":
+                    _client = FakeModelClient(settings.FAKE_MODEL_LATENCY, settings.FAKE_MODEL_JITTER)
+                elif settings.MODEL_BACKEND == "gemini":
+                    _client = GeminiClient(settings.GEMINI_MODEL, settings.GEMINI_API_KEY)
+                else:
+                    raise ValueError(f"Unknown MODEL_BACKEND: {settings.MODEL_BACKEND}")
+    return _client
+
+def set_model_client(client: Optional[ModelClient]):
+    """Replace the process-wide model client (None: recreate from settings on next use)."""
+    global _client
+    with _lock:
+        _client = client
@@ -1,6 +1,8 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, JSON
+from sqlalchemy import Column, Integer, String, Date, DateTime, Float, Index, event, insert, select, update
+from sqlalchemy.orm import Session
 from datetime import datetime
 from app.database import Base
+from app.compression import CompressedText, CompressedJSON
 
 class User(Base):
     __tablename__ = "users"
@@ -26,6 +28,121 @@ class Prescription(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, nullable=False)
     filename = Column(String, nullable=False)
-    analysis = Column(Text, nullable=True)  # Raw AI analysis text
-    structured_data = Column(JSON, nullable=True)  # Machine-readable JSON schema
+    analysis = Column(CompressedText, nullable=True)  # Raw AI analysis text
+    structured_data = Column(CompressedJSON, nullable=True)  # Machine-readable JSON schema
     created_at = Column(DateTime, default=datetime.utcnow)
+    change_seq = Column(Integer, nullable=True)  # Bumped on every insert/update (delta sync)
+
+    __table_args__ = (
+        Index("ix_prescriptions_user_id_change_seq", "user_id", "change_seq"),
+    )
+
+class PrescriptionArchive(Base):
+    """Cold storage for old prescriptions, moved here by `app.cli archive`."""
+    __tablename__ = "prescriptions_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False, index=True)
+    filename = Column(String, nullable=False)
+    analysis = Column(CompressedText, nullable=True)
+    structured_data = Column(CompressedJSON, nullable=True)
+    created_at = Column(DateTime)
+    change_seq = Column(Integer, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+class PrescriptionTombstone(Base):
+    __tablename__ = "prescription_tombstones"
+
+    id = Column(Integer, primary_key=True, index=True)
+    prescription_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    change_seq = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_prescription_tombstones_user_id_change_seq", "user_id", "change_seq"),
+    )
+
+class UserMedicationStats(Base):
+    """Per-user running totals for one drug, maintained by app.stats."""
+    __tablename__ = "user_medication_stats"
+
+    user_id = Column(Integer, primary_key=True)
+    drug_key = Column(String, primary_key=True)  # Normalized drug identity
+    name = Column(String, nullable=False)  # Name as last prescribed
+    prescriptions = Column(Integer, nullable=False, default=0)
+    total_units = Column(Integer, nullable=False, default=0)
+    last_prescribed = Column(Date, nullable=True)
+    active_until = Column(Date, nullable=True)  # End of the latest course
+
+class UserMonthlyStats(Base):
+    """Prescriptions per user per calendar month ("YYYY-MM")."""
+    __tablename__ = "user_monthly_stats"
+
+    user_id = Column(Integer, primary_key=True)
+    month = Column(String(7), primary_key=True)
+    prescriptions = Column(Integer, nullable=False, default=0)
+
+class ModelUsageRecord(Base):
+    """One model call: tokens, latency and cost, linked to its prescription."""
+    __tablename__ = "model_usage"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    prescription_id = Column(Integer, nullable=True, index=True)  # Stays valid after archiving
+    model = Column(String, nullable=False)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    output_tokens = Column(Integer, nullable=False, default=0)
+    total_tokens = Column(Integer, nullable=False, default=0)
+    image_bytes = Column(Integer, nullable=False, default=0)
+    model_ms = Column(Float, nullable=False, default=0)
+    queue_ms = Column(Float, nullable=False, default=0)
+    cost = Column(Float, nullable=False, default=0)  # USD at the prices configured at call time
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_model_usage_user_id_created_at", "user_id", "created_at"),
+    )
+
+class ChangeSequence(Base):
+    """Single-row counter backing Prescription.change_seq."""
+    __tablename__ = "change_sequence"
+
+    id = Column(Integer, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+def next_change_seqs(session: Session, count: int) -> range:
+    """
+    Reserve `count` consecutive change sequence numbers.
+    The counter row stays write-locked until the transaction commits, so
+    sequences become visible to readers in the order they were issued.
+    """
+    result = session.execute(
+        update(ChangeSequence)
+        .where(ChangeSequence.id == 1)
+        .values(value=ChangeSequence.value + count)
+    )
+    if result.rowcount == 0:
+        session.execute(insert(ChangeSequence).values(id=1, value=count))
+    last = session.execute(select(ChangeSequence.value).where(ChangeSequence.id == 1)).scalar_one()
+    return range(last - count + 1, last + 1)
+
+@event.listens_for(Session, "before_flush")
+def _assign_change_seqs(session, flush_context, instances):
+    changed = [
+        obj for obj in list(session.new) + list(session.dirty)
+        if isinstance(obj, Prescription) and session.is_modified(obj)
+    ]
+    deleted = [obj for obj in session.deleted if isinstance(obj, Prescription)]
+    if not changed and not deleted:
+        return
+
+    seqs = iter(next_change_seqs(session, len(changed) + len(deleted)))
+    for prescription in changed:
+        prescription.change_seq = next(seqs)
+    for prescription in deleted:
+        session.add(PrescriptionTombstone(
+            prescription_id=prescription.id,
+            user_id=prescription.user_id,
+            change_seq=next(seqs)
+        ))
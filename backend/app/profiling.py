@@ -0,0 +1,214 @@
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+from app.config import settings
+
+# Opt-in request profiling.
+#
+# A request is profiled when it carries `X-Profile: <PROFILING_TOKEN>` or is
+# picked by PROFILE_SAMPLE_RATE. A sampler thread then records the stacks
+# of all busy threads (the event loop and thread pool workers) every
+# PROFILE_INTERVAL seconds until the response is sent.
+#
+# Profiles are process-wide, not per request: the event loop and the thread
+# pool are shared, so there is no thread to pin a request to, and whatever
+# else the worker was busy with while the request ran is sampled too. File
+# names say so ("-process-"), and each stack starts with its thread name.
+#
+# With SLOW_REQUEST_SECONDS set, a watchdog thread starts sampling any
+# request that is still running after the threshold, so slow requests
+# leave a profile of where the rest of their time went.
+#
+# Profiles are written to PROFILE_DIR in the collapsed stack format
+# ("thread;frame;frame count" per line), which flamegraph.pl and
+# speedscope read directly. The middleware is only installed when one of
+# the settings is enabled, so there is no overhead otherwise.
+
+PROFILE_HEADER = b"x-profile"
+
+# Streaming endpoints are long-lived by design and never watched as slow
+LONG_LIVED_PATHS = {"/prescriptions/feed", "/prescriptions/export"}
+
+# Leaf frames of threads that are parked rather than working
+_IDLE_LEAVES = {("threading.py", "wait"), ("selectors.py", "select"), ("queue.py", "get")}
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def sample_stacks(counts: Counter, exclude: set[int]):
+    """Add one collapsed stack per busy thread to `counts`."""
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    for ident, frame in sys._current_frames().items():
+        if ident in exclude:
+            continue
+        leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+        if leaf in _IDLE_LEAVES:
+            continue
+        stack = []
+        while frame is not None:
+            stack.append(_frame_label(frame))
+            frame = frame.f_back
+        stack.append(names.get(ident, str(ident)))
+        counts[";".join(reversed(stack))] += 1
+
+class StackSampler:
+    """Samples all other threads on a background thread until stopped."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+    def _run(self):
+        own = {threading.get_ident()}
+        while not self._stop.wait(self.interval):
+            sample_stacks(self.counts, own)
+
+class _Watched:
+    __slots__ = ("started", "counts")
+
+    def __init__(self, started: float):
+        self.started = started
+        self.counts: Counter = Counter()
+
+class SlowRequestWatchdog:
+    """Starts sampling requests once they have run longer than `threshold` seconds."""
+
+    def __init__(self, threshold: float, interval: float):
+        self.threshold = threshold
+        self.interval = interval
+        self._watched: dict[int, _Watched] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._next_token = 0
+
+    def begin(self) -> int:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-request-watchdog", daemon=True)
+                self._thread.start()
+            self._next_token += 1
+            token = self._next_token
+            was_empty = not self._watched
+            self._watched[token] = _Watched(time.perf_counter())
+        if was_empty:
+            self._wake.set()
+        return token
+
+    def end(self, token: int) -> Counter:
+        with self._lock:
+            return self._watched.pop(token).counts
+
+    def _run(self):
+        own = {threading.get_ident()}
+        while True:
+            with self._lock:
+                starts = [watched.started for watched in self._watched.values()]
+            now = time.perf_counter()
+            if not starts or min(starts) + self.threshold > now:
+                # Sleep until the oldest request could become slow; a request
+                # arriving while nothing is watched wakes us up
+                self._wake.wait(min(starts) + self.threshold - now if starts else None)
+                self._wake.clear()
+                continue
+
+            counts: Counter = Counter()
+            sample_stacks(counts, own)
+            with self._lock:
+                for watched in self._watched.values():
+                    if now - watched.started >= self.threshold:
+                        watched.counts.update(counts)
+            time.sleep(self.interval)
+
+def write_profile(counts: Counter, method: str, route: str, elapsed: float, reason: str) -> str:
+    """
+    Write collapsed stacks to PROFILE_DIR and return the file name. A
+    requested profile of a request faster than one sample interval is empty.
+    The stacks cover every busy thread of the process, not only this request.
+    """
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+    name = (
+        f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{method}-{slug}-"
+        f"{reason}-process-{int(elapsed * 1000)}ms.collapsed"
+    )
+    with open(os.path.join(settings.PROFILE_DIR, name), "w", encoding="utf-8") as file:
+        for stack, count in counts.most_common():
+            file.write(f"{stack} {count}\n")
+    return name
+
+def _finish_requested(sampler: StackSampler, method: str, route: str, elapsed: float):
+    write_profile(sampler.stop(), method, route, elapsed, "requested")
+
+def profiling_enabled() -> bool:
+    return bool(settings.PROFILING_TOKEN) or settings.PROFILE_SAMPLE_RATE > 0 or settings.SLOW_REQUEST_SECONDS > 0
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware; install only when profiling_enabled()."""
+
+    def __init__(self, app):
+        self.app = app
+        self.token = settings.PROFILING_TOKEN.encode("latin-1")
+        self.watchdog = (
+            SlowRequestWatchdog(settings.SLOW_REQUEST_SECONDS, settings.PROFILE_INTERVAL)
+            if settings.SLOW_REQUEST_SECONDS > 0 else None
+        )
+
+    def _requested(self, scope) -> bool:
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER and value == self.token:
+                    return True
+        return settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        sampler = StackSampler(settings.PROFILE_INTERVAL).start() if self._requested(scope) else None
+        token = None
+        if self.watchdog is not None and sampler is None and scope["path"] not in LONG_LIVED_PATHS:
+            token = self.watchdog.begin()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = getattr(scope.get("route"), "path", "unmatched")
+            # Joining the sampler and writing the file block, so they run on
+            # a thread of their own rather than on the event loop
+            if sampler is not None:
+                threading.Thread(
+                    target=_finish_requested,
+                    args=(sampler, scope["method"], route, elapsed),
+                    name="profile-writer",
+                    daemon=True
+                ).start()
+            elif token is not None:
+                counts = self.watchdog.end(token)
+                if counts:
+                    threading.Thread(
+                        target=write_profile,
+                        args=(counts, scope["method"], route, elapsed, "slow"),
+                        name="profile-writer",
+                        daemon=True
+                    ).start()
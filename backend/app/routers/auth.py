@@ -1,13 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from datetime import timedelta
+from typing import Optional
+from starlette.concurrency import run_in_threadpool
 from app.database import get_db
 from app.models import User
 from app.schemas import UserCreate, UserResponse, Token, RefreshTokenRequest
 from app.auth import (
-    get_password_hash,
-    verify_password,
+    get_password_hash_async,
+    verify_password_async,
+    rehash_password,
     create_access_token,
     create_refresh_token,
     verify_refresh_token,
@@ -17,45 +21,79 @@ from app.config import settings
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
-@router.post("/register", response_model=UserResponse)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    # Check if user already exists
-    db_user = db.query(User).filter(User.username == user.username).first()
-    if db_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Username already registered"
-        )
-    
-    # Create new user
-    hashed_password = get_password_hash(user.password)
-    new_user = User(username=user.username, hashed_password=hashed_password)
-    db.add(new_user)
+# The handlers are async so they can await the hashing pool without holding
+# a thread; their database work still runs on the thread pool.
+
+def _username_taken(db: Session, username: str) -> bool:
+    taken = db.query(User.id).filter(User.username == username).first() is not None
+    # Release the pooled connection while waiting on the hashing pool
     db.commit()
+    return taken
+
+def _create_user(db: Session, username: str, hashed_password: str) -> Optional[User]:
+    """The new user, or None if the name was taken while the password hashed."""
+    new_user = User(username=username, hashed_password=hashed_password)
+    db.add(new_user)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return None
     db.refresh(new_user)
+    return new_user
+
+def _load_credentials(db: Session, username: str) -> Optional[tuple[int, str, str]]:
+    row = db.query(User.id, User.username, User.hashed_password).filter(User.username == username).first()
+    # Release the pooled connection while waiting on the hashing pool
+    db.commit()
+    return tuple(row) if row else None
+
+def _finish_login(db: Session, user_id: int, new_hash: Optional[str]) -> str:
+    if new_hash is not None:
+        db.query(User).filter(User.id == user_id).update({User.hashed_password: new_hash})
+    return create_refresh_token(user_id, db)
+
+@router.post("/register", response_model=UserResponse)
+async def register(user: UserCreate, db: Session = Depends(get_db)):
+    taken = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Username already registered"
+    )
+    # Check if user already exists
+    if await run_in_threadpool(_username_taken, db, user.username):
+        raise taken
     
+    # Create new user; a concurrent registration may have claimed the name meanwhile
+    hashed_password = await get_password_hash_async(user.password)
+    new_user = await run_in_threadpool(_create_user, db, user.username, hashed_password)
+    if new_user is None:
+        raise taken
     return new_user
 
 @router.post("/login", response_model=Token)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
     # Authenticate user
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    credentials = await run_in_threadpool(_load_credentials, db, form_data.username)
+    if not credentials or not await verify_password_async(form_data.password, credentials[2]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    user_id, username, hashed_password = credentials
+    
+    # Transparently move old hashes to the configured cost factor
+    new_hash = await rehash_password(form_data.password, hashed_password)
+    refresh_token = await run_in_threadpool(_finish_login, db, user_id, new_hash)
     
     # Create tokens
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": username}, expires_delta=access_token_expires
     )
-    refresh_token = create_refresh_token(user.id, db)
     
     return {
         "access_token": access_token,
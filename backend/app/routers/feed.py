@@ -0,0 +1,158 @@
+from fastapi import APIRouter, Depends, Header, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func
+from typing import AsyncIterator, Optional
+from sqlalchemy.orm import Session
+from app.database import SessionLocal, get_db
+from app.models import User, Prescription
+from app.auth import get_current_user, authenticate_token
+from app.config import settings
+from app.events import get_broker, user_channel, prescription_event, SubscriptionOverflow
+from app import serialization
+
+router = APIRouter(prefix="/prescriptions", tags=["feed"])
+
+# Rows fetched per query while a device catches up from its cursor
+CATCH_UP_BATCH_SIZE = 100
+
+# The cursor is the prescription's change_seq, the same cursor as delta
+# sync. Sequence numbers become visible in the order they were issued, so
+# reading rows past the cursor never skips one that commits later.
+
+def _latest_cursor(user_id: int) -> int:
+    db = SessionLocal()
+    try:
+        latest = db.query(func.max(Prescription.change_seq)).filter(
+            Prescription.user_id == user_id
+        ).scalar()
+        return latest or 0
+    finally:
+        db.close()
+
+def _missed_events(user_id: int, cursor: int) -> list[dict]:
+    db = SessionLocal()
+    try:
+        rows = db.query(
+            Prescription.id,
+            Prescription.change_seq,
+            Prescription.filename,
+            Prescription.created_at,
+            Prescription.structured_data
+        ).filter(
+            Prescription.user_id == user_id,
+            Prescription.change_seq > cursor
+        ).order_by(Prescription.change_seq).limit(CATCH_UP_BATCH_SIZE).all()
+        return [prescription_event(row) for row in rows]
+    finally:
+        db.close()
+
+async def _feed(user_id: int, cursor: Optional[int]) -> AsyncIterator[Optional[dict]]:
+    """
+    Yield new prescriptions for a user after `cursor`, then live ones as
+    they are published. Yields None when idle so transports can send
+    keep-alives. Without a cursor the feed starts at the newest row.
+    """
+    if cursor is None:
+        cursor = await run_in_threadpool(_latest_cursor, user_id)
+
+    broker = get_broker()
+    while True:
+        # Subscribe before catching up so rows committed in between are not missed
+        async with broker.subscribe(user_channel(user_id)) as subscription:
+            pending = True
+            try:
+                while True:
+                    while pending:
+                        missed = await run_in_threadpool(_missed_events, user_id, cursor)
+                        for event in missed:
+                            cursor = event["cursor"]
+                            yield event
+                        pending = len(missed) == CATCH_UP_BATCH_SIZE
+
+                    event = await subscription.get(settings.FEED_HEARTBEAT_SECONDS)
+                    if event is None:
+                        yield None
+                    else:
+                        # Events from concurrent analyses can be published out of
+                        # order; read from the database instead of trusting this one
+                        pending = event["cursor"] > cursor
+            except SubscriptionOverflow:
+                # Fell behind the live stream; resubscribe and catch up from the database
+                continue
+
+@router.get("/feed")
+async def prescription_feed(
+    cursor: Optional[int] = Query(None, description="Resume after this cursor"),
+    last_event_id: Optional[int] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Server-Sent Events stream of new prescriptions for dispensing machines.
+    Each event id is a cursor; reconnecting with Last-Event-ID (or ?cursor=)
+    replays only what was missed.
+    """
+    if last_event_id is not None:
+        cursor = last_event_id
+    user_id = current_user.id
+    # Return the connection to the pool; the stream can stay open for hours
+    db.close()
+
+    async def stream():
+        async for event in _feed(user_id, cursor):
+            if event is None:
+                yield b": keep-alive\n\n"
+                continue
+            yield (
+                f"id: {event['cursor']}\nevent: prescription\ndata: ".encode("utf-8")
+                + serialization.encode_json(event)
+                + b"\n\n"
+            )
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _authenticate(token: str) -> Optional[User]:
+    db = SessionLocal()
+    try:
+        return authenticate_token(token, db)
+    finally:
+        db.close()
+
+@router.websocket("/feed/ws")
+async def prescription_feed_ws(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None),
+    cursor: Optional[int] = Query(None)
+):
+    """
+    WebSocket variant of /prescriptions/feed. Authenticate with ?token=
+    (or an Authorization header); messages are JSON objects with a
+    "cursor" to pass back on reconnect.
+    """
+    if token is None:
+        authorization = websocket.headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            token = authorization[7:]
+
+    user = await run_in_threadpool(_authenticate, token) if token else None
+
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    try:
+        async for event in _feed(user.id, cursor):
+            if event is None:
+                await websocket.send_text('{"event":"heartbeat"}')
+                continue
+            await websocket.send_text(
+                serialization.encode_json({"event": "prescription", **event}).decode("utf-8")
+            )
+    except WebSocketDisconnect:
+        pass
@@ -1,22 +1,49 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Header, Query, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-import google.generativeai as genai
-from PIL import Image
+from typing import Optional
 import io
+import logging
+import time
 from app.database import get_db
-from app.models import User, Prescription
+from app.models import User, Prescription, PrescriptionArchive, PrescriptionTombstone
 from app.auth import get_current_user
-from app.schemas import PrescriptionAnalysisResponse
+from app.schemas import PrescriptionAnalysisResponse, StructuredBatchRequest
 from app.config import settings
+from app.cache import LRUCache, UserPageCache, make_etag, etag_matches
+from app.events import get_broker, user_channel, prescription_event
+from app.export import EXPORT_FORMATS, parquet_available, stream_export
+from app.stats import record_prescription, user_stats
+from app.formulary import normalize_medications
+from app.interactions import check_prescription
+from app import metrics, serialization
+from app.tracing import KIND_CLIENT, span
+from app.model_client import PRESCRIPTION_PROMPT, get_model_client, parse_analysis
+from app.scheduler import check_priority, check_rate_limit, get_scheduler
+from app.usage import check_budget, record_usage
+from app.backfill import save_image
+from app.state import get_state
 
 router = APIRouter(prefix="/prescriptions", tags=["prescriptions"])
 
-# Configure Gemini API
-genai.configure(api_key=settings.GEMINI_API_KEY)
+logger = logging.getLogger(__name__)
+
+# Serialized single-prescription responses, keyed by (user, generation, id,
+# variant, format); the user's generation changes with every write
+response_cache = LRUCache(settings.PRESCRIPTION_CACHE_SIZE)
+
+# Serialized history pages per user; invalidated whenever the user's
+# prescriptions change, through any worker
+history_cache = UserPageCache(settings.HISTORY_CACHE_SIZE)
 
 @router.post("/analyze", response_model=PrescriptionAnalysisResponse)
 async def analyze_prescription(
     file: UploadFile = File(...),
+    x_priority: str = Header("normal", description="Scheduling class: urgent, normal or backfill"),
+    idempotency_key: Optional[str] = Header(
+        None, description="Repeats with the same key return the first result instead of analyzing again"
+    ),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -24,155 +51,401 @@ async def analyze_prescription(
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
     
+    # Before anything that counts against the user's limits
+    check_priority(x_priority, current_user.username)
+    user_id = current_user.id
+    if not idempotency_key:
+        return await _analyze(file, x_priority, user_id, db)
+    
+    # Claimed in the shared state, so retries landing on another worker see it too
+    state = get_state()
+    key = f"idempotency:analyze:{user_id}:{idempotency_key[:128]}"
+    if not await state.set_if_absent(key, b"pending", settings.MODEL_QUEUE_TIMEOUT + 300):
+        previous = await state.get(key)
+        if previous is None or previous == b"pending":
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is still being processed",
+                headers={"Retry-After": "5"}
+            )
+        prescription = _find_prescription(
+            db, user_id, int(previous), ["id", "filename", "analysis", "structured_data", "created_at"]
+        )
+        if prescription is None:
+            raise HTTPException(status_code=404, detail="Prescription not found")
+        return prescription
+    
     try:
-        # Read image
-        contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
-        
-        # Use Gemini Flash-Lite (cheapest model for free tier with vision capability)
-        model = genai.GenerativeModel('gemini-2.0-flash-lite')
-        
-        # Structured prompt for machine-readable output
-        prompt = """
-        Analyze this prescription image and extract data in valid JSON format for automatic medication dispensing.
-
-        Return ONLY valid JSON (no markdown, no code blocks) with this exact structure:
-        {
-          "prescription_id": "string or null",
-          "prescription_date": "YYYY-MM-DD or null",
-          "doctor_name": "string or null",
-          "doctor_registration": "string or null",
-          "hospital_clinic": "string or null",
-          "patient": {
-            "patient_name": "string or null",
-            "patient_age": number or null,
-            "patient_gender": "string or null",
-            "patient_id": "string or null"
-          },
-          "medications": [
-            {
-              "medicine_name": "string",
-              "generic_name": "string or null",
-              "strength": "e.g., 500mg, 10ml",
-              "dosage_form": "tablet/capsule/syrup/injection",
-              "quantity_per_dose": number,
-              "frequency": "e.g., 3 times daily",
-              "frequency_code": "TID/BID/QD/QID/Q8H/Q12H",
-              "timing": ["HH:MM", "HH:MM"],
-              "duration_days": number,
-              "total_quantity": number,
-              "before_after_food": "before/after/with/empty stomach or null",
-              "special_instructions": "string or null"
-            }
-          ],
-          "diagnosis": "string or null",
-          "allergies": ["string"] or null,
-          "warnings": ["string"] or null,
-          "follow_up_date": "YYYY-MM-DD or null",
-          "emergency_contact": "string or null"
-        }
+        prescription = await _analyze(file, x_priority, user_id, db)
+    except BaseException:
+        # Failed requests may be retried with the same key
+        await state.delete(key)
+        raise
+    await state.set(key, str(prescription.id).encode(), settings.IDEMPOTENCY_TTL)
+    return prescription
 
-        FREQUENCY CODES:
-        - QD = Once daily, TID = 3 times daily, BID = 2 times daily, QID = 4 times daily
-        - Q8H = Every 8 hours, Q12H = Every 12 hours
-        
-        For timing, use 24-hour format. Example: ["08:00", "14:00", "20:00"] for TID
-        Calculate total_quantity = quantity_per_dose × frequency_per_day × duration_days
+async def _analyze(file: UploadFile, x_priority: str, user_id: int, db: Session) -> Prescription:
+    await check_rate_limit(user_id)
+    check_budget(db, user_id)
+    try:
+        # Read image
+        with span("upload.read") as stage:
+            contents = await file.read()
+            if stage is not None:
+                stage.set("upload.bytes", len(contents))
+        metrics.ANALYZE_IMAGE_BYTES.inc(len(contents))
+        with span("image.decode"):
+            from PIL import Image
+            image = Image.open(io.BytesIO(contents))
+            image.load()
         
-        If data is not visible, use null. Return ONLY the JSON, no other text.
-        """
+        # Release the pooled connection while waiting on the model
+        db.commit()
         
-        response = model.generate_content([prompt, image])
-        analysis_text = response.text
+        client = get_model_client()
+        # Take turns with other users for a model slot
+        async with get_scheduler().slot(user_id, x_priority) as queue_seconds:
+            started = time.perf_counter()
+            try:
+                with span("model.generate", KIND_CLIENT, model=client.name, queue_seconds=queue_seconds):
+                    # The model call blocks, so keep it off the event loop
+                    result = await run_in_threadpool(client.generate, PRESCRIPTION_PROMPT, image)
+                analysis_text = result.text
+            except Exception:
+                metrics.MODEL_REQUESTS.labels("error").inc()
+                raise
+            finally:
+                model_seconds = time.perf_counter() - started
+                metrics.MODEL_SECONDS.observe(model_seconds)
+        metrics.MODEL_REQUESTS.labels("success").inc()
+        metrics.record_model_usage(result.usage)
         
-        # Parse JSON from AI response
-        import json
-        import re
+        # Parse JSON from AI response (None if it isn't valid JSON - raw text is still saved)
+        with span("response.parse") as stage:
+            structured_data = parse_analysis(analysis_text)
+            if stage is not None:
+                stage.set("parse.ok", structured_data is not None)
+        metrics.ANALYZE_PARSE.labels("ok" if structured_data is not None else "failed").inc()
         
-        structured_data = None
-        try:
-            # Remove markdown code blocks if present
-            json_text = re.sub(r'```json\s*|\s*```', '', analysis_text)
-            json_text = json_text.strip()
-            structured_data = json.loads(json_text)
-        except:
-            # If parsing fails, store None - raw text is still saved
-            structured_data = None
+        # Map free-text medication names to formulary drug ids
+        with span("formulary.normalize"):
+            normalize_medications(structured_data)
+        # Flag conflicts with the user's current medications (before this
+        # prescription is counted as one of them)
+        with span("interactions.check"):
+            warnings = check_prescription(db, user_id, structured_data)
         
         # Save to database
         prescription = Prescription(
-            user_id=current_user.id,
+            user_id=user_id,
             filename=file.filename,
             analysis=analysis_text,
             structured_data=structured_data
         )
-        db.add(prescription)
-        db.commit()
+        with span("db.insert"):
+            db.add(prescription)
+            record_prescription(db, user_id, structured_data)
+            db.flush()
+            usage = record_usage(
+                db, user_id, prescription.id, client.name, result.usage,
+                len(contents), model_seconds, queue_seconds
+            )
+        with span("db.commit"):
+            db.commit()
+        await history_cache.invalidate(user_id)
         db.refresh(prescription)
+        if settings.UPLOAD_DIR:
+            # Keep the image so the prescription can be re-analyzed later
+            with span("image.store"):
+                await run_in_threadpool(save_image, user_id, prescription.id, file.filename, contents)
         
+        # Push to any connected dispensing machines
+        await get_broker().publish(
+            user_channel(user_id), prescription_event(prescription)
+        )
+        
+        medications = structured_data.get("medications") if isinstance(structured_data, dict) else None
+        logger.info("Prescription analyzed", extra={
+            "user_id": user_id,
+            "prescription_id": prescription.id,
+            "image_bytes": len(contents),
+            "model": client.name,
+            "priority": x_priority,
+            "queue_ms": round(queue_seconds * 1000, 1),
+            "model_ms": round(model_seconds * 1000, 1),
+            "tokens": usage.total_tokens,
+            "cost": usage.cost,
+            "parsed": structured_data is not None,
+            "medications": len(medications) if isinstance(medications, list) else 0,
+            "interaction_warnings": len(warnings),
+        })
         return prescription
         
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Prescription analysis failed", extra={"user_id": user_id})
         raise HTTPException(
             status_code=500,
             detail=f"Error analyzing prescription: {str(e)}"
         )
 
+_HISTORY_COLUMNS = ["id", "user_id", "filename", "analysis", "structured_data", "created_at", "change_seq"]
+
+def _load_history_page(db: Session, user_id: int, limit: Optional[int], offset: int) -> bytes:
+    query = db.query(*[getattr(Prescription, name) for name in _HISTORY_COLUMNS]).filter(
+        Prescription.user_id == user_id
+    ).order_by(Prescription.created_at.desc(), Prescription.id.desc())
+    if offset:
+        query = query.offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    
+    return serialization.encode_json([
+        {name: getattr(row, name) for name in _HISTORY_COLUMNS} for row in query
+    ])
+
 @router.get("/history")
 async def get_prescription_history(
+    limit: Optional[int] = Query(None, ge=1, le=settings.HISTORY_PAGE_MAX),
+    offset: int = Query(0, ge=0),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    prescriptions = db.query(Prescription).filter(
-        Prescription.user_id == current_user.id
-    ).order_by(Prescription.created_at.desc()).all()
+    """
+    Get the user's prescriptions, newest first.
+    Without `limit` the whole history is returned. Pages are served from a
+    per-user cache until the user analyzes a new prescription.
+    """
+    user_id = current_user.id
+    body = await history_cache.get(
+        user_id,
+        (limit, offset),
+        lambda: _load_history_page(db, user_id, limit, offset)
+    )
     
-    return prescriptions
+    return Response(content=body, media_type=serialization.JSON)
 
-@router.get("/{prescription_id}")
-async def get_prescription(
-    prescription_id: int,
+@router.get("/queue")
+async def get_model_queue(current_user: User = Depends(get_current_user)):
+    """
+    The user's place in the model queue: analyses running and waiting now,
+    and how long recent analyses waited for a model slot (this worker).
+    """
+    scheduler = get_scheduler()
+    return {"user": scheduler.user_status(current_user.id), "model": scheduler.status()}
+
+@router.get("/stats")
+async def get_prescription_stats(
+    top: int = Query(10, ge=1, le=100, description="Number of medications to return"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    Get a single prescription by ID.
-    Returns the complete prescription data including analysis and structured data.
+    Medication statistics: most prescribed medications with their total
+    units, prescriptions per month and courses that are still running.
+    Served from running totals updated at analyze time.
     """
-    prescription = db.query(Prescription).filter(
-        Prescription.id == prescription_id,
-        Prescription.user_id == current_user.id
-    ).first()
+    return Response(
+        content=serialization.encode_json(user_stats(db, current_user.id, top)),
+        media_type=serialization.JSON
+    )
+
+def _structured_batch(
+    db: Session,
+    user_id: int,
+    ids: list[int],
+    media_type: str
+) -> Response:
+    if not ids:
+        raise HTTPException(status_code=400, detail="At least one id is required")
+    if len(ids) > settings.STRUCTURED_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.STRUCTURED_BATCH_MAX_IDS} ids per request"
+        )
     
-    if not prescription:
-        raise HTTPException(status_code=404, detail="Prescription not found")
+    ids = list(dict.fromkeys(ids))
+    found = {}
+    for model in (Prescription, PrescriptionArchive):
+        missing = [prescription_id for prescription_id in ids if prescription_id not in found]
+        if not missing:
+            break
+        rows = db.query(
+            model.id,
+            model.filename,
+            model.created_at,
+            model.structured_data
+        ).filter(
+            model.user_id == user_id,
+            model.id.in_(missing)
+        ).all()
+        found.update((row.id, row) for row in rows)
     
-    return {
-        "id": prescription.id,
-        "filename": prescription.filename,
-        "analysis": prescription.analysis,
-        "structured_data": prescription.structured_data,
-        "created_at": prescription.created_at
-    }
+    results = {}
+    for prescription_id in ids:
+        row = found.get(prescription_id)
+        if row is None:
+            results[str(prescription_id)] = {"error": "not_found"}
+        elif not row.structured_data:
+            results[str(prescription_id)] = {"error": "structured_data_unavailable"}
+        else:
+            results[str(prescription_id)] = _structured_payload(row)
+    
+    return Response(
+        content=serialization.encode({"results": results}, media_type),
+        media_type=media_type,
+        headers={"Vary": "Accept"}
+    )
 
-@router.get("/{prescription_id}/structured")
-async def get_structured_data(
-    prescription_id: int,
+@router.get("/structured:batch")
+async def get_structured_batch(
+    ids: list[str] = Query(..., description="Prescription ids, repeated or comma-separated"),
+    accept: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    Get only the structured JSON data for a prescription.
-    This endpoint is optimized for automatic dispensing machines.
+    Get structured data for several prescriptions in one request.
+    Returns a map keyed by id; ids that do not exist (or belong to another
+    user) map to an error entry instead of failing the whole request.
     """
-    prescription = db.query(Prescription).filter(
-        Prescription.id == prescription_id,
-        Prescription.user_id == current_user.id
-    ).first()
+    try:
+        parsed = [int(value) for item in ids for value in item.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be integers")
     
-    if not prescription:
-        raise HTTPException(status_code=404, detail="Prescription not found")
+    return _structured_batch(db, current_user.id, parsed, serialization.negotiate(accept))
+
+@router.post("/structured:batch")
+async def post_structured_batch(
+    batch: StructuredBatchRequest,
+    accept: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Same as GET /prescriptions/structured:batch, for id lists that do not
+    fit comfortably in a query string.
+    """
+    return _structured_batch(db, current_user.id, batch.ids, serialization.negotiate(accept))
+
+@router.get("/changes")
+async def get_changes(
+    since: int = Query(0, ge=0, description="Cursor returned by the previous sync"),
+    limit: int = Query(settings.SYNC_PAGE_SIZE, ge=1, le=settings.SYNC_PAGE_SIZE),
+    accept: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Delta sync for device caches.
+    Returns prescriptions created or changed after `since` and the ids of
+    deleted ones, in change order. Keep calling with the returned cursor
+    while has_more is true; a device that was offline only pays for what
+    changed in the meantime.
+    """
+    rows = db.query(
+        Prescription.id,
+        Prescription.filename,
+        Prescription.created_at,
+        Prescription.structured_data,
+        Prescription.change_seq
+    ).filter(
+        Prescription.user_id == current_user.id,
+        Prescription.change_seq > since
+    ).order_by(Prescription.change_seq).limit(limit + 1).all()
     
+    tombstones = db.query(
+        PrescriptionTombstone.prescription_id,
+        PrescriptionTombstone.change_seq
+    ).filter(
+        PrescriptionTombstone.user_id == current_user.id,
+        PrescriptionTombstone.change_seq > since
+    ).order_by(PrescriptionTombstone.change_seq).limit(limit + 1).all()
+    
+    merged = sorted(
+        [(row.change_seq, row, False) for row in rows]
+        + [(row.change_seq, row, True) for row in tombstones],
+        key=lambda item: item[0]
+    )
+    page = merged[:limit]
+    
+    changes = []
+    deleted = []
+    for _, row, is_tombstone in page:
+        if is_tombstone:
+            deleted.append(row.prescription_id)
+        else:
+            changes.append({
+                "prescription_id": row.id,
+                "filename": row.filename,
+                "created_at": row.created_at,
+                "data": row.structured_data,
+                "change_seq": row.change_seq
+            })
+    
+    media_type = serialization.negotiate(accept)
+    return Response(
+        content=serialization.encode({
+            "changes": changes,
+            "deleted": deleted,
+            "cursor": page[-1][0] if page else since,
+            "has_more": len(merged) > limit
+        }, media_type),
+        media_type=media_type,
+        headers={"Vary": "Accept"}
+    )
+
+@router.get("/export")
+async def export_history(
+    format: str = Query("ndjson", description="ndjson, csv or parquet"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Export the full prescription history, one record per medication.
+    The response is streamed, so memory use does not grow with history size.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be ndjson, csv or parquet")
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export requires pyarrow")
+    
+    user_id = current_user.id
+    # The export opens a short session per page; don't hold this one for the whole stream
+    db.close()
+    
+    return StreamingResponse(
+        stream_export(format, user_id),
+        media_type=EXPORT_FORMATS[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="prescriptions.{format}"'
+        }
+    )
+
+def _prescription_etag(prescription_id: int, change_seq, variant: str, media_type: str) -> str:
+    # change_seq is bumped whenever a row is written, so together with the
+    # id it identifies every version of a prescription.
+    return make_etag(prescription_id, change_seq, variant, media_type)
+
+def _cache_headers(etag: str) -> dict:
+    return {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={settings.PRESCRIPTION_CACHE_MAX_AGE}",
+        "Vary": "Accept",
+    }
+
+def _prescription_payload(prescription: Prescription) -> dict:
+    return {
+        "id": prescription.id,
+        "filename": prescription.filename,
+        "analysis": prescription.analysis,
+        "structured_data": prescription.structured_data,
+        "created_at": prescription.created_at
+    }
+
+def _structured_payload(prescription: Prescription) -> dict:
     if not prescription.structured_data:
         raise HTTPException(
             status_code=404, 
@@ -185,3 +458,96 @@ async def get_structured_data(
         "created_at": prescription.created_at,
         "data": prescription.structured_data
     }
+
+def _find_prescription(db: Session, user_id: int, prescription_id: int, columns: list[str]):
+    """Load the given columns of a prescription, falling back to the cold archive."""
+    for model in (Prescription, PrescriptionArchive):
+        row = db.query(*[getattr(model, name) for name in columns]).filter(
+            model.id == prescription_id,
+            model.user_id == user_id
+        ).first()
+        if row:
+            return row
+    return None
+
+def _conditional_read(
+    db: Session,
+    user_id: int,
+    generation: int,
+    prescription_id: int,
+    if_none_match: Optional[str],
+    variant: str,
+    build_payload,
+    columns: list[str],
+    media_type: str = serialization.JSON
+) -> Response:
+    """
+    Serve a prescription representation with ETag revalidation.
+    Cached bodies are answered without touching the database, and a
+    revalidation miss in the cache only loads the id and change sequence.
+    Only `columns` are loaded (and decompressed) to build the payload.
+    """
+    cache_key = (user_id, generation, prescription_id, variant, media_type)
+    cached = response_cache.get(cache_key)
+    
+    if cached is None:
+        if if_none_match:
+            row = _find_prescription(db, user_id, prescription_id, ["id", "change_seq"])
+            if not row:
+                raise HTTPException(status_code=404, detail="Prescription not found")
+            etag = _prescription_etag(row.id, row.change_seq, variant, media_type)
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers=_cache_headers(etag))
+        
+        prescription = _find_prescription(db, user_id, prescription_id, ["change_seq"] + columns)
+        
+        if not prescription:
+            raise HTTPException(status_code=404, detail="Prescription not found")
+        
+        etag = _prescription_etag(prescription.id, prescription.change_seq, variant, media_type)
+        cached = (etag, serialization.encode(build_payload(prescription), media_type))
+        response_cache.set(cache_key, cached)
+    
+    etag, body = cached
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=_cache_headers(etag))
+    
+    return Response(content=body, media_type=media_type, headers=_cache_headers(etag))
+
+@router.get("/{prescription_id}")
+async def get_prescription(
+    prescription_id: int,
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get a single prescription by ID.
+    Returns the complete prescription data including analysis and structured data.
+    Supports If-None-Match revalidation against the returned ETag.
+    """
+    generation = await history_cache.generation(current_user.id)
+    return _conditional_read(
+        db, current_user.id, generation, prescription_id, if_none_match, "full", _prescription_payload,
+        ["id", "filename", "analysis", "structured_data", "created_at"]
+    )
+
+@router.get("/{prescription_id}/structured")
+async def get_structured_data(
+    prescription_id: int,
+    if_none_match: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get only the structured JSON data for a prescription.
+    This endpoint is optimized for automatic dispensing machines.
+    Supports If-None-Match revalidation against the returned ETag, and
+    returns MessagePack or CBOR instead of JSON when requested via Accept.
+    """
+    generation = await history_cache.generation(current_user.id)
+    return _conditional_read(
+        db, current_user.id, generation, prescription_id, if_none_match, "structured", _structured_payload,
+        ["id", "filename", "structured_data", "created_at"], serialization.negotiate(accept)
+    )
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.models import User
+from app.auth import get_current_user
+from app.usage import daily_usage, usage_summary
+
+router = APIRouter(prefix="/usage", tags=["usage"])
+
+@router.get("")
+async def get_usage(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Model tokens, estimated cost and latency of the user's analyses today,
+    this month and in total, with what is left of any configured budget.
+    """
+    return usage_summary(db, current_user.id)
+
+@router.get("/daily")
+async def get_daily_usage(
+    days: int = Query(30, ge=1, le=366, description="Number of days to return"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """The user's model usage per UTC day, oldest first."""
+    return {"days": daily_usage(db, current_user.id, days)}
@@ -0,0 +1,257 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import HTTPException
+from app.cache import LRUCache
+from app.config import settings
+from app.state import get_state
+from app import metrics
+
+# Fair scheduling of model calls between users.
+#
+# Every analyze request takes one of MODEL_CONCURRENCY slots for its
+# model call. Waiting requests are served in weighted fair queueing order:
+# each request gets a virtual finish tag of
+#   max(virtual time, user's previous tag) + 1 / weight(priority)
+# and the smallest tag goes next. A user with a thousand queued uploads
+# therefore takes turns with everyone else instead of blocking them, and
+# urgent requests advance faster than normal or backfill ones.
+#
+# On top of that, per user:
+#   - MODEL_USER_CONCURRENCY caps how many slots one user holds at once
+#   - MODEL_USER_MAX_QUEUED caps how many requests wait (429 beyond it)
+#   - a token bucket (MODEL_USER_RATE per second, MODEL_USER_BURST) limits
+#     the request rate (429 with Retry-After)
+#
+# X-Priority comes from the client, so only MODEL_PRIORITY_USERS may ask
+# for a class weighted above normal; anyone may lower their own priority.
+#
+# Slots, queues and the per-user caps are per worker process: they pace the
+# calls this worker makes. The token bucket lives in the shared state
+# (app.state), so with STATE_BACKEND=redis the rate limit holds across all
+# workers and nodes.
+
+PRIORITY_HEADER = "X-Priority"
+
+def parse_weights(text: str) -> dict[str, float]:
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name and weight and float(weight) > 0:
+            weights[name] = float(weight)
+    return weights
+
+class WaitStats:
+    """Queue wait times of one user: totals plus the most recent waits."""
+
+    __slots__ = ("count", "total", "max", "recent")
+
+    def __init__(self, keep: int = 100):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent: deque = deque(maxlen=keep)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def summary(self) -> dict:
+        recent = sorted(self.recent)
+
+        def pct(p):
+            return recent[min(len(recent) - 1, int(p / 100 * len(recent)))] if recent else 0.0
+
+        return {
+            "requests": self.count,
+            "mean_wait_seconds": self.total / self.count if self.count else 0.0,
+            "max_wait_seconds": self.max,
+            "p50_wait_seconds": pct(50),
+            "p95_wait_seconds": pct(95),
+        }
+
+class _Waiter:
+    __slots__ = ("user_id", "start", "finish", "future", "abandoned")
+
+    def __init__(self, user_id: int, start: float, finish: float, future: asyncio.Future):
+        self.user_id = user_id
+        self.start = start
+        self.finish = finish
+        self.future = future
+        self.abandoned = False
+
+class FairScheduler:
+    """Weighted fair queueing of model slots across users. Event loop only."""
+
+    def __init__(self, slots: int, per_user: int, max_queued: int, weights: dict[str, float],
+                 queue_timeout: float, stats_users: int = 10_000):
+        self.slots = slots
+        self.per_user = per_user
+        self.max_queued = max_queued
+        self.weights = weights
+        self.queue_timeout = queue_timeout
+        self._virtual = 0.0
+        self._last_finish: dict[int, float] = {}
+        self._heap: list = []
+        self._sequence = itertools.count()
+        self._active = 0
+        self._user_active: Counter = Counter()
+        self._user_waiting: Counter = Counter()
+        self._stats = LRUCache(stats_users)
+
+    def user_status(self, user_id: int) -> dict:
+        stats = self._stats.get(user_id)
+        return {
+            "active": self._user_active[user_id],
+            "waiting": self._user_waiting[user_id],
+            **(stats or WaitStats()).summary(),
+        }
+
+    def status(self) -> dict:
+        return {"slots": self.slots, "active": self._active, "waiting": sum(self._user_waiting.values())}
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, priority: str):
+        """Wait for a model slot in fair order; raises 429/503 HTTPExceptions."""
+        weight = self.weights.get(priority)
+        if weight is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown priority '{priority}'; use one of {', '.join(self.weights)}"
+            )
+        if self._user_waiting[user_id] >= self.max_queued:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many analyses queued for this user",
+                headers={"Retry-After": "5"}
+            )
+
+        start = max(self._virtual, self._last_finish.get(user_id, 0.0))
+        finish = start + 1 / weight
+        self._last_finish[user_id] = finish
+        waiter = _Waiter(user_id, start, finish, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._heap, (finish, next(self._sequence), waiter))
+        self._user_waiting[user_id] += 1
+        metrics.MODEL_QUEUE_WAITING.inc()
+        self._dispatch()
+
+        enqueued = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except BaseException as exc:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as we gave up: hand the slot back
+                self._release(user_id)
+            else:
+                waiter.abandoned = True
+                waiter.future.cancel()
+                self._user_waiting[user_id] -= 1
+                metrics.MODEL_QUEUE_WAITING.dec()
+            if isinstance(exc, asyncio.TimeoutError):
+                raise HTTPException(
+                    status_code=503,
+                    detail="The model is busy; try again shortly",
+                    headers={"Retry-After": "10"}
+                ) from None
+            raise
+
+        waited = time.perf_counter() - enqueued
+        metrics.MODEL_QUEUE_SECONDS.labels(priority).observe(waited)
+        stats = self._stats.get(user_id)
+        if stats is None:
+            stats = WaitStats()
+            self._stats.set(user_id, stats)
+        stats.add(waited)
+        try:
+            yield waited
+        finally:
+            self._release(user_id)
+
+    def _dispatch(self):
+        skipped = []
+        while self._heap and self._active < self.slots:
+            entry = heapq.heappop(self._heap)
+            waiter = entry[2]
+            if waiter.abandoned:
+                continue
+            if self._user_active[waiter.user_id] >= self.per_user:
+                # This user is at their cap; later requests of others may go first
+                skipped.append(entry)
+                continue
+            self._virtual = max(self._virtual, waiter.start)
+            self._active += 1
+            self._user_active[waiter.user_id] += 1
+            self._user_waiting[waiter.user_id] -= 1
+            metrics.MODEL_QUEUE_WAITING.dec()
+            waiter.future.set_result(None)
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+
+    def _release(self, user_id: int):
+        self._active -= 1
+        self._user_active[user_id] -= 1
+        if self._user_active[user_id] <= 0 and self._user_waiting[user_id] <= 0:
+            del self._user_active[user_id]
+            del self._user_waiting[user_id]
+            # An idle user's old tag no longer matters once virtual time passes it
+            if self._last_finish.get(user_id, 0.0) <= self._virtual:
+                self._last_finish.pop(user_id, None)
+        if self._active == 0 and not +self._user_waiting:
+            # Idle: the next busy period starts with a clean slate
+            self._last_finish.clear()
+            self._heap.clear()
+            self._virtual = 0.0
+        self._dispatch()
+
+_scheduler: Optional[FairScheduler] = None
+
+def get_scheduler() -> FairScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = FairScheduler(
+            slots=settings.MODEL_CONCURRENCY,
+            per_user=settings.MODEL_USER_CONCURRENCY,
+            max_queued=settings.MODEL_USER_MAX_QUEUED,
+            weights=parse_weights(settings.MODEL_PRIORITY_WEIGHTS),
+            queue_timeout=settings.MODEL_QUEUE_TIMEOUT,
+        )
+    return _scheduler
+
+def set_scheduler(scheduler: Optional[FairScheduler]):
+    """Replace the process-wide scheduler (None: recreate from settings on next use)."""
+    global _scheduler
+    _scheduler = scheduler
+
+def check_priority(priority: str, username: str):
+    """Reject unknown priorities (400) and raised ones the user may not use (403)."""
+    weights = get_scheduler().weights
+    weight = weights.get(priority)
+    if weight is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown priority '{priority}'; use one of {', '.join(weights)}"
+        )
+    allowed = {name.strip() for name in settings.MODEL_PRIORITY_USERS.split(",") if name.strip()}
+    if weight > weights.get("normal", 1.0) and username not in allowed:
+        raise HTTPException(status_code=403, detail=f"Priority '{priority}' is not enabled for this user")
+
+async def check_rate_limit(user_id: int):
+    """Raise 429 when the user has used up their analyze token bucket."""
+    if settings.MODEL_USER_RATE <= 0:
+        return
+    retry_after = await get_state().take_token(
+        f"ratelimit:analyze:{user_id}", settings.MODEL_USER_RATE, settings.MODEL_USER_BURST
+    )
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429,
+            detail="Analysis rate limit exceeded",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
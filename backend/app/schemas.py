@@ -39,6 +39,8 @@ class MedicationDosage(BaseModel):
     total_quantity: int  # total tablets/doses needed
     before_after_food: Optional[str] = None  # "before", "after", "with", "empty stomach"
     special_instructions: Optional[str] = None
+    drug_id: Optional[str] = None  # Formulary id, set by the server
+    canonical_name: Optional[str] = None  # Formulary name, set by the server
 
 class PatientDetails(BaseModel):
     patient_name: Optional[str] = None
@@ -69,3 +71,6 @@ class PrescriptionAnalysisResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+class StructuredBatchRequest(BaseModel):
+    ids: list[int]
@@ -0,0 +1,74 @@
+from datetime import date, datetime
+from typing import Any, Callable, Optional
+import cbor2
+import msgpack
+import orjson
+
+# Wire formats for machine-facing endpoints. JSON stays the default; the
+# binary formats are only used when a client asks for them in Accept.
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+CBOR = "application/cbor"
+
+_ALIASES = {
+    "application/json": JSON,
+    "application/msgpack": MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+    "application/cbor": CBOR,
+}
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Type is not serializable: {type(value).__name__}")
+
+def _isoformat_dates(value: Any) -> Any:
+    # cbor2 encodes datetimes natively (as tagged values that require a
+    # timezone), so convert them to the same ISO strings JSON clients get.
+    if isinstance(value, dict):
+        return {key: _isoformat_dates(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_isoformat_dates(item) for item in value]
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def encode_json(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default)
+
+def encode_msgpack(content: Any) -> bytes:
+    return msgpack.packb(content, default=_default, use_bin_type=True)
+
+def encode_cbor(content: Any) -> bytes:
+    return cbor2.dumps(_isoformat_dates(content))
+
+ENCODERS: dict[str, Callable[[Any], bytes]] = {
+    JSON: encode_json,
+    MSGPACK: encode_msgpack,
+    CBOR: encode_cbor,
+}
+
+def negotiate(accept: Optional[str]) -> str:
+    """Pick the best supported media type for an Accept header (JSON by default)."""
+    if not accept:
+        return JSON
+
+    best, best_q = JSON, 0.0
+    for position, item in enumerate(accept.split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        candidate = _ALIASES.get(media_type.lower())
+        # Earlier entries win ties, matching the order the client listed them
+        if candidate and q > best_q:
+            best, best_q = candidate, q
+    return best
+
+def encode(content: Any, media_type: str) -> bytes:
+    return ENCODERS[media_type](content)
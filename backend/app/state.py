@@ -0,0 +1,207 @@
+import heapq
+import math
+import threading
+import time
+from typing import Optional
+from app.config import settings
+
+# Key-value state shared by all workers: analyze rate limits, the
+# generation numbers that invalidate cached responses, and idempotency keys.
+#
+# STATE_BACKEND=memory keeps it in this process, which is only correct with
+# a single worker. STATE_BACKEND=redis keeps it in the Redis server at
+# REDIS_URL (any server speaking the Redis protocol), so every worker and
+# node sees the same limits and invalidations. The redis package is only
+# needed for that backend (pip install redis).
+#
+# Values are bytes. Keys are namespaced with REDIS_KEY_PREFIX in Redis.
+
+class StateBackend:
+    """Interface for shared state; see MemoryState for the reference."""
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    async def set_if_absent(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        """Store the value only if the key does not exist; True if it was stored."""
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def incr(self, key: str) -> int:
+        """Add one to an integer value (missing = 0) and return the result."""
+        raise NotImplementedError
+
+    async def take_token(self, key: str, rate: float, burst: float) -> Optional[float]:
+        """
+        Take a token from the bucket at `key`, refilled at `rate` per second
+        up to `burst`. None on success, else seconds until one is available.
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class MemoryState(StateBackend):
+    """State of this process only (single worker)."""
+
+    def __init__(self):
+        self._values: dict[str, tuple[object, Optional[float]]] = {}
+        self._expiry: list[tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def _live(self, key: str, now: float):
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= now:
+            del self._values[key]
+            return None
+        return value
+
+    def _store(self, key: str, value, ttl: Optional[float], now: float):
+        expires = now + ttl if ttl else None
+        self._values[key] = (value, expires)
+        if expires is not None:
+            heapq.heappush(self._expiry, (expires, key))
+        # Forget expired keys so they do not pile up
+        while self._expiry and self._expiry[0][0] <= now:
+            _, expired = heapq.heappop(self._expiry)
+            self._live(expired, now)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._live(key, time.monotonic())
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        with self._lock:
+            self._store(key, value, ttl, time.monotonic())
+
+    async def set_if_absent(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if self._live(key, now) is not None:
+                return False
+            self._store(key, value, ttl, now)
+            return True
+
+    async def delete(self, key: str):
+        with self._lock:
+            self._values.pop(key, None)
+
+    async def incr(self, key: str) -> int:
+        now = time.monotonic()
+        with self._lock:
+            value = int(self._live(key, now) or 0) + 1
+            self._store(key, str(value).encode(), None, now)
+            return value
+
+    async def take_token(self, key: str, rate: float, burst: float) -> Optional[float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._live(key, now) or (burst, now)
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = None
+            if tokens < 1:
+                wait = (1 - tokens) / rate
+            else:
+                tokens -= 1
+            # A bucket that has refilled completely is the same as no bucket
+            self._store(key, (tokens, now), (burst - tokens) / rate + 1, now)
+            return wait
+
+# Token bucket as one atomic step on the server. The caller's clock is
+# passed in, so nodes' clocks should be roughly in sync.
+_TAKE_TOKEN = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens < 1 then
+    wait = (1 - tokens) / rate
+else
+    tokens = tokens - 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+def redis_client():
+    """An asyncio Redis client for REDIS_URL."""
+    try:
+        import redis.asyncio as redis
+    except ImportError:
+        raise RuntimeError("The redis backend needs the redis package (pip install redis)") from None
+    return redis.Redis.from_url(settings.REDIS_URL)
+
+class RedisState(StateBackend):
+    """State in a Redis server, shared by every worker and node using it."""
+
+    def __init__(self, prefix: str = ""):
+        self._redis = redis_client()
+        self._prefix = prefix
+        self._take_token = self._redis.register_script(_TAKE_TOKEN)
+        self._script_loaded = False
+
+    @staticmethod
+    def _ttl_ms(ttl: Optional[float]) -> Optional[int]:
+        return max(1, math.ceil(ttl * 1000)) if ttl else None
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._redis.get(self._prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        await self._redis.set(self._prefix + key, value, px=self._ttl_ms(ttl))
+
+    async def set_if_absent(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        return bool(await self._redis.set(self._prefix + key, value, px=self._ttl_ms(ttl), nx=True))
+
+    async def delete(self, key: str):
+        await self._redis.delete(self._prefix + key)
+
+    async def incr(self, key: str) -> int:
+        return await self._redis.incr(self._prefix + key)
+
+    async def take_token(self, key: str, rate: float, burst: float) -> Optional[float]:
+        if not self._script_loaded:
+            # Load once up front rather than on the first NOSCRIPT error;
+            # the script object still reloads it if the server is flushed
+            await self._redis.script_load(_TAKE_TOKEN)
+            self._script_loaded = True
+        wait = float(await self._take_token(keys=[self._prefix + key], args=[rate, burst, time.time()]))
+        return wait if wait > 0 else None
+
+    async def close(self):
+        await self._redis.aclose()
+
+STATE_BACKENDS = {
+    "memory": MemoryState,
+    "redis": lambda: RedisState(settings.REDIS_KEY_PREFIX),
+}
+
+_state: Optional[StateBackend] = None
+
+def get_state() -> StateBackend:
+    global _state
+    if _state is None:
+        _state = STATE_BACKENDS[settings.STATE_BACKEND]()
+    return _state
+
+def set_state(state: Optional[StateBackend]):
+    """Replace the process-wide state backend (None: recreate from settings on next use)."""
+    global _state
+    _state = state
+
+async def close_state():
+    global _state
+    if _state is not None:
+        state, _state = _state, None
+        await state.close()
@@ -0,0 +1,289 @@
+from collections import Counter
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from typing import Optional
+from sqlalchemy import Date, Integer, String, case, delete, insert, literal, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import Prescription, PrescriptionArchive, UserMedicationStats, UserMonthlyStats
+
+# Per-user medication statistics kept as running totals.
+#
+# Every analyzed prescription is folded into user_medication_stats (one row
+# per user and drug) and user_monthly_stats in the same transaction that
+# stores it, so /prescriptions/stats reads a handful of small rows instead
+# of decoding every structured_data blob. `python -m app.cli rebuild-stats`
+# recomputes both tables from the full history (archive included).
+
+FREQUENCY_PER_DAY = {"QD": 1, "BID": 2, "TID": 3, "QID": 4, "Q8H": 3, "Q12H": 2}
+
+def _as_int(value) -> Optional[int]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def drug_key(medication: dict) -> Optional[str]:
+    """
+    Identity a medication is counted under: its formulary drug id, or the
+    name with case and spacing normalized when it is not in the formulary.
+    """
+    if medication.get("drug_id"):
+        return str(medication["drug_id"])
+    name = medication.get("medicine_name")
+    if not isinstance(name, str):
+        return None
+    return " ".join(name.lower().split()) or None
+
+def _display_name(medication: dict) -> str:
+    return str(medication.get("canonical_name") or medication.get("medicine_name") or "").strip()
+
+def _units(medication: dict) -> int:
+    total = _as_int(medication.get("total_quantity"))
+    if total is not None:
+        return max(total, 0)
+    # Fall back to dose x doses per day x days when the model left it out
+    per_dose = _as_int(medication.get("quantity_per_dose"))
+    per_day = FREQUENCY_PER_DAY.get(str(medication.get("frequency_code") or "").upper())
+    days = _as_int(medication.get("duration_days"))
+    if per_dose and per_day and days:
+        return max(per_dose * per_day * days, 0)
+    return 0
+
+def _start_date(data: dict, created_at: Optional[datetime]) -> date:
+    try:
+        return date.fromisoformat(data.get("prescription_date"))
+    except (TypeError, ValueError):
+        return (created_at or datetime.utcnow()).date()
+
+def summarize_prescription(structured_data, created_at: Optional[datetime]) -> tuple[date, dict]:
+    """
+    Reduce one prescription to its start date and per-drug contributions:
+    {drug_key: {"name", "total_units", "active_until"}}. A drug listed twice
+    on the same prescription still counts as one prescription.
+    """
+    data = structured_data if isinstance(structured_data, dict) else {}
+    start = _start_date(data, created_at)
+    drugs = {}
+    for medication in data.get("medications") or []:
+        if not isinstance(medication, dict):
+            continue
+        key = drug_key(medication)
+        if key is None:
+            continue
+        entry = drugs.setdefault(key, {
+            "name": _display_name(medication),
+            "total_units": 0,
+            "active_until": None,
+        })
+        entry["total_units"] += _units(medication)
+        days = _as_int(medication.get("duration_days"))
+        if days and days > 0:
+            until = start + timedelta(days=days - 1)
+            if entry["active_until"] is None or until > entry["active_until"]:
+                entry["active_until"] = until
+    return start, drugs
+
+def _dialect_insert(db: Session):
+    """The dialect's INSERT with ON CONFLICT, or None if it has none we use."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+def _later(column, value):
+    # NULL-safe max() that works on both SQLite and PostgreSQL
+    return case(
+        (column.is_(None), value),
+        (value.is_(None), column),
+        (value > column, value),
+        else_=column
+    )
+
+def _medication_updates(incoming) -> dict:
+    """Merge an incoming row (`excluded` or bound values) into the stored totals."""
+    return {
+        # Keep the spelling of the most recent prescription
+        "name": case(
+            (incoming.last_prescribed >= UserMedicationStats.last_prescribed, incoming.name),
+            else_=UserMedicationStats.name
+        ),
+        "prescriptions": UserMedicationStats.prescriptions + 1,
+        "total_units": UserMedicationStats.total_units + incoming.total_units,
+        "last_prescribed": _later(UserMedicationStats.last_prescribed, incoming.last_prescribed),
+        "active_until": _later(UserMedicationStats.active_until, incoming.active_until),
+    }
+
+def _update_or_insert(db: Session, model, keys: dict, values: dict, updates: dict):
+    """Upsert for dialects without ON CONFLICT: update the row, else insert it."""
+    match = [getattr(model, name) == value for name, value in keys.items()]
+    if db.execute(update(model).where(*match).values(updates)).rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(insert(model).values(**keys, **values))
+    except IntegrityError:
+        # Another transaction inserted it first
+        db.execute(update(model).where(*match).values(updates))
+
+def record_prescription(db: Session, user_id: int, structured_data, created_at: Optional[datetime] = None):
+    """Fold one new prescription into the user's totals. The caller commits."""
+    start, drugs = summarize_prescription(structured_data, created_at)
+    dialect_insert = _dialect_insert(db)
+    month_key = {"user_id": user_id, "month": start.strftime("%Y-%m")}
+    month_update = {"prescriptions": UserMonthlyStats.prescriptions + 1}
+
+    if dialect_insert is None:
+        _update_or_insert(db, UserMonthlyStats, month_key, {"prescriptions": 1}, month_update)
+    else:
+        month = dialect_insert(UserMonthlyStats).values(**month_key, prescriptions=1)
+        db.execute(month.on_conflict_do_update(index_elements=["user_id", "month"], set_=month_update))
+
+    for key, entry in drugs.items():
+        values = {
+            "name": entry["name"],
+            "prescriptions": 1,
+            "total_units": entry["total_units"],
+            "last_prescribed": start,
+            "active_until": entry["active_until"],
+        }
+        if dialect_insert is None:
+            incoming = SimpleNamespace(
+                name=literal(entry["name"], String),
+                total_units=literal(entry["total_units"], Integer),
+                last_prescribed=literal(start, Date),
+                active_until=literal(entry["active_until"], Date)
+            )
+            _update_or_insert(
+                db, UserMedicationStats, {"user_id": user_id, "drug_key": key}, values,
+                _medication_updates(incoming)
+            )
+            continue
+        stmt = dialect_insert(UserMedicationStats).values(user_id=user_id, drug_key=key, **values)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id", "drug_key"],
+            set_=_medication_updates(stmt.excluded)
+        ))
+
+def rebuild_stats(db: Session, user_id: Optional[int] = None, batch_size: int = 500) -> int:
+    """
+    Recompute the statistics tables from stored prescriptions.
+    History is read in id-ordered batches and only the totals are kept in
+    memory; the old rows are replaced in a single transaction at the end.
+    Returns the number of prescriptions read.
+    """
+    medications: dict[tuple[int, str], dict] = {}
+    months: Counter = Counter()
+    processed = 0
+
+    for model in (PrescriptionArchive, Prescription):
+        last_id = 0
+        while True:
+            query = db.query(
+                model.id, model.user_id, model.created_at, model.structured_data
+            ).filter(model.id > last_id)
+            if user_id is not None:
+                query = query.filter(model.user_id == user_id)
+            rows = query.order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            for row in rows:
+                start, drugs = summarize_prescription(row.structured_data, row.created_at)
+                months[(row.user_id, start.strftime("%Y-%m"))] += 1
+                for key, entry in drugs.items():
+                    totals = medications.get((row.user_id, key))
+                    if totals is None:
+                        medications[(row.user_id, key)] = {
+                            "user_id": row.user_id,
+                            "drug_key": key,
+                            "name": entry["name"],
+                            "prescriptions": 1,
+                            "total_units": entry["total_units"],
+                            "last_prescribed": start,
+                            "active_until": entry["active_until"],
+                        }
+                        continue
+                    totals["prescriptions"] += 1
+                    totals["total_units"] += entry["total_units"]
+                    if start >= totals["last_prescribed"]:
+                        totals["last_prescribed"] = start
+                        totals["name"] = entry["name"]
+                    if entry["active_until"] and (
+                        totals["active_until"] is None or entry["active_until"] > totals["active_until"]
+                    ):
+                        totals["active_until"] = entry["active_until"]
+
+            processed += len(rows)
+            last_id = rows[-1].id
+
+    for model in (UserMedicationStats, UserMonthlyStats):
+        stmt = delete(model)
+        if user_id is not None:
+            stmt = stmt.where(model.user_id == user_id)
+        db.execute(stmt)
+
+    rows = list(medications.values())
+    for offset in range(0, len(rows), batch_size):
+        db.execute(insert(UserMedicationStats), rows[offset:offset + batch_size])
+    monthly = [
+        {"user_id": owner, "month": month, "prescriptions": count}
+        for (owner, month), count in months.items()
+    ]
+    for offset in range(0, len(monthly), batch_size):
+        db.execute(insert(UserMonthlyStats), monthly[offset:offset + batch_size])
+    db.commit()
+    return processed
+
+def active_courses(db: Session, user_id: int, today: Optional[date] = None) -> list[UserMedicationStats]:
+    """Medications whose latest course has not ended yet."""
+    today = today or datetime.utcnow().date()
+    return db.query(UserMedicationStats).filter(
+        UserMedicationStats.user_id == user_id,
+        UserMedicationStats.active_until >= today
+    ).order_by(UserMedicationStats.active_until, UserMedicationStats.drug_key).all()
+
+def user_stats(db: Session, user_id: int, top: int = 10, today: Optional[date] = None) -> dict:
+    """Statistics payload for /prescriptions/stats."""
+    today = today or datetime.utcnow().date()
+
+    medications = db.query(UserMedicationStats).filter(
+        UserMedicationStats.user_id == user_id
+    ).order_by(
+        UserMedicationStats.prescriptions.desc(),
+        UserMedicationStats.total_units.desc(),
+        UserMedicationStats.drug_key
+    ).limit(top).all()
+
+    monthly = db.query(UserMonthlyStats).filter(
+        UserMonthlyStats.user_id == user_id
+    ).order_by(UserMonthlyStats.month).all()
+
+    active = active_courses(db, user_id, today)
+
+    return {
+        "total_prescriptions": sum(row.prescriptions for row in monthly),
+        "top_medications": [
+            {
+                "drug_key": row.drug_key,
+                "name": row.name,
+                "prescriptions": row.prescriptions,
+                "total_units": row.total_units,
+                "last_prescribed": row.last_prescribed,
+            }
+            for row in medications
+        ],
+        "prescriptions_per_month": [
+            {"month": row.month, "prescriptions": row.prescriptions} for row in monthly
+        ],
+        "active_courses": [
+            {"drug_key": row.drug_key, "name": row.name, "active_until": row.active_until}
+            for row in active
+        ],
+    }
@@ -0,0 +1,189 @@
+"""
+Fixtures for exercising the API in-process: an in-memory database, the
+fake model backend and shortcuts for authenticated requests.
+
+TestEnvironment points the app at an in-memory SQLite database created from
+the models (no Alembic, no pharmabot.db) and installs the fake model with
+no delay. Every `transaction()` runs inside one outer transaction that is
+rolled back afterwards: commits made by the endpoints only release a
+savepoint, so each test starts from the same empty schema in microseconds
+instead of recreating it.
+
+tests/conftest.py exposes it as pytest fixtures:
+
+    def test_history(env, client, user, auth_headers):
+        env.create_prescription(user)
+        response = client.get("/prescriptions/history", headers=auth_headers)
+        assert len(response.json()) == 1
+"""
+
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+from app.config import settings
+from app.database import Base, SessionLocal, get_db
+from app.models import Prescription, User
+
+def create_test_engine() -> Engine:
+    """
+    An in-memory SQLite database with the full schema. StaticPool hands the
+    one connection to every session and thread, so they all see the same
+    in-memory data.
+    """
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+    # pysqlite starts transactions lazily and does not support SAVEPOINT
+    # inside them; let SQLAlchemy issue BEGIN itself
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+    Base.metadata.create_all(engine)
+    return engine
+
+def reset_state():
+    """Drop per-process caches and limiter state left over from earlier requests."""
+    from app.model_client import set_model_client
+    from app.routers.prescriptions import history_cache, response_cache
+    from app.scheduler import set_scheduler
+    from app.state import MemoryState, set_state
+
+    response_cache.clear()
+    history_cache.clear()
+    set_scheduler(None)
+    # Rate limit buckets, cache generations and idempotency keys
+    set_state(MemoryState())
+    # Recreated from the current settings on next use
+    set_model_client(None)
+
+class TestEnvironment:
+    """The app wired to an in-memory database and the fake model."""
+
+    # Not a test class, whatever pytest's collection thinks
+    __test__ = False
+
+    def __init__(self, model_latency: float = 0.0, bcrypt_rounds: int = 4):
+        self.model_latency = model_latency
+        self.bcrypt_rounds = bcrypt_rounds
+        self.engine: Optional[Engine] = None
+        self._session: Optional[Session] = None
+        self._saved: dict = {}
+
+    def __enter__(self) -> "TestEnvironment":
+        from app.main import app
+
+        self.app = app
+        self.engine = create_test_engine()
+        self._saved = {
+            "bind": SessionLocal.kw.get("bind"),
+            "MODEL_BACKEND": settings.MODEL_BACKEND,
+            "FAKE_MODEL_LATENCY": settings.FAKE_MODEL_LATENCY,
+            "FAKE_MODEL_JITTER": settings.FAKE_MODEL_JITTER,
+            "BCRYPT_ROUNDS": settings.BCRYPT_ROUNDS,
+            "PASSWORD_HASH_WORKERS": settings.PASSWORD_HASH_WORKERS,
+            "STATE_BACKEND": settings.STATE_BACKEND,
+            "EVENT_BROKER": settings.EVENT_BROKER,
+        }
+        SessionLocal.configure(bind=self.engine)
+        settings.MODEL_BACKEND = "fake"
+        settings.FAKE_MODEL_LATENCY = self.model_latency
+        settings.FAKE_MODEL_JITTER = 0.0
+        # Cheap hashes, computed inline rather than in a process pool
+        settings.BCRYPT_ROUNDS = self.bcrypt_rounds
+        settings.PASSWORD_HASH_WORKERS = 0
+        settings.STATE_BACKEND = "memory"
+        settings.EVENT_BROKER = "memory"
+        reset_state()
+        return self
+
+    def __exit__(self, *exc_info):
+        from app.state import set_state
+
+        self.app.dependency_overrides.clear()
+        SessionLocal.configure(bind=self._saved.pop("bind"))
+        for name, value in self._saved.items():
+            setattr(settings, name, value)
+        reset_state()
+        set_state(None)
+        self.engine.dispose()
+
+    @contextmanager
+    def transaction(self) -> Iterator[Session]:
+        """
+        Run a test inside a transaction that is rolled back at the end.
+        Yields the session the app's get_db (and SessionLocal users) share.
+        """
+        connection = self.engine.connect()
+        outer = connection.begin()
+        SessionLocal.configure(bind=connection, join_transaction_mode="create_savepoint")
+        self._session = SessionLocal()
+
+        def _get_db():
+            yield self._session
+
+        self.app.dependency_overrides[get_db] = _get_db
+        try:
+            yield self._session
+        finally:
+            # Also drops as_user() overrides
+            self.app.dependency_overrides.clear()
+            self._session.close()
+            self._session = None
+            outer.rollback()
+            connection.close()
+            SessionLocal.configure(bind=self.engine, join_transaction_mode="conservative_savepoint")
+            # Ids are reused after the rollback, so cached responses must go too
+            reset_state()
+
+    @property
+    def session(self) -> Session:
+        if self._session is None:
+            raise RuntimeError("Use TestEnvironment.transaction() first")
+        return self._session
+
+    def client(self, **kwargs):
+        """A TestClient for the app (without running the lifespan)."""
+        from fastapi.testclient import TestClient
+
+        return TestClient(self.app, **kwargs)
+
+    def create_user(self, username: str = "user", password: str = "password") -> User:
+        from app.auth import get_password_hash
+
+        user = User(username=username, hashed_password=get_password_hash(password))
+        self.session.add(user)
+        self.session.commit()
+        return user
+
+    def create_prescription(
+        self, user: User, structured_data: Optional[dict] = None, analysis: str = "{}"
+    ) -> Prescription:
+        prescription = Prescription(
+            user_id=user.id,
+            filename="prescription.jpg",
+            analysis=analysis,
+            structured_data=structured_data if structured_data is not None else {"medications": []}
+        )
+        self.session.add(prescription)
+        self.session.commit()
+        return prescription
+
+    def auth_headers(self, user: User) -> dict:
+        from app.auth import create_access_token
+
+        return {"Authorization": f"Bearer {create_access_token({'sub': user.username})}"}
+
+    def as_user(self, user: User):
+        """Skip token checks: requests are made as `user` until the transaction ends."""
+        from app.auth import get_current_user
+
+        self.app.dependency_overrides[get_current_user] = lambda: user
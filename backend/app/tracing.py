@@ -0,0 +1,286 @@
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.config import settings
+
+# Lightweight tracing with OpenTelemetry-compatible export.
+#
+# Every HTTP request gets a root span (continuing a W3C `traceparent` when
+# the caller sends one) and a request id (`X-Request-ID`, generated when
+# absent). Code marks stages with `with span("name"):`, and SQL statements
+# become child spans through SQLAlchemy cursor events. Finished spans are
+# queued and a background thread exports them in OTLP/JSON batches, either
+# appended to TRACE_FILE (one ExportTraceServiceRequest per line) or
+# posted to an OTLP/HTTP collector at TRACE_OTLP_ENDPOINT.
+#
+# With TRACE_EXPORT unset nothing is installed and span() is a no-op.
+
+SERVICE_NAME = "pharmabot-api"
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+# Longest SQL statement text kept on db spans
+MAX_STATEMENT_LENGTH = 500
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+class Span:
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "request_id",
+        "kind", "start_ns", "end_ns", "attributes", "error"
+    )
+
+    def __init__(self, name: str, trace_id: str, parent_id: str, request_id: str, kind: int = KIND_INTERNAL):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.request_id = request_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes: dict = {}
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def end(self):
+        self.end_ns = time.time_ns()
+        if _exporter is not None:
+            _exporter.submit(self)
+
+    def to_otlp(self) -> dict:
+        attributes = dict(self.attributes)
+        if self.request_id:
+            attributes["request.id"] = self.request_id
+        data = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in attributes.items()],
+        }
+        if self.parent_id:
+            data["parentSpanId"] = self.parent_id
+        if self.error is not None:
+            data["status"] = {"code": 2, "message": self.error}
+        return data
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, **attributes):
+    """Time a block as a child of the current span. A no-op outside a trace."""
+    parent = _current.get()
+    if parent is None or _exporter is None:
+        yield None
+        return
+    child = Span(name, parent.trace_id, parent.span_id, parent.request_id, kind)
+    child.attributes.update(attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as exc:
+        child.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        _current.reset(token)
+        child.end()
+
+class _FileSink:
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+
+    def write(self, body: bytes):
+        with open(self.path, "ab") as file:
+            file.write(body + b"\n")
+
+class _OtlpHttpSink:
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+
+    def write(self, body: bytes):
+        request = urllib.request.Request(
+            self.endpoint, data=body, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        urllib.request.urlopen(request, timeout=5).close()
+
+class _Exporter:
+    """Exports finished spans in batches from a background thread."""
+
+    def __init__(self, sink, queue_size: int, batch_size: int = 512):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, finished: Span):
+        try:
+            self._queue.put_nowait(finished)
+        except queue.Full:
+            # Never block a request on tracing
+            self.dropped += 1
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            batch = [first] if first is not None else []
+            stopping = first is None
+            while not stopping and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+            if batch:
+                self._export(batch)
+            if stopping:
+                return
+
+    def _export(self, batch: list[Span]):
+        body = json.dumps({
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": "app.tracing"},
+                    "spans": [finished.to_otlp() for finished in batch],
+                }],
+            }]
+        }, separators=(",", ":")).encode("utf-8")
+        try:
+            self.sink.write(body)
+        except Exception:
+            self.dropped += len(batch)
+
+_exporter: Optional[_Exporter] = None
+
+def tracing_enabled() -> bool:
+    return settings.TRACE_EXPORT in ("file", "otlp")
+
+def start_tracing():
+    global _exporter
+    if _exporter is not None or not tracing_enabled():
+        return
+    sink = _FileSink(settings.TRACE_FILE) if settings.TRACE_EXPORT == "file" else _OtlpHttpSink(settings.TRACE_OTLP_ENDPOINT)
+    _exporter = _Exporter(sink, settings.TRACE_QUEUE_SIZE)
+
+def shutdown_tracing():
+    """Flush queued spans and stop the exporter."""
+    global _exporter
+    if _exporter is not None:
+        exporter, _exporter = _exporter, None
+        exporter.close()
+
+def instrument_engine(engine: Engine) -> None:
+    """Record every SQL statement as a client span of the current span."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        parent = _current.get()
+        if parent is None or _exporter is None:
+            context._trace_span = None
+            return
+        statement_span = Span(
+            statement.split(None, 1)[0].upper() if statement else "SQL",
+            parent.trace_id, parent.span_id, parent.request_id, KIND_CLIENT
+        )
+        statement_span.attributes["db.system"] = conn.dialect.name
+        statement_span.attributes["db.statement"] = statement[:MAX_STATEMENT_LENGTH]
+        context._trace_span = statement_span
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        statement_span = getattr(context, "_trace_span", None)
+        if statement_span is not None:
+            statement_span.end()
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        context = exception_context.execution_context
+        statement_span = getattr(context, "_trace_span", None) if context is not None else None
+        if statement_span is not None:
+            statement_span.error = str(exception_context.original_exception)
+            statement_span.end()
+
+class TracingMiddleware:
+    """Pure ASGI middleware opening the root span of each HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _exporter is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:128] or secrets.token_hex(8)
+        match = _TRACEPARENT.match(headers.get(b"traceparent", b"").decode("latin-1"))
+        trace_id, parent_id = match.groups() if match else (secrets.token_hex(16), "")
+
+        root = Span(f"{scope['method']} {scope['path']}", trace_id, parent_id, request_id, KIND_SERVER)
+        root.attributes["http.method"] = scope["method"]
+        root.attributes["http.target"] = scope["path"]
+        token = _current.set(root)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.attributes["http.status_code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-request-id", request_id.encode("latin-1")),
+                    (b"traceparent", f"00-{trace_id}-{root.span_id}-01".encode("latin-1")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as exc:
+            root.error = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                root.name = f"{scope['method']} {route}"
+                root.attributes["http.route"] = route
+            root.end()
@@ -0,0 +1,169 @@
+import math
+from datetime import date, datetime, timedelta
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models import ModelUsageRecord
+from app import metrics
+
+# Token and cost accounting for model calls.
+#
+# Every analysis stores a model_usage row (tokens from the model's usage
+# metadata, latency, queue wait, image size and the estimated cost at the
+# configured MODEL_*_COST_PER_MTOK prices) in the same transaction as its
+# prescription. Budgets are checked against these rows before a new model
+# call; calls already running are not counted, so a burst of concurrent
+# uploads can overshoot a budget by at most those calls.
+
+def token_counts(usage) -> tuple[int, int, int]:
+    """(prompt, output, total) tokens from a usage_metadata object (missing = 0)."""
+    if usage is None:
+        return 0, 0, 0
+    prompt = getattr(usage, "prompt_token_count", 0) or 0
+    output = getattr(usage, "candidates_token_count", 0) or 0
+    total = getattr(usage, "total_token_count", 0) or prompt + output
+    return prompt, output, total
+
+def call_cost(prompt_tokens: int, output_tokens: int) -> float:
+    return (
+        prompt_tokens * settings.MODEL_INPUT_COST_PER_MTOK
+        + output_tokens * settings.MODEL_OUTPUT_COST_PER_MTOK
+    ) / 1_000_000
+
+def record_usage(
+    db: Session,
+    user_id: int,
+    prescription_id: Optional[int],
+    model: str,
+    usage,
+    image_bytes: int,
+    model_seconds: float,
+    queue_seconds: float = 0.0
+) -> ModelUsageRecord:
+    """Add a model_usage row to the session (committed by the caller)."""
+    prompt, output, total = token_counts(usage)
+    record = ModelUsageRecord(
+        user_id=user_id,
+        prescription_id=prescription_id,
+        model=model,
+        prompt_tokens=prompt,
+        output_tokens=output,
+        total_tokens=total,
+        image_bytes=image_bytes,
+        model_ms=round(model_seconds * 1000, 1),
+        queue_ms=round(queue_seconds * 1000, 1),
+        cost=call_cost(prompt, output)
+    )
+    db.add(record)
+    metrics.MODEL_COST.inc(record.cost)
+    return record
+
+def _period_starts(now: datetime) -> tuple[datetime, datetime, datetime, datetime]:
+    """Start of today, tomorrow, this month and next month (UTC)."""
+    day = datetime(now.year, now.month, now.day)
+    month = datetime(now.year, now.month, 1)
+    next_month = datetime(now.year + (now.month == 12), now.month % 12 + 1, 1)
+    return day, day + timedelta(days=1), month, next_month
+
+_TOTALS = (
+    func.count(ModelUsageRecord.id),
+    func.coalesce(func.sum(ModelUsageRecord.prompt_tokens), 0),
+    func.coalesce(func.sum(ModelUsageRecord.output_tokens), 0),
+    func.coalesce(func.sum(ModelUsageRecord.total_tokens), 0),
+    func.coalesce(func.sum(ModelUsageRecord.cost), 0.0),
+    func.coalesce(func.sum(ModelUsageRecord.image_bytes), 0),
+    func.avg(ModelUsageRecord.model_ms),
+)
+
+def _totals(row) -> dict:
+    calls, prompt, output, total, cost, image_bytes, model_ms = row
+    return {
+        "calls": calls,
+        "prompt_tokens": int(prompt),
+        "output_tokens": int(output),
+        "total_tokens": int(total),
+        "cost": round(float(cost), 6),
+        "image_bytes": int(image_bytes),
+        "mean_model_ms": round(float(model_ms), 1) if model_ms is not None else None,
+    }
+
+def _user_totals(db: Session, user_id: int, since: Optional[datetime] = None) -> dict:
+    query = db.query(*_TOTALS).filter(ModelUsageRecord.user_id == user_id)
+    if since is not None:
+        query = query.filter(ModelUsageRecord.created_at >= since)
+    return _totals(query.one())
+
+def _budgets() -> dict:
+    return {
+        "day": {"tokens": settings.USAGE_DAILY_TOKEN_BUDGET, "cost": settings.USAGE_DAILY_COST_BUDGET},
+        "month": {"tokens": settings.USAGE_MONTHLY_TOKEN_BUDGET, "cost": settings.USAGE_MONTHLY_COST_BUDGET},
+    }
+
+def check_budget(db: Session, user_id: int, now: Optional[datetime] = None):
+    """Raise 429 when the user has used up a daily or monthly budget."""
+    budgets = _budgets()
+    if not any(limit for period in budgets.values() for limit in period.values()):
+        return
+    now = now or datetime.utcnow()
+    day, next_day, month, next_month = _period_starts(now)
+    for period, since, resets in (("day", day, next_day), ("month", month, next_month)):
+        limits = budgets[period]
+        if not limits["tokens"] and not limits["cost"]:
+            continue
+        used = _user_totals(db, user_id, since)
+        if (limits["tokens"] and used["total_tokens"] >= limits["tokens"]) or \
+                (limits["cost"] and used["cost"] >= limits["cost"]):
+            raise HTTPException(
+                status_code=429,
+                detail=f"Model usage budget for this {period} is used up",
+                headers={"Retry-After": str(math.ceil((resets - now).total_seconds()))}
+            )
+
+def usage_summary(db: Session, user_id: int, now: Optional[datetime] = None) -> dict:
+    """Today's, this month's and all-time usage with the budgets that apply."""
+    now = now or datetime.utcnow()
+    day, _, month, _ = _period_starts(now)
+    today = _user_totals(db, user_id, day)
+    this_month = _user_totals(db, user_id, month)
+    budgets = _budgets()
+
+    def remaining(period: str, used: dict) -> dict:
+        limits = budgets[period]
+        return {
+            "tokens": max(limits["tokens"] - used["total_tokens"], 0) if limits["tokens"] else None,
+            "cost": round(max(limits["cost"] - used["cost"], 0.0), 6) if limits["cost"] else None,
+        }
+
+    return {
+        "today": {**today, "remaining": remaining("day", today)},
+        "month": {**this_month, "remaining": remaining("month", this_month)},
+        "total": _user_totals(db, user_id),
+        "budgets": budgets,
+        "prices_per_mtok": {
+            "prompt": settings.MODEL_INPUT_COST_PER_MTOK,
+            "output": settings.MODEL_OUTPUT_COST_PER_MTOK,
+        },
+    }
+
+def daily_usage(db: Session, user_id: int, days: int, today: Optional[date] = None) -> list[dict]:
+    """Usage per UTC day for the last `days` days, oldest first (days without calls omitted)."""
+    today = today or datetime.utcnow().date()
+    since = datetime.combine(today - timedelta(days=days - 1), datetime.min.time())
+    day = func.date(ModelUsageRecord.created_at)
+    rows = db.query(day, *_TOTALS).filter(
+        ModelUsageRecord.user_id == user_id,
+        ModelUsageRecord.created_at >= since
+    ).group_by(day).order_by(day).all()
+    return [{"day": str(row[0]), **_totals(row[1:])} for row in rows]
+
+def users_usage(db: Session, since: Optional[datetime] = None) -> list[dict]:
+    """Usage per user across all users, most expensive first."""
+    query = db.query(ModelUsageRecord.user_id, *_TOTALS)
+    if since is not None:
+        query = query.filter(ModelUsageRecord.created_at >= since)
+    rows = query.group_by(ModelUsageRecord.user_id).order_by(
+        func.sum(ModelUsageRecord.cost).desc()
+    ).all()
+    return [{"user_id": row[0], **_totals(row[1:])} for row in rows]
@@ -0,0 +1,62 @@
+# Gunicorn settings for running the API in production:
+#
+#   gunicorn -c gunicorn.conf.py app.main:app
+#
+# Uvicorn workers (from the uvicorn-worker package; uvicorn.workers is
+# deprecated) serve the ASGI app with uvloop and httptools (installed with
+# uvicorn[standard]). The app is imported once in the master and
+# forked into the workers, so startup work and read-only data like the
+# formulary index are shared between them.
+#
+# Signals to the master (pid in GUNICORN_PID_FILE):
+#   TTIN / TTOU  add / remove a worker (TTOU stops the oldest)
+#   HUP          replace all workers gracefully (code is not reloaded with preload)
+#   USR2, QUIT   start a new master with new code, then stop the old one
+#
+# `python dev.py --rolling-restart` replaces the workers one at a time,
+# only retiring an old worker once its replacement answers /health.
+
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+pidfile = os.getenv("GUNICORN_PID_FILE", "gunicorn.pid")
+
+# Each worker starts its own password hashing pool; share the cores out
+# between them (the app reads this when the master preloads it)
+os.environ.setdefault("PASSWORD_HASH_WORKERS", str(max(1, (os.cpu_count() or 1) // workers)))
+
+# Connections waiting to be accepted across all workers
+backlog = int(os.getenv("GUNICORN_BACKLOG", "2048"))
+# Seconds an idle keep-alive connection stays open. Behind a proxy, set it
+# above the proxy's upstream idle timeout so the proxy closes first.
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Workers are restarted if they stop heartbeating for this long. Model
+# calls run on the thread pool, so long analyze requests do not count.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+# Time in-flight requests get to finish on restart or shutdown
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+# Recycle workers after this many requests (0 = never), staggered by the jitter
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+
+accesslog = None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+def when_ready(server):
+    # Build the lookup indexes once in the master so every worker inherits them
+    from app.formulary import get_formulary
+    from app.interactions import get_interactions
+
+    get_formulary()
+    get_interactions()
+
+def post_fork(server, worker):
+    # Connections opened in the master while preloading must not be shared
+    # with the forked workers
+    from app.database import engine
+
+    engine.dispose(close=False)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Formulary lookup benchmark
+
+Builds a synthetic formulary of --drugs entries (each with a few brand
+synonyms), then times index compilation and per-name exact, prefix and
+fuzzy (misspelled) lookups, plus memoized lookups as seen by the analyze
+pipeline. The bundled data/formulary.csv is timed as well.
+
+Usage (from backend/):
+  python scripts/bench_formulary.py
+  python scripts/bench_formulary.py --drugs 100000 --queries 200
+"""
+
+import argparse
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import settings
+from app.formulary import Formulary, load_formulary
+
+CONSONANTS = "bcdfghklmnprstvxz"
+VOWELS = "aeiou"
+
+def make_name(rng: random.Random) -> str:
+    # Pronounceable 6-12 letter names, like drug and brand names
+    return "".join(
+        rng.choice(CONSONANTS) + rng.choice(VOWELS) for _ in range(rng.randint(3, 6))
+    )
+
+def misspell(name: str, rng: random.Random) -> str:
+    chars = list(name)
+    position = rng.randrange(len(chars))
+    operation = rng.choice(["drop", "swap", "replace"])
+    if operation == "drop":
+        del chars[position]
+    elif operation == "swap" and position < len(chars) - 1:
+        chars[position], chars[position + 1] = chars[position + 1], chars[position]
+    else:
+        chars[position] = rng.choice(string.ascii_lowercase)
+    return "".join(chars)
+
+def synthetic_entries(drugs: int, seed: int):
+    rng = random.Random(seed)
+    entries = []
+    for index in range(drugs):
+        canonical = make_name(rng)
+        entries.append((f"drug-{index}", canonical.title(), [make_name(rng).title() for _ in range(3)], None))
+    return entries
+
+def per_call_us(func, names) -> float:
+    started = time.perf_counter()
+    for name in names:
+        func(name)
+    return (time.perf_counter() - started) / len(names) * 1e6
+
+def report(label: str, formulary: Formulary, entries, queries: int, seed: int):
+    rng = random.Random(seed + 1)
+    sample = [rng.choice(entries) for _ in range(queries)]
+    exact_names = [rng.choice([canonical, *synonyms]) for _, canonical, synonyms, _ in sample]
+    misspelled = [misspell(name.lower(), rng) for name in exact_names]
+    prefixes = [name[:3] for name in exact_names]
+
+    hits = sum(1 for name in misspelled if formulary.fuzzy(name))
+    print(f"{label}: {len(formulary)} names, {formulary.drugs} drugs")
+    print(f"  exact   {per_call_us(formulary.exact, exact_names):8.2f} us")
+    print(f"  prefix  {per_call_us(formulary.prefix, prefixes):8.2f} us")
+    print(f"  fuzzy   {per_call_us(formulary.fuzzy, misspelled):8.2f} us  ({hits / len(misspelled):.0%} resolved)")
+    # Memoized: the second pass over the same names
+    for name in misspelled:
+        formulary.lookup(name)
+    print(f"  memo    {per_call_us(formulary.lookup, misspelled):8.2f} us")
+
+def main():
+    parser = argparse.ArgumentParser(description="Formulary index benchmark")
+    parser.add_argument("--drugs", type=int, default=20000, help="Synthetic formulary size")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if settings.FORMULARY_PATH and Path(settings.FORMULARY_PATH).exists():
+        started = time.perf_counter()
+        bundled = load_formulary(settings.FORMULARY_PATH)
+        print(f"Loaded {settings.FORMULARY_PATH} in {(time.perf_counter() - started) * 1e3:.1f} ms")
+        from app.formulary import _read_entries
+        report("bundled", bundled, _read_entries(settings.FORMULARY_PATH), args.queries, args.seed)
+
+    entries = synthetic_entries(args.drugs, args.seed)
+    started = time.perf_counter()
+    formulary = Formulary(entries, memo_size=args.queries * 2)
+    print(f"Compiled {args.drugs} synthetic drugs in {time.perf_counter() - started:.2f}s")
+    report("synthetic", formulary, entries, args.queries, args.seed)
+
+if __name__ == "__main__":
+    main()
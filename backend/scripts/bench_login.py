@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Login throughput benchmark
+
+Fires a burst of concurrent /auth/login requests at the app in-process and
+measures login throughput, plus the latency of /health requests issued
+during the burst (which should stay flat now that bcrypt no longer runs on
+the shared thread pool).
+
+Usage (from backend/):
+  python scripts/bench_login.py
+  PASSWORD_HASH_WORKERS=0 python scripts/bench_login.py   # hash inline
+  BCRYPT_ROUNDS=10 python scripts/bench_login.py --logins 400
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+def create_users(count: int, password: str):
+    from app.auth import get_password_hash
+    from app.database import Base, SessionLocal, engine
+    from app.models import User
+
+    Base.metadata.create_all(bind=engine)
+    hashed = get_password_hash(password)
+    db = SessionLocal()
+    try:
+        for i in range(count):
+            db.add(User(username=f"bench-user-{i}", hashed_password=hashed))
+        db.commit()
+    finally:
+        db.close()
+
+async def run(args):
+    from app.config import settings
+    from app.hashing import start_pool, shutdown_pool
+    from app.main import app
+
+    create_users(args.users, args.password)
+    start_pool()
+    transport = httpx.ASGITransport(app=app)
+    login_latencies = []
+    health_latencies = []
+    done = asyncio.Event()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def login(i: int):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(
+                    "/auth/login",
+                    data={"username": f"bench-user-{i % args.users}", "password": args.password},
+                )
+                login_latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+
+        async def probe_health():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/health")
+                health_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.01)
+
+        prober = asyncio.create_task(probe_health())
+        started = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(args.logins)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await prober
+
+    shutdown_pool()
+
+    print(f"bcrypt rounds:        {settings.BCRYPT_ROUNDS}")
+    print(f"hash workers:         {settings.PASSWORD_HASH_WORKERS}")
+    print(f"logins:               {args.logins} (concurrency {args.concurrency})")
+    print(f"throughput:           {args.logins / elapsed:.1f} logins/s")
+    print(f"login p50/p95/p99:    "
+          f"{percentile(login_latencies, 50) * 1000:.1f} / "
+          f"{percentile(login_latencies, 95) * 1000:.1f} / "
+          f"{percentile(login_latencies, 99) * 1000:.1f} ms")
+    if health_latencies:
+        print(f"/health p50/p99:      "
+              f"{statistics.median(health_latencies) * 1000:.1f} / "
+              f"{percentile(health_latencies, 99) * 1000:.1f} ms "
+              f"({len(health_latencies)} probes)")
+
+def main():
+    parser = argparse.ArgumentParser(description="PharmaBot login throughput benchmark")
+    parser.add_argument("--logins", type=int, default=200, help="Total login requests")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent logins")
+    parser.add_argument("--users", type=int, default=20, help="Distinct users to create")
+    parser.add_argument("--password", default="bench-password")
+    args = parser.parse_args()
+
+    # Use a throwaway database so the benchmark never touches pharmabot.db.
+    # App imports stay inside functions because spawned hashing workers
+    # re-import this module.
+    db_dir = tempfile.mkdtemp(prefix="pharmabot-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_dir}/bench.db"
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
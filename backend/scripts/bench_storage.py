@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Storage benchmark for compressed prescription columns
+
+Writes the same synthetic prescriptions into two SQLite files, one with
+plain TEXT/JSON columns (the previous schema) and one with the zstd
+CompressedText/CompressedJSON types, then reports file size, column bytes
+and read latency for full scans and single-row lookups.
+
+Usage (from backend/):
+  python scripts/bench_storage.py
+  python scripts/bench_storage.py --rows 50000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import JSON, Column, Integer, MetaData, String, Table, Text, create_engine, func, insert, select
+from app.compression import CompressedJSON, CompressedText
+from samples import sample_structured_data
+
+def build_table(metadata: MetaData, compressed: bool) -> Table:
+    return Table(
+        "prescriptions", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("filename", String),
+        Column("analysis", CompressedText if compressed else Text),
+        Column("structured_data", CompressedJSON if compressed else JSON),
+    )
+
+def populate(path: str, compressed: bool, rows: int):
+    engine = create_engine(f"sqlite:///{path}")
+    metadata = MetaData()
+    table = build_table(metadata, compressed)
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        batch = []
+        for i in range(rows):
+            data = sample_structured_data(1 + i % 5, seed=i)
+            batch.append({
+                "id": i + 1,
+                "filename": f"scan-{i}.jpg",
+                # Model output is usually pretty-printed JSON in a code fence
+                "analysis": "```json\n" + json.dumps(data, indent=2) + "\n```",
+                "structured_data": data,
+            })
+            if len(batch) == 1000:
+                conn.execute(insert(table), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(table), batch)
+    return engine, table
+
+def measure(engine, table, rows: int, lookups: int) -> dict:
+    with engine.connect() as conn:
+        column_bytes = conn.execute(
+            select(func.sum(func.length(table.c.analysis)) + func.sum(func.length(table.c.structured_data)))
+        ).scalar()
+
+        started = time.perf_counter()
+        for _ in conn.execute(select(table.c.id, table.c.analysis, table.c.structured_data)):
+            pass
+        scan = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in conn.execute(select(table.c.id, table.c.filename)):
+            pass
+        scan_narrow = time.perf_counter() - started
+
+        rng = random.Random(0)
+        started = time.perf_counter()
+        for _ in range(lookups):
+            conn.execute(
+                select(table.c.structured_data).where(table.c.id == rng.randint(1, rows))
+            ).scalar()
+        lookup = (time.perf_counter() - started) / lookups
+
+    return {
+        "column_bytes": column_bytes,
+        "file_bytes": os.path.getsize(engine.url.database),
+        "scan_s": scan,
+        "scan_narrow_s": scan_narrow,
+        "lookup_us": lookup * 1e6,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compressed column storage benchmark")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="pharmabot-storage-")
+    results = {}
+    for name, compressed in (("plain", False), ("zstd+dict", True)):
+        engine, table = populate(os.path.join(workdir, f"{name}.db"), compressed, args.rows)
+        results[name] = measure(engine, table, args.rows, args.lookups)
+        engine.dispose()
+
+    plain = results["plain"]
+    print(f"{args.rows} prescriptions")
+    print(f"{'':<12}{'column MB':>11}{'file MB':>9}{'full scan s':>13}{'id scan s':>11}{'lookup us':>11}")
+    for name, result in results.items():
+        print(
+            f"{name:<12}{result['column_bytes'] / 1e6:>11.2f}{result['file_bytes'] / 1e6:>9.2f}"
+            f"{result['scan_s']:>13.3f}{result['scan_narrow_s']:>11.3f}{result['lookup_us']:>11.1f}"
+        )
+    compressed = results["zstd+dict"]
+    print(f"storage saved: {1 - compressed['file_bytes'] / plain['file_bytes']:.0%} of file, "
+          f"{1 - compressed['column_bytes'] / plain['column_bytes']:.0%} of column bytes")
+
+if __name__ == "__main__":
+    main()
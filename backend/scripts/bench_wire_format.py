@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Wire format benchmark for the structured prescription endpoints
+
+Compares the previous response path (jsonable_encoder + json.dumps) with
+the orjson, MessagePack and CBOR encoders in app.serialization: payload
+size (raw and gzip) plus encode/decode time per response.
+
+Usage (from backend/):
+  python scripts/bench_wire_format.py
+  python scripts/bench_wire_format.py --medications 12 --iterations 20000
+"""
+
+import argparse
+import gzip
+import json
+import sys
+import timeit
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cbor2
+import msgpack
+import orjson
+from fastapi.encoders import jsonable_encoder
+from app import serialization
+from samples import sample_structured_data
+
+def stdlib_json(content) -> bytes:
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+FORMATS = [
+    ("json (stdlib)", stdlib_json, json.loads),
+    ("json (orjson)", serialization.encode_json, orjson.loads),
+    ("msgpack", serialization.encode_msgpack, msgpack.unpackb),
+    ("cbor", serialization.encode_cbor, cbor2.loads),
+]
+
+def main():
+    parser = argparse.ArgumentParser(description="Structured endpoint wire format benchmark")
+    parser.add_argument("--medications", type=int, default=4, help="Medications per prescription")
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    payload = {
+        "prescription_id": 42,
+        "filename": "prescription.jpg",
+        "created_at": datetime(2025, 11, 24, 12, 51, 43, 106812),
+        "data": sample_structured_data(args.medications),
+    }
+
+    baseline_size = None
+    print(f"{'format':<16}{'bytes':>8}{'gzip':>8}{'vs json':>9}{'encode us':>11}{'decode us':>11}")
+    for name, encode, decode in FORMATS:
+        body = encode(payload)
+        if baseline_size is None:
+            baseline_size = len(body)
+        encode_us = timeit.timeit(lambda: encode(payload), number=args.iterations) / args.iterations * 1e6
+        decode_us = timeit.timeit(lambda: decode(body), number=args.iterations) / args.iterations * 1e6
+        print(
+            f"{name:<16}{len(body):>8}{len(gzip.compress(body)):>8}"
+            f"{len(body) / baseline_size:>8.0%} {encode_us:>10.1f} {decode_us:>10.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
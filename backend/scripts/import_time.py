@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Import-time report and budget check
+
+Imports a module (app.main by default) in fresh interpreters with
+`python -X importtime`, keeps the fastest run, and reports the total
+import time, the packages that cost the most and the slowest modules of
+the app itself. With a budget file it fails (exit status 1) when the
+import takes longer than allowed or pulls in a module that must only be
+loaded lazily.
+
+Usage (from backend/):
+  python scripts/import_time.py
+  python scripts/import_time.py --budget scripts/import_budget.json
+  python scripts/import_time.py --module app.cli --runs 10 --top 25
+"""
+
+import argparse
+import json
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+def measure(module: str) -> list[tuple[str, int, int, int]]:
+    """(module, self us, cumulative us, depth) for every module imported."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+def total_ms(rows, module: str) -> float:
+    for name, _, cumulative, _ in rows:
+        if name == module:
+            return cumulative / 1000
+    return sum(self_us for _, self_us, _, _ in rows) / 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import time of the app")
+    parser.add_argument("--module", help="Module to import (default: the budget's module, else app.main)")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to try; the fastest is reported")
+    parser.add_argument("--top", type=int, default=15, help="Rows per table")
+    parser.add_argument("--budget", help="JSON budget file with max_ms and forbidden modules")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+    budget = json.loads(Path(args.budget).read_text()) if args.budget else None
+    args.module = args.module or (budget or {}).get("module", "app.main")
+
+    # The fastest run discounts bytecode compilation and cold disk caches
+    runs = [measure(args.module) for _ in range(max(1, args.runs))]
+    rows = min(runs, key=lambda run: total_ms(run, args.module))
+    total = total_ms(rows, args.module)
+    imported = {name for name, _, _, _ in rows}
+
+    packages = defaultdict(int)
+    for name, self_us, _, _ in rows:
+        packages[name.split(".")[0]] += self_us
+    top_packages = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]
+    app_modules = sorted(
+        (row for row in rows if row[0] == "app" or row[0].startswith("app.")),
+        key=lambda row: row[2], reverse=True
+    )[:args.top]
+
+    if args.json:
+        print(json.dumps({
+            "module": args.module,
+            "total_ms": total,
+            "modules": len(rows),
+            "packages_ms": {name: us / 1000 for name, us in top_packages},
+            "app_modules_ms": {name: cumulative / 1000 for name, _, cumulative, _ in app_modules},
+        }, indent=2))
+    else:
+        print(f"import {args.module}: {total:.1f} ms, {len(rows)} modules (best of {len(runs)} runs)")
+        print(f"\n{'package':<32}{'self ms':>10}")
+        for name, us in top_packages:
+            print(f"{name:<32}{us / 1000:>10.1f}")
+        print(f"\n{'app module':<32}{'self ms':>10}{'total ms':>10}")
+        for name, self_us, cumulative, _ in app_modules:
+            print(f"{name:<32}{self_us / 1000:>10.1f}{cumulative / 1000:>10.1f}")
+
+    if budget is not None:
+        failures = []
+        if total > budget["max_ms"]:
+            failures.append(f"import took {total:.1f} ms, budget is {budget['max_ms']} ms")
+        for module in budget.get("forbidden", []):
+            if module in imported:
+                failures.append(f"{module} is imported eagerly")
+        if failures:
+            print("\nImport budget exceeded:")
+            for failure in failures:
+                print(f"  {failure}")
+            sys.exit(1)
+        print(f"\nWithin budget ({budget['max_ms']} ms)")
+
+if __name__ == "__main__":
+    main()
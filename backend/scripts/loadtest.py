@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test for the PharmaBot API
+
+Starts the API with the fake model backend on a scratch database (or
+targets a running server with --url), creates users, then drives a mix
+of /auth/login, /auth/refresh, /prescriptions/analyze,
+/prescriptions/history and /prescriptions/{id}/structured at increasing
+concurrency. For every level it reports throughput, p50/p95/p99 latency
+per endpoint, errors and the server's resident memory, and writes the
+results as JSON so runs can be compared.
+
+Usage (from backend/):
+  python scripts/loadtest.py --output results/before.json
+  python scripts/loadtest.py --output results/after.json --compare results/before.json
+  python scripts/loadtest.py --concurrency 1,8,32 --duration 20 --model-latency 0.5
+  python scripts/loadtest.py --mix history=60,structured=30,analyze=10
+  python scripts/loadtest.py --url http://localhost:8000 --server-pid 1234
+
+--compare exits with status 1 when any endpoint's p95 latency rose, or
+throughput fell, by more than --threshold (default 10%).
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_MIX = "history=35,structured=35,analyze=10,login=10,refresh=10"
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("login", "refresh", "analyze", "history", "structured"):
+            raise SystemExit(f"Unknown endpoint in --mix: {name}")
+        mix[name] = float(weight)
+    return mix
+
+def rss_bytes(pid: int):
+    """Resident memory of a process and its descendants (Linux only)."""
+    total = 0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f"/proc/{current}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as children:
+                    pending.extend(int(child) for child in children.read().split())
+    except (FileNotFoundError, ProcessLookupError):
+        return total or None
+    return total
+
+def sample_image() -> bytes:
+    from PIL import Image, ImageDraw
+
+    # A phone-photo sized JPEG with some structure, so decoding does real work
+    image = Image.new("RGB", (1200, 1600), "white")
+    draw = ImageDraw.Draw(image)
+    rng = random.Random(0)
+    for line in range(60):
+        draw.text((60, 40 + line * 25), "Tab. Napa 500mg  1+0+1  7 days " * 2, fill=(rng.randint(0, 80),) * 3)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _log_tail(path: str, lines: int = 20) -> str:
+    with open(path, encoding="utf-8", errors="replace") as file:
+        return "".join(file.readlines()[-lines:])
+
+def start_server(args, scratch: str):
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(scratch, 'loadtest.db')}",
+        "MODEL_BACKEND": "fake",
+        "FAKE_MODEL_LATENCY": str(args.model_latency),
+        "FAKE_MODEL_JITTER": str(args.model_jitter),
+        # app.logs sets the root logger from LOG_LEVEL, whatever uvicorn's --log-level says
+        "LOG_LEVEL": "WARNING",
+    })
+    if args.bcrypt_rounds:
+        env["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True
+    )
+    port = free_port()
+    # Keep the server's output out of the report; it is shown if startup fails
+    log_path = os.path.join(scratch, "server.log")
+    with open(log_path, "wb") as log:
+        process = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(args.workers), "--log-level", "warning",
+            ],
+            cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"Server exited during startup:\n{_log_tail(log_path)}")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise SystemExit(f"Server did not become healthy within 60s:\n{_log_tail(log_path)}")
+
+class UserState:
+    def __init__(self, username: str, password: str):
+        self.username = username
+        self.password = password
+        self.access_token = ""
+        self.refresh_token = ""
+        self.prescription_ids: list[int] = []
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.access_token}"}
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, image: bytes):
+        self.client = client
+        self.image = image
+
+    async def login(self, user: UserState) -> httpx.Response:
+        response = await self.client.post(
+            "/auth/login", data={"username": user.username, "password": user.password}
+        )
+        if response.status_code == 200:
+            tokens = response.json()
+            user.access_token = tokens["access_token"]
+            user.refresh_token = tokens["refresh_token"]
+        return response
+
+    async def refresh(self, user: UserState) -> httpx.Response:
+        response = await self.client.post("/auth/refresh", json={"refresh_token": user.refresh_token})
+        if response.status_code == 200:
+            tokens = response.json()
+            user.access_token = tokens["access_token"]
+            user.refresh_token = tokens["refresh_token"]
+        return response
+
+    async def analyze(self, user: UserState) -> httpx.Response:
+        response = await self.client.post(
+            "/prescriptions/analyze",
+            headers=user.headers,
+            files={"file": ("prescription.jpg", self.image, "image/jpeg")},
+        )
+        if response.status_code == 200:
+            user.prescription_ids.append(response.json()["id"])
+        return response
+
+    async def history(self, user: UserState) -> httpx.Response:
+        return await self.client.get("/prescriptions/history", headers=user.headers)
+
+    async def structured(self, user: UserState) -> httpx.Response:
+        prescription_id = random.choice(user.prescription_ids)
+        return await self.client.get(f"/prescriptions/{prescription_id}/structured", headers=user.headers)
+
+async def setup_users(test: LoadTest, count: int, seed_prescriptions: int) -> list[UserState]:
+    run = datetime.utcnow().strftime("%H%M%S")
+    users = [UserState(f"loadtest-{run}-{i}", "loadtest-password") for i in range(count)]
+
+    async def prepare(user: UserState):
+        (await test.client.post(
+            "/auth/register", json={"username": user.username, "password": user.password}
+        )).raise_for_status()
+        (await test.login(user)).raise_for_status()
+        for _ in range(seed_prescriptions):
+            (await test.analyze(user)).raise_for_status()
+
+    await asyncio.gather(*(prepare(user) for user in users))
+    return users
+
+async def run_level(test: LoadTest, users: list[UserState], mix: dict, concurrency: int,
+                    duration: float, server_pid) -> dict:
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    rss_samples = []
+    deadline = time.monotonic() + duration
+
+    async def worker(index: int):
+        rng = random.Random(index)
+        user = users[index % len(users)]
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await getattr(test, name)(user)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            elapsed = time.perf_counter() - started
+            if failed:
+                errors[name] += 1
+            else:
+                latencies[name].append(elapsed)
+
+    async def watch_memory():
+        while time.monotonic() < deadline:
+            rss = rss_bytes(server_pid) if server_pid else None
+            if rss:
+                rss_samples.append(rss)
+            await asyncio.sleep(0.5)
+
+    started = time.monotonic()
+    await asyncio.gather(watch_memory(), *(worker(i) for i in range(concurrency)))
+    elapsed = time.monotonic() - started
+
+    endpoints = {}
+    for name in names:
+        values = latencies[name]
+        endpoints[name] = {
+            "requests": len(values),
+            "errors": errors[name],
+            "throughput": len(values) / elapsed,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+        }
+    all_values = [value for values in latencies.values() for value in values]
+    return {
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "requests": len(all_values),
+        "errors": sum(errors.values()),
+        "throughput": len(all_values) / elapsed,
+        "p50_ms": percentile(all_values, 50) * 1000,
+        "p95_ms": percentile(all_values, 95) * 1000,
+        "p99_ms": percentile(all_values, 99) * 1000,
+        "rss_mb": max(rss_samples) / 2**20 if rss_samples else None,
+        "endpoints": endpoints,
+    }
+
+def print_level(level: dict):
+    rss = f"{level['rss_mb']:.0f} MB" if level["rss_mb"] else "n/a"
+    print(
+        f"\nconcurrency {level['concurrency']}: {level['throughput']:.1f} req/s, "
+        f"p50 {level['p50_ms']:.1f} ms, p95 {level['p95_ms']:.1f} ms, p99 {level['p99_ms']:.1f} ms, "
+        f"{level['errors']} errors, peak RSS {rss}"
+    )
+    print(f"  {'endpoint':<12}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, stats in level["endpoints"].items():
+        print(
+            f"  {name:<12}{stats['throughput']:>9.1f}{stats['p50_ms']:>10.1f}"
+            f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['errors']:>8}"
+        )
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Describe every endpoint that got slower or lost throughput beyond the threshold."""
+    regressions = []
+    base_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    print(f"\nCompared with {baseline['meta'].get('commit') or 'baseline'} (threshold {threshold:.0%}):")
+    for level in current["levels"]:
+        base = base_levels.get(level["concurrency"])
+        if base is None:
+            continue
+        for name, stats in level["endpoints"].items():
+            old = base["endpoints"].get(name)
+            if not old or not old["requests"] or not stats["requests"]:
+                continue
+            p95_change = stats["p95_ms"] / old["p95_ms"] - 1 if old["p95_ms"] else 0.0
+            throughput_change = stats["throughput"] / old["throughput"] - 1 if old["throughput"] else 0.0
+            flag = ""
+            if p95_change > threshold or throughput_change < -threshold:
+                flag = "  REGRESSION"
+                regressions.append(f"c={level['concurrency']} {name}")
+            print(
+                f"  c={level['concurrency']:<4}{name:<12}p95 {old['p95_ms']:.1f} -> {stats['p95_ms']:.1f} ms "
+                f"({p95_change:+.0%}), {old['throughput']:.1f} -> {stats['throughput']:.1f} req/s "
+                f"({throughput_change:+.0%}){flag}"
+            )
+    return regressions
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run(args, url: str, server_pid) -> dict:
+    mix = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 8)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        test = LoadTest(client, sample_image())
+        users = await setup_users(test, args.users, args.seed_prescriptions)
+        levels = []
+        for concurrency in args.concurrency:
+            level = await run_level(test, users, mix, concurrency, args.duration, server_pid)
+            print_level(level)
+            levels.append(level)
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.utcnow().isoformat(),
+            "url": None if args.url is None else args.url,
+            "mix": mix,
+            "duration": args.duration,
+            "users": args.users,
+            "workers": None if args.url else args.workers,
+            "model_latency": None if args.url else args.model_latency,
+        },
+        "levels": levels,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="PharmaBot end-to-end load test")
+    parser.add_argument("--url", help="Test a running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="Server process to measure RSS of (with --url)")
+    parser.add_argument(
+        "--concurrency", type=lambda text: [int(value) for value in text.split(",")],
+        default=[1, 4, 16, 64], help="Comma-separated concurrency levels (default: 1,4,16,64)"
+    )
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Endpoint weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--seed-prescriptions", type=int, default=3, help="Prescriptions analyzed per user up front")
+    parser.add_argument("--model-latency", type=float, default=1.0, help="Fake model seconds per call")
+    parser.add_argument("--model-jitter", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, default=1, help="Uvicorn workers for the started server")
+    parser.add_argument("--bcrypt-rounds", type=int, help="Override BCRYPT_ROUNDS for the started server")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--output", "-o", help="Write results JSON here")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed regression (default: 0.10)")
+    args = parser.parse_args()
+
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+
+    with tempfile.TemporaryDirectory() as scratch:
+        process = None
+        if args.url:
+            url, server_pid = args.url, args.server_pid
+        else:
+            process, url = start_server(args, scratch)
+            server_pid = process.pid
+        try:
+            results = asyncio.run(run(args, url, server_pid))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"\nResults written to {args.output}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
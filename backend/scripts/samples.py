@@ -0,0 +1,61 @@
+"""Synthetic prescription payloads shared by the benchmark scripts."""
+
+import random
+
+MEDICINES = [
+    ("Napa", "Paracetamol", "500mg", "tablet"),
+    ("Amoxil", "Amoxicillin", "250mg", "capsule"),
+    ("Losectil", "Omeprazole", "20mg", "capsule"),
+    ("Fexo", "Fexofenadine", "120mg", "tablet"),
+    ("Tusca", "Dextromethorphan", "10ml", "syrup"),
+    ("Glucophage", "Metformin", "500mg", "tablet"),
+    ("Ecosprin", "Aspirin", "75mg", "tablet"),
+    ("Atova", "Atorvastatin", "10mg", "tablet"),
+]
+
+FREQUENCIES = [
+    ("Once daily", "QD", ["08:00"]),
+    ("2 times daily", "BID", ["08:00", "20:00"]),
+    ("3 times daily", "TID", ["08:00", "14:00", "20:00"]),
+]
+
+def sample_structured_data(medications: int = 4, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    meds = []
+    for i in range(medications):
+        brand, generic, strength, form = MEDICINES[i % len(MEDICINES)]
+        frequency, code, timing = rng.choice(FREQUENCIES)
+        duration = rng.choice([3, 5, 7, 14, 30])
+        meds.append({
+            "medicine_name": brand,
+            "generic_name": generic,
+            "strength": strength,
+            "dosage_form": form,
+            "quantity_per_dose": 1,
+            "frequency": frequency,
+            "frequency_code": code,
+            "timing": timing,
+            "duration_days": duration,
+            "total_quantity": len(timing) * duration,
+            "before_after_food": rng.choice(["before", "after", None]),
+            "special_instructions": None,
+        })
+    return {
+        "prescription_id": f"RX-{rng.randint(10000, 99999)}",
+        "prescription_date": "2025-11-24",
+        "doctor_name": "Dr. A. Rahman",
+        "doctor_registration": "BMDC-A-12345",
+        "hospital_clinic": "Dhaka Medical College Hospital",
+        "patient": {
+            "patient_name": "Patient Name",
+            "patient_age": rng.randint(1, 90),
+            "patient_gender": rng.choice(["male", "female"]),
+            "patient_id": None,
+        },
+        "medications": meds,
+        "diagnosis": "Acute upper respiratory tract infection",
+        "allergies": None,
+        "warnings": ["Complete the full course of antibiotics"],
+        "follow_up_date": "2025-12-01",
+        "emergency_contact": None,
+    }
@@ -0,0 +1,46 @@
+import io
+import pytest
+from app.testing import TestEnvironment
+
+@pytest.fixture(scope="session")
+def env():
+    """The app on an in-memory database with the fake model, shared by all tests."""
+    with TestEnvironment() as env:
+        yield env
+
+@pytest.fixture
+def transaction(env):
+    """The test's database session; everything it writes is rolled back afterwards."""
+    with env.transaction() as session:
+        yield session
+
+@pytest.fixture
+def client(env, transaction):
+    return env.client()
+
+@pytest.fixture
+def user(env, transaction):
+    return env.create_user("alice")
+
+@pytest.fixture
+def auth_headers(env, user):
+    return env.auth_headers(user)
+
+@pytest.fixture(scope="session")
+def image_bytes():
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), "white").save(buffer, "PNG")
+    return buffer.getvalue()
+
+@pytest.fixture
+def analyze(client, image_bytes):
+    """POST an image to /prescriptions/analyze with the given headers."""
+    def analyze(headers: dict, **extra_headers):
+        return client.post(
+            "/prescriptions/analyze",
+            headers={**headers, **extra_headers},
+            files={"file": ("prescription.png", image_bytes, "image/png")}
+        )
+    return analyze
@@ -0,0 +1,52 @@
+from app.config import settings
+from app.hashing import get_hash_rounds
+from app.models import User
+
+def register(client, username="bob", password="password"):
+    return client.post("/auth/register", json={"username": username, "password": password})
+
+def login(client, username="bob", password="password"):
+    return client.post("/auth/login", data={"username": username, "password": password})
+
+def test_register_and_login(client):
+    response = register(client)
+    assert response.status_code == 200
+    assert response.json()["username"] == "bob"
+
+    tokens = login(client)
+    assert tokens.status_code == 200
+    me = client.get("/auth/me", headers={"Authorization": f"Bearer {tokens.json()['access_token']}"})
+    assert me.json()["username"] == "bob"
+
+def test_register_duplicate_username(client):
+    register(client)
+    assert register(client).status_code == 400
+
+def test_login_rejects_wrong_password_and_unknown_user(client):
+    register(client)
+    assert login(client, password="wrong").status_code == 401
+    assert login(client, username="nobody").status_code == 401
+
+def test_login_rehashes_at_configured_cost(client, transaction, monkeypatch):
+    register(client)
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", settings.BCRYPT_ROUNDS + 1)
+    assert login(client).status_code == 200
+    transaction.expire_all()
+    user = transaction.query(User).filter(User.username == "bob").one()
+    assert get_hash_rounds(user.hashed_password) == settings.BCRYPT_ROUNDS
+
+def test_refresh_token_issues_new_tokens(client):
+    register(client)
+    refresh_token = login(client).json()["refresh_token"]
+    response = client.post("/auth/refresh", json={"refresh_token": refresh_token})
+    assert response.status_code == 200
+    assert response.json()["refresh_token"] != refresh_token
+    assert client.post("/auth/refresh", json={"refresh_token": "bogus"}).status_code == 401
+
+def test_register_race_returns_400(client, monkeypatch):
+    from app.routers import auth as auth_router
+
+    # Let the check pass as if the other registration had not committed yet
+    monkeypatch.setattr(auth_router, "_username_taken", lambda db, username: False)
+    register(client)
+    assert register(client).status_code == 400
@@ -0,0 +1,40 @@
+import json
+from sqlalchemy import text
+from app.backfill import Checkpoint, run_backfill
+from app.models import Prescription
+from samples import sample_structured_data
+
+def fenced(structured_data: dict) -> str:
+    return f"```json\n{json.dumps(structured_data)}\n```"
+
+def test_reparse_fills_missing_structured_data(env, user, transaction, tmp_path):
+    structured_data = sample_structured_data(2)
+    missing = env.create_prescription(user, analysis=fenced(structured_data))
+    legacy_null = env.create_prescription(user, analysis=fenced(structured_data))
+    unparseable = env.create_prescription(user, analysis="Sorry, I cannot read this image.")
+    complete = env.create_prescription(user, sample_structured_data(1), analysis="not json")
+    ids = [row.id for row in (missing, legacy_null, unparseable, complete)]
+    user_id = user.id
+    missing.structured_data = None
+    unparseable.structured_data = None
+    transaction.commit()
+    # Failed parses as the old uncompressed JSON column stored them
+    transaction.execute(text("UPDATE prescriptions SET structured_data = 'null' WHERE id = :id"), {"id": ids[1]})
+    transaction.commit()
+
+    checkpoint = Checkpoint(str(tmp_path / "backfill.json"))
+    lines = []
+    changed = run_backfill(transaction, checkpoint, stages=("reparse",), batch_size=2, output=lines.append)
+    assert changed == {user_id}
+    assert lines[-1].startswith("reparse prescriptions: 3/3 rows, 2 fixed, 1 skipped, 0 failed")
+
+    transaction.expire_all()
+    for prescription_id in ids[:2]:
+        medications = transaction.get(Prescription, prescription_id).structured_data["medications"]
+        assert [medication["drug_id"] for medication in medications] == ["paracetamol", "amoxicillin"]
+    assert transaction.get(Prescription, ids[2]).structured_data is None
+    assert transaction.get(Prescription, ids[3]).structured_data == sample_structured_data(1)
+
+    # The checkpoint survives the run, so a rerun skips the rows already seen
+    assert Checkpoint(checkpoint.path).get("reparse", "prescriptions") == ids[2]
+    assert run_backfill(transaction, Checkpoint(checkpoint.path), stages=("reparse",), output=lines.append) == set()
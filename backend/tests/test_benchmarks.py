@@ -0,0 +1,44 @@
+"""
+Microbenchmarks of request hot paths. Skipped timing by default; run with
+
+    pytest tests/test_benchmarks.py --benchmark-enable
+"""
+
+import json
+import pytest
+from fastapi import HTTPException
+from app.auth import create_access_token, verify_token
+from app.model_client import parse_analysis
+from app.routers.prescriptions import _load_history_page, history_cache
+from samples import sample_structured_data
+
+ROWS = 100
+
+@pytest.fixture
+def history(env, user):
+    for seed in range(ROWS):
+        env.create_prescription(user, sample_structured_data(4, seed))
+    return user
+
+def test_verify_token(benchmark):
+    token = create_access_token({"sub": "alice"})
+    token_data = benchmark(verify_token, token, HTTPException(status_code=401))
+    assert token_data.username == "alice"
+
+def test_parse_analysis(benchmark):
+    answer = f"```json\n{json.dumps(sample_structured_data(4), indent=2)}\n```"
+    assert benchmark(parse_analysis, answer)["medications"]
+
+def test_history_serialization(benchmark, transaction, history):
+    body = benchmark(_load_history_page, transaction, history.id, None, 0)
+    assert len(json.loads(body)) == ROWS
+
+def test_history_request(benchmark, client, env, history):
+    headers = env.auth_headers(history)
+
+    def request():
+        # Bypass the history cache so every request hits the database
+        history_cache.clear()
+        return client.get("/prescriptions/history", headers=headers)
+
+    assert benchmark(request).status_code == 200
@@ -0,0 +1,35 @@
+import csv
+import io
+import orjson
+from app import export
+from samples import sample_structured_data
+
+def test_ndjson_export(env, client, user, auth_headers):
+    first = env.create_prescription(user, sample_structured_data(2))
+    empty = env.create_prescription(user, {"medications": []})
+    env.create_prescription(env.create_user("mallory"), sample_structured_data(1))
+    expected = [(first.id, "Napa"), (first.id, "Amoxil"), (empty.id, None)]
+    user_id = user.id
+
+    response = client.get("/prescriptions/export?format=ndjson", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [orjson.loads(line) for line in response.content.splitlines()]
+    assert [(record["prescription_id"], record["medicine_name"]) for record in records] == expected
+    assert {record["user_id"] for record in records} == {user_id}
+    assert list(records[0]) == [column for column, _ in export.EXPORT_COLUMNS]
+    assert records[0]["medication_index"] == 0
+    assert records[2]["medication_index"] is None
+
+def test_csv_export_pages_through_history(env, client, user, auth_headers, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 2)
+    ids = [env.create_prescription(user, sample_structured_data(1, seed)).id for seed in range(5)]
+
+    response = client.get("/prescriptions/export?format=csv", headers=auth_headers)
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [int(row["prescription_id"]) for row in rows] == ids
+    assert rows[0]["timing"] in ("08:00", "08:00;20:00", "08:00;14:00;20:00")
+
+def test_export_rejects_unknown_format(client, auth_headers):
+    assert client.get("/prescriptions/export?format=xml", headers=auth_headers).status_code == 400
@@ -0,0 +1,38 @@
+import asyncio
+from app.events import get_broker, user_channel
+from app.routers.feed import _feed
+from samples import sample_structured_data
+
+def test_feed_delivers_in_commit_order_when_published_out_of_order(env, user):
+    async def run():
+        received = []
+
+        async def consume():
+            async for event in _feed(user.id, None):
+                if event is not None:
+                    received.append(event["prescription_id"])
+
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        first = env.create_prescription(user, sample_structured_data(1, 1))
+        second = env.create_prescription(user, sample_structured_data(1, 2))
+        # The later commit is published first, as can happen across workers
+        await get_broker().publish(user_channel(user.id), {"cursor": second.change_seq})
+        await asyncio.sleep(0.05)
+        await get_broker().publish(user_channel(user.id), {"cursor": first.change_seq})
+        await asyncio.sleep(0.05)
+        consumer.cancel()
+        return received, [first.id, second.id]
+
+    received, expected = asyncio.run(run())
+    assert received == expected
+
+def test_feed_resumes_after_cursor(env, user):
+    older = env.create_prescription(user, sample_structured_data(1, 1))
+    newer = env.create_prescription(user, sample_structured_data(1, 2))
+
+    async def first_event():
+        async for event in _feed(user.id, older.change_seq):
+            return event
+
+    assert asyncio.run(first_event())["prescription_id"] == newer.id
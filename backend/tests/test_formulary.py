@@ -0,0 +1,39 @@
+from app.formulary import Formulary
+
+FORMULARY = Formulary([
+    ("paracetamol", "Paracetamol", ["Napa", "Acetaminophen"], "analgesic"),
+    ("omeprazole", "Omeprazole", ["Seclo", "Losectil"], "proton pump inhibitor"),
+    ("amoxicillin", "Amoxicillin", ["Amoxil"], "penicillin"),
+    ("amlodipine", "Amlodipine", [], "calcium channel blocker"),
+])
+
+def test_exact_match_ignores_case_and_spacing():
+    match = FORMULARY.lookup("  NAPA ")
+    assert (match.drug_id, match.canonical_name, match.method) == ("paracetamol", "Paracetamol", "exact")
+
+def test_fuzzy_match_tolerates_misspellings():
+    for name, drug_id in (("Paracetamoll", "paracetamol"), ("Omeprazol", "omeprazole"), ("Amoxicilin", "amoxicillin")):
+        match = FORMULARY.lookup(name)
+        assert match.drug_id == drug_id
+        assert match.method == "fuzzy"
+        assert 0 < match.score < 1
+
+def test_fuzzy_match_picks_the_closest_name():
+    # One edit from Amoxil, several from Amlodipine
+    assert FORMULARY.lookup("Amoxyl").drug_id == "amoxicillin"
+
+def test_unknown_names_do_not_match():
+    assert FORMULARY.lookup("Zyrtec") is None
+    # Short names allow a single edit only
+    assert FORMULARY.lookup("Nxpx") is None
+
+def test_normalize_medication_prefers_an_exact_generic_name():
+    medication = FORMULARY.normalize_medication({"medicine_name": "Secl0", "generic_name": "Paracetamol"})
+    assert medication["drug_id"] == "paracetamol"
+    assert FORMULARY.normalize_medication({"medicine_name": "Unknown"})["drug_id"] is None
+
+def test_analyze_normalizes_medications(analyze, auth_headers):
+    medications = analyze(auth_headers).json()["structured_data"]["medications"]
+    assert medications[0]["medicine_name"] == "Napa"
+    assert medications[0]["drug_id"] == "paracetamol"
+    assert medications[0]["canonical_name"] == "Paracetamol"
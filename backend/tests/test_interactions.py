@@ -0,0 +1,42 @@
+from app.formulary import normalize_medications
+from app.interactions import check_prescription
+from app.stats import record_prescription
+
+def prescription(*names: str) -> dict:
+    structured_data = {
+        "medications": [{"medicine_name": name, "duration_days": 7, "total_quantity": 7} for name in names],
+        "warnings": None,
+    }
+    normalize_medications(structured_data)
+    return structured_data
+
+def test_interaction_within_a_prescription(user, transaction):
+    structured_data = prescription("Warfarin", "Ecosprin")
+    warnings = check_prescription(transaction, user.id, structured_data)
+    assert warnings == ["Interaction (major): Warfarin and Aspirin: increased risk of bleeding"]
+    assert structured_data["warnings"] == warnings
+
+def test_interaction_with_an_active_course(user, transaction):
+    record_prescription(transaction, user.id, prescription("Warfarin"))
+    transaction.commit()
+    warnings = check_prescription(transaction, user.id, prescription("Brufen"))
+    assert len(warnings) == 1
+    assert warnings[0].startswith("Interaction (major): Ibuprofen and Warfarin (current course until ")
+
+def test_duplicate_therapy(user, transaction):
+    # Same class on one prescription
+    same_class = check_prescription(transaction, user.id, prescription("Seclo", "Pantoprazole"))
+    assert same_class == [
+        "Duplicate therapy: Omeprazole and Pantoprazole are in the same class (proton pump inhibitor)"
+    ]
+    # The same drug as a course already being taken
+    record_prescription(transaction, user.id, prescription("Napa"))
+    transaction.commit()
+    warnings = check_prescription(transaction, user.id, prescription("Paracetamol"))
+    assert len(warnings) == 1
+    assert warnings[0].startswith("Duplicate therapy: Paracetamol is already being taken until ")
+
+def test_unrelated_medications_have_no_warnings(user, transaction):
+    structured_data = prescription("Napa", "Amoxil", "Not In The Formulary")
+    assert check_prescription(transaction, user.id, structured_data) == []
+    assert structured_data["warnings"] is None
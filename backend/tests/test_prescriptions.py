@@ -0,0 +1,112 @@
+from app.config import settings
+from app.model_client import ModelClient, set_model_client
+from app.models import Prescription
+from samples import sample_structured_data
+
+class FailingModelClient(ModelClient):
+    name = "failing"
+
+    def generate(self, prompt, image):
+        raise RuntimeError("model unavailable")
+
+def test_analyze_stores_prescription(analyze, client, auth_headers, transaction):
+    response = analyze(auth_headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["structured_data"]["medications"]
+    assert transaction.get(Prescription, body["id"]) is not None
+
+def test_analyze_rejects_non_images(client, auth_headers):
+    response = client.post(
+        "/prescriptions/analyze", headers=auth_headers,
+        files={"file": ("notes.txt", b"hello", "text/plain")}
+    )
+    assert response.status_code == 400
+
+def test_analyze_requires_auth(analyze):
+    assert analyze({}).status_code == 401
+
+def test_history_cache_sees_new_prescriptions(analyze, client, auth_headers):
+    analyze(auth_headers)
+    first = client.get("/prescriptions/history", headers=auth_headers).json()
+    analyze(auth_headers)
+    second = client.get("/prescriptions/history", headers=auth_headers).json()
+    assert len(first) == 1
+    assert len(second) == 2
+    assert second[0]["id"] > second[1]["id"]
+
+def test_history_only_lists_own_prescriptions(env, client, user, auth_headers):
+    env.create_prescription(user, sample_structured_data(2))
+    env.create_prescription(env.create_user("mallory"), sample_structured_data(2))
+    assert len(client.get("/prescriptions/history", headers=auth_headers).json()) == 1
+
+def test_prescription_etag_revalidation(env, client, user, auth_headers):
+    prescription = env.create_prescription(user, sample_structured_data(2))
+    response = client.get(f"/prescriptions/{prescription.id}", headers=auth_headers)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    again = client.get(f"/prescriptions/{prescription.id}", headers={**auth_headers, "If-None-Match": etag})
+    assert again.status_code == 304
+
+def test_other_users_prescription_is_not_found(env, client, auth_headers):
+    prescription = env.create_prescription(env.create_user("mallory"), sample_structured_data(2))
+    assert client.get(f"/prescriptions/{prescription.id}", headers=auth_headers).status_code == 404
+
+def test_idempotency_key_replays_first_result(analyze, client, auth_headers, transaction):
+    first = analyze(auth_headers, **{"Idempotency-Key": "upload-1"})
+    second = analyze(auth_headers, **{"Idempotency-Key": "upload-1"})
+    assert first.status_code == second.status_code == 200
+    assert first.json()["id"] == second.json()["id"]
+    assert transaction.query(Prescription).count() == 1
+
+def test_idempotency_key_released_on_failure(analyze, auth_headers):
+    set_model_client(FailingModelClient())
+    assert analyze(auth_headers, **{"Idempotency-Key": "upload-1"}).status_code >= 500
+    set_model_client(None)
+    assert analyze(auth_headers, **{"Idempotency-Key": "upload-1"}).status_code == 200
+
+def test_rate_limit(analyze, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "MODEL_USER_RATE", 0.001)
+    monkeypatch.setattr(settings, "MODEL_USER_BURST", 2)
+    codes = [analyze(auth_headers).status_code for _ in range(3)]
+    assert codes == [200, 200, 429]
+    assert int(analyze(auth_headers).headers["Retry-After"]) > 0
+
+def test_priority_checks_do_not_consume_tokens(env, analyze, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "MODEL_USER_RATE", 0.001)
+    monkeypatch.setattr(settings, "MODEL_USER_BURST", 1)
+    monkeypatch.setattr(settings, "MODEL_PRIORITY_USERS", "desk")
+    assert analyze(auth_headers, **{"X-Priority": "bogus"}).status_code == 400
+    assert analyze(auth_headers, **{"X-Priority": "urgent"}).status_code == 403
+    assert analyze(auth_headers, **{"X-Priority": "backfill"}).status_code == 200
+
+    desk = env.auth_headers(env.create_user("desk"))
+    assert analyze(desk, **{"X-Priority": "urgent"}).status_code == 200
+
+def test_changes_sync(env, client, user, auth_headers):
+    for seed in range(3):
+        env.create_prescription(user, sample_structured_data(2, seed))
+    first = client.get("/prescriptions/changes", params={"since": 0, "limit": 2}, headers=auth_headers).json()
+    assert first["has_more"]
+    rest = client.get("/prescriptions/changes", params={"since": first["cursor"]}, headers=auth_headers).json()
+    assert not rest["has_more"]
+    assert len(first["changes"]) + len(rest["changes"]) == 3
+
+def test_structured_batch_reports_missing_ids(env, client, user, auth_headers):
+    structured_data = sample_structured_data(2)
+    own = env.create_prescription(user, structured_data)
+    empty = env.create_prescription(user, {})
+    other = env.create_prescription(env.create_user("mallory"), sample_structured_data(1))
+    ids = [own.id, empty.id, other.id, 999999]
+
+    response = client.post("/prescriptions/structured:batch", headers=auth_headers, json={"ids": ids})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[str(ids[0])]["data"] == structured_data
+    assert results[str(ids[1])] == {"error": "structured_data_unavailable"}
+    # Other users' prescriptions look the same as ones that do not exist
+    assert results[str(ids[2])] == {"error": "not_found"}
+    assert results[str(ids[3])] == {"error": "not_found"}
+
+    query = ",".join(str(prescription_id) for prescription_id in ids)
+    assert client.get(f"/prescriptions/structured:batch?ids={query}", headers=auth_headers).json()["results"] == results
@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.scheduler import FairScheduler
+
+WEIGHTS = {"urgent": 4.0, "normal": 1.0, "backfill": 0.25}
+
+def scheduler(slots: int = 1, per_user: int = 1, max_queued: int = 32) -> FairScheduler:
+    return FairScheduler(slots, per_user, max_queued, WEIGHTS, queue_timeout=5)
+
+async def take(scheduler: FairScheduler, user_id: int, order: list, priority: str = "normal",
+               hold: asyncio.Event = None):
+    async with scheduler.slot(user_id, priority):
+        order.append(user_id)
+        if hold is not None:
+            await hold.wait()
+        await asyncio.sleep(0)
+
+async def queue(scheduler: FairScheduler, requests: list, order: list) -> list:
+    """Hold the only slot while `requests` (user, priority) queue up, then let them run."""
+    hold = asyncio.Event()
+    tasks = [asyncio.create_task(take(scheduler, 0, order, hold=hold))]
+    await asyncio.sleep(0)
+    for user_id, priority in requests:
+        tasks.append(asyncio.create_task(take(scheduler, user_id, order, priority)))
+        await asyncio.sleep(0)
+    hold.set()
+    await asyncio.gather(*tasks)
+    return order[1:]
+
+def test_users_take_turns():
+    # User 1 queued four uploads before user 2 queued two
+    requests = [(1, "normal")] * 4 + [(2, "normal")] * 2
+    assert asyncio.run(queue(scheduler(), requests, [])) == [1, 2, 1, 2, 1, 1]
+
+def test_weights_favor_urgent_requests():
+    requests = [(1, "normal")] * 3 + [(2, "urgent")] * 3
+    assert asyncio.run(queue(scheduler(), requests, [])) == [2, 2, 2, 1, 1, 1]
+    requests = [(1, "backfill")] * 2 + [(2, "normal")] * 2
+    assert asyncio.run(queue(scheduler(), requests, [])) == [2, 2, 1, 1]
+
+def test_per_user_cap_lets_others_go_first():
+    async def run():
+        fair = scheduler(slots=2, per_user=1)
+        order = []
+        hold = asyncio.Event()
+        first = asyncio.create_task(take(fair, 1, order, hold=hold))
+        await asyncio.sleep(0)
+        # User 1's second request waits at the cap although a slot is free
+        second = asyncio.create_task(take(fair, 1, order))
+        await asyncio.sleep(0)
+        other = asyncio.create_task(take(fair, 2, order))
+        await other
+        assert fair.user_status(1)["waiting"] == 1
+        hold.set()
+        await asyncio.gather(first, second)
+        return order
+
+    assert asyncio.run(run()) == [1, 2, 1]
+
+def test_queue_limit_per_user():
+    async def run():
+        fair = scheduler(max_queued=1)
+        hold = asyncio.Event()
+        running = asyncio.create_task(take(fair, 1, [], hold=hold))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(take(fair, 1, []))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as rejected:
+            await take(fair, 1, [])
+        # Other users still get in line
+        other = asyncio.create_task(take(fair, 2, []))
+        await asyncio.sleep(0)
+        hold.set()
+        await asyncio.gather(running, waiting, other)
+        return rejected.value
+
+    rejected = asyncio.run(run())
+    assert rejected.status_code == 429
+    assert rejected.headers["Retry-After"]
@@ -0,0 +1,168 @@
+"""
+Multi-worker checks of the shared state (STATE_BACKEND=redis and
+EVENT_BROKER=redis): separate API processes on one database and one Redis
+server must behave as one server. Uses fakeredis's TCP server, or a real
+server at TEST_REDIS_URL; skipped when the redis packages are missing.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import httpx
+import pytest
+from loadtest import free_port
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+WORKERS = 2
+BURST = 4
+
+@pytest.fixture(scope="module")
+def redis_url():
+    pytest.importorskip("redis")
+    if os.getenv("TEST_REDIS_URL"):
+        yield os.getenv("TEST_REDIS_URL")
+        return
+    pytest.importorskip("lupa", reason="fakeredis needs lupa for scripts (pip install 'fakeredis[lua]')")
+    fakeredis = pytest.importorskip("fakeredis")
+    port = free_port()
+    server = fakeredis.TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"redis://127.0.0.1:{port}/0"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture(scope="module")
+def workers(redis_url, tmp_path_factory):
+    """HTTP clients for WORKERS separate API processes sharing state."""
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{tmp_path_factory.mktemp('shared-state') / 'shared-state.db'}",
+        "MODEL_BACKEND": "fake",
+        "FAKE_MODEL_LATENCY": "0.05",
+        "BCRYPT_ROUNDS": "4",
+        "PASSWORD_HASH_WORKERS": "0",
+        "STATE_BACKEND": "redis",
+        "EVENT_BROKER": "redis",
+        "REDIS_URL": redis_url,
+        # Keep this run's keys apart from anything else on the server
+        "REDIS_KEY_PREFIX": f"test-{os.getpid()}-{int(time.time())}:",
+        "MODEL_USER_RATE": "0.001",
+        "MODEL_USER_BURST": str(BURST),
+        "FEED_HEARTBEAT_SECONDS": "1",
+        "LOG_LEVEL": "WARNING",
+    })
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True
+    )
+    processes, urls = [], []
+    for _ in range(WORKERS):
+        port = free_port()
+        processes.append(subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+            ],
+            cwd=BACKEND_DIR, env=env
+        ))
+        urls.append(f"http://127.0.0.1:{port}")
+
+    try:
+        deadline = time.monotonic() + 60
+        pending = set(urls)
+        while pending and time.monotonic() < deadline:
+            for url in list(pending):
+                try:
+                    if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                        pending.discard(url)
+                except httpx.HTTPError:
+                    pass
+            time.sleep(0.2)
+        assert not pending, f"Servers did not become healthy: {', '.join(sorted(pending))}"
+
+        clients = [httpx.Client(base_url=url, timeout=30) for url in urls]
+        yield clients
+        for client in clients:
+            client.close()
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+def register(workers, name: str) -> dict:
+    """A new user, registered on one worker and logged in on another."""
+    username = f"{name}-{time.time_ns()}"
+    workers[0].post("/auth/register", json={"username": username, "password": "password"}).raise_for_status()
+    tokens = workers[-1].post("/auth/login", data={"username": username, "password": "password"})
+    tokens.raise_for_status()
+    return {"Authorization": f"Bearer {tokens.json()['access_token']}"}
+
+def analyze(workers, index: int, headers: dict, image: bytes) -> httpx.Response:
+    return workers[index % len(workers)].post(
+        "/prescriptions/analyze", headers=headers,
+        files={"file": ("prescription.png", image, "image/png")}
+    )
+
+def history(workers, index: int, headers: dict) -> list:
+    response = workers[index % len(workers)].get("/prescriptions/history", headers=headers)
+    response.raise_for_status()
+    return response.json()
+
+def test_rate_limit_is_shared(workers, image_bytes):
+    headers = register(workers, "ratelimit")
+    codes = [analyze(workers, index, headers, image_bytes).status_code for index in range(2 * BURST)]
+    assert codes.count(200) == BURST
+    assert codes.count(429) == BURST
+
+def test_idempotency_key_is_shared(workers, image_bytes):
+    headers = {**register(workers, "idempotency"), "Idempotency-Key": "upload-1"}
+    with ThreadPoolExecutor(len(workers)) as pool:
+        first = list(pool.map(lambda index: analyze(workers, index, headers, image_bytes), range(len(workers))))
+    again = [analyze(workers, index, headers, image_bytes) for index in range(len(workers))]
+
+    assert all(response.status_code in (200, 409) for response in first)
+    assert all(response.status_code == 200 for response in again)
+    assert len({response.json()["id"] for response in first + again if response.status_code == 200}) == 1
+    assert len(history(workers, 0, headers)) == 1
+
+def test_cache_invalidation_is_shared(workers, image_bytes):
+    headers = register(workers, "cache")
+    analyze(workers, 0, headers, image_bytes).raise_for_status()
+    # Warm every worker's history cache, then add a prescription through one of them
+    for index in range(len(workers)):
+        history(workers, index, headers)
+    analyze(workers, 0, headers, image_bytes).raise_for_status()
+    assert [len(history(workers, index, headers)) for index in range(len(workers))] == [2] * len(workers)
+
+def test_feed_reaches_other_workers(workers, image_bytes):
+    headers = register(workers, "feed")
+    for index in range(len(workers)):
+        connected = threading.Event()
+        received = threading.Event()
+
+        def listen():
+            try:
+                with workers[index].stream("GET", "/prescriptions/feed", headers=headers) as stream:
+                    connected.set()
+                    for line in stream.iter_lines():
+                        if line.startswith("event: prescription"):
+                            received.set()
+                            return
+            except httpx.HTTPError:
+                # Streams left open are cut when the servers stop
+                pass
+
+        threading.Thread(target=listen, daemon=True).start()
+        assert connected.wait(10)
+        time.sleep(0.5)
+        # Published by the next worker, delivered by this one
+        analyze(workers, index + 1, headers, image_bytes).raise_for_status()
+        assert received.wait(5), f"worker {index} did not receive the event"
@@ -0,0 +1,56 @@
+from datetime import datetime
+from app import stats
+from app.models import UserMedicationStats, UserMonthlyStats
+from app.stats import rebuild_stats, record_prescription
+from samples import sample_structured_data
+
+def snapshot(session, user_id: int):
+    medications = sorted(
+        (row.drug_key, row.name, row.prescriptions, row.total_units, row.last_prescribed, row.active_until)
+        for row in session.query(UserMedicationStats).filter_by(user_id=user_id)
+    )
+    months = sorted(
+        (row.month, row.prescriptions)
+        for row in session.query(UserMonthlyStats).filter_by(user_id=user_id)
+    )
+    return medications, months
+
+def test_incremental_stats_match_rebuild(analyze, auth_headers, user, transaction):
+    user_id = user.id
+    for _ in range(4):
+        assert analyze(auth_headers).status_code == 200
+    incremental = snapshot(transaction, user_id)
+    assert incremental[0]
+
+    assert rebuild_stats(transaction, user_id, batch_size=3) == 4
+    transaction.expire_all()
+    assert snapshot(transaction, user_id) == incremental
+
+def test_update_fallback_matches_upsert(env, user, transaction, monkeypatch):
+    user_id = user.id
+    history = [sample_structured_data(3, seed) for seed in range(3)]
+    history[1]["prescription_date"] = "2025-12-02"
+
+    # Dialects without ON CONFLICT take the UPDATE-then-INSERT path
+    monkeypatch.setattr(stats, "_dialect_insert", lambda db: None)
+    for structured_data in history:
+        env.create_prescription(user, structured_data)
+        record_prescription(transaction, user_id, structured_data, datetime.utcnow())
+    transaction.commit()
+    fallback = snapshot(transaction, user_id)
+
+    rebuild_stats(transaction, user_id)
+    transaction.expire_all()
+    assert snapshot(transaction, user_id) == fallback
+    assert fallback[1] == [("2025-11", 2), ("2025-12", 1)]
+
+def test_stats_endpoint(analyze, client, auth_headers):
+    for _ in range(2):
+        analyze(auth_headers)
+    body = client.get("/prescriptions/stats", headers=auth_headers).json()
+    assert body["total_prescriptions"] == 2
+    # The fake model always lists Napa, which the formulary maps to paracetamol
+    top = {row["drug_key"]: row for row in body["top_medications"]}
+    assert top["paracetamol"]["prescriptions"] == 2
+    assert top["paracetamol"]["name"] == "Paracetamol"
+    assert "paracetamol" in {row["drug_key"] for row in body["active_courses"]}
@@ -0,0 +1,80 @@
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import select, text, type_coerce
+from sqlalchemy.types import NullType
+from app.archive import archive_older_than, compact_legacy_rows
+from app.compression import compress, decompress, is_compressed
+from app.models import Prescription, PrescriptionArchive
+from samples import sample_structured_data
+
+def stored_values(session, prescription_id: int):
+    """The raw analysis and structured_data bytes, bypassing decompression."""
+    table = Prescription.__table__
+    return session.execute(
+        select(
+            type_coerce(table.c.analysis, NullType()),
+            type_coerce(table.c.structured_data, NullType())
+        ).where(table.c.id == prescription_id)
+    ).one()
+
+def test_compress_round_trip():
+    data = json.dumps(sample_structured_data(4)).encode("utf-8")
+    stored = compress(data)
+    assert is_compressed(stored)
+    assert len(stored) < len(data) / 2
+    assert decompress(stored) == data
+    # Legacy uncompressed values pass through
+    assert decompress("plain text") == b"plain text"
+
+def test_columns_are_stored_compressed(env, user, transaction):
+    structured_data = sample_structured_data(3)
+    prescription = env.create_prescription(user, structured_data, analysis="model output " * 50)
+    analysis, stored = stored_values(transaction, prescription.id)
+    assert is_compressed(analysis)
+    assert is_compressed(stored)
+
+    transaction.expire_all()
+    assert transaction.get(Prescription, prescription.id).structured_data == structured_data
+
+def test_compact_rewrites_legacy_rows(env, user, transaction):
+    structured_data = sample_structured_data(2)
+    legacy = env.create_prescription(user)
+    failed = env.create_prescription(user)
+    # What the columns held before compression: plain TEXT, "null" for failed parses
+    transaction.execute(
+        text("UPDATE prescriptions SET analysis = :analysis, structured_data = :data WHERE id = :id"),
+        [
+            {"analysis": "legacy output", "data": json.dumps(structured_data), "id": legacy.id},
+            {"analysis": "unparseable", "data": "null", "id": failed.id},
+        ]
+    )
+    transaction.commit()
+
+    assert compact_legacy_rows(transaction, batch_size=1) == 2
+    analysis, stored = stored_values(transaction, legacy.id)
+    assert is_compressed(analysis)
+    assert is_compressed(stored)
+    assert stored_values(transaction, failed.id)[1] is None
+
+    transaction.expire_all()
+    assert transaction.get(Prescription, legacy.id).analysis == "legacy output"
+    assert transaction.get(Prescription, legacy.id).structured_data == structured_data
+    # Nothing left to rewrite
+    assert compact_legacy_rows(transaction) == 0
+
+def test_archive_moves_old_rows(env, client, user, auth_headers, transaction):
+    structured_data = sample_structured_data(2)
+    old = env.create_prescription(user, structured_data)
+    recent = env.create_prescription(user)
+    old_id, recent_id, user_id = old.id, recent.id, user.id
+    old.created_at = datetime.utcnow() - timedelta(days=400)
+    transaction.commit()
+
+    assert archive_older_than(transaction, 365) == (1, {user_id})
+    assert transaction.get(Prescription, old_id) is None
+    assert transaction.get(Prescription, recent_id) is not None
+    assert transaction.get(PrescriptionArchive, old_id).structured_data == structured_data
+
+    # Archived prescriptions are still served by the structured endpoints
+    response = client.get(f"/prescriptions/structured:batch?ids={old_id}", headers=auth_headers)
+    assert response.json()["results"][str(old_id)]["data"] == structured_data
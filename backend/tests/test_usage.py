@@ -0,0 +1,27 @@
+from app.config import settings
+from app.models import ModelUsageRecord
+
+def test_analyze_records_usage(analyze, client, auth_headers, transaction):
+    prescription_id = analyze(auth_headers).json()["id"]
+    record = transaction.query(ModelUsageRecord).one()
+    assert record.prescription_id == prescription_id
+    assert record.total_tokens == record.prompt_tokens + record.output_tokens > 0
+    assert record.cost > 0
+
+    usage = client.get("/usage", headers=auth_headers).json()
+    assert usage["today"]["total_tokens"] == record.total_tokens
+    assert usage["today"]["remaining"]["tokens"] is None
+
+def test_daily_token_budget_returns_429(analyze, client, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "USAGE_DAILY_TOKEN_BUDGET", 1000)
+    # Calls are let through until the budget is used up, so the first one overshoots it
+    assert analyze(auth_headers).status_code == 200
+    response = analyze(auth_headers)
+    assert response.status_code == 429
+    assert 0 < int(response.headers["Retry-After"]) <= 24 * 3600
+    assert client.get("/usage", headers=auth_headers).json()["today"]["remaining"]["tokens"] == 0
+
+def test_monthly_cost_budget_returns_429(analyze, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "USAGE_MONTHLY_COST_BUDGET", 0.0001)
+    assert analyze(auth_headers).status_code == 200
+    assert analyze(auth_headers).status_code == 429
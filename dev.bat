@@ -69,15 +69,13 @@ if not exist "frontend\node_modules" (
     echo Frontend dependencies installed!
 )
 
-REM Check database
-if not exist "backend\pharmabot.db" (
-    echo Creating database...
-    cd backend
-    call venv\Scripts\activate
-    alembic upgrade head
-    cd ..
-    echo Database created!
-)
+REM Apply migrations (the app no longer creates tables itself)
+echo Applying database migrations...
+cd backend
+call venv\Scripts\activate
+alembic upgrade head
+cd ..
+echo Database schema is up to date
 
 REM Check .env file
 if not exist "backend\.env" (
@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
 """
 PharmaBot Development Server Launcher
-Starts frontend and/or backend in development mode
+Starts frontend and/or backend in development mode, or the backend in
+production mode (gunicorn with uvicorn workers)
 """
 
 import argparse
+import hashlib
+import json
+import logging
+import logging.handlers
 import os
 import platform
 import subprocess
@@ -12,8 +17,12 @@ import sys
 import time
 import signal
 import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, List
+from typing import IO, Optional, List, Tuple
 
 # ANSI color codes
 class Colors:
@@ -35,6 +44,57 @@ def print_warning(msg: str):
 def print_error(msg: str):
     print(f"{Colors.RED}❌ {msg}{Colors.NC}")
 
+# backend.log / frontend.log are rotated at this size, keeping this many old files
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+
+class LogPump:
+    """Copies a server's output to a rotating log file and, once following, to the console"""
+    
+    def __init__(self, name: str, stream: IO[bytes], path: Path, color: str):
+        self.name = name
+        self.stream = stream
+        self.color = color
+        self.following = threading.Event()
+        # Start each run with a fresh log, like the servers used to
+        path.write_text("")
+        self.handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8"
+        )
+        self.thread = threading.Thread(target=self.run, name=f"{name}-logs", daemon=True)
+    
+    def start(self) -> "LogPump":
+        self.thread.start()
+        return self
+    
+    def run(self):
+        for raw in iter(self.stream.readline, b""):
+            line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+            self.handler.handle(logging.makeLogRecord({"msg": line}))
+            if self.following.is_set():
+                print(f"{self.color}[{self.name}]{Colors.NC} {self.render(line)}", flush=True)
+        self.handler.close()
+    
+    @staticmethod
+    def render(line: str) -> str:
+        """Shorten the backend's JSON log lines for the console"""
+        if not line.startswith("{"):
+            return line
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return line
+        if not isinstance(entry, dict) or "message" not in entry:
+            return line
+        level = str(entry.get("level", "info"))
+        color = {"warning": Colors.YELLOW, "error": Colors.RED, "critical": Colors.RED}.get(level, "")
+        text = f"{str(entry.get('ts', ''))[11:23]} {color}{level.upper():<7}{Colors.NC if color else ''} {entry['message']}"
+        if "duration_ms" in entry:
+            text += f" ({entry['duration_ms']} ms)"
+        if "exc" in entry:
+            text += "\n" + entry["exc"]
+        return text
+
 class DevServer:
     def __init__(self):
         self.root_dir = Path(__file__).parent
@@ -43,6 +103,9 @@ class DevServer:
         self.venv_dir = self.backend_dir / "venv"
         self.processes: List[subprocess.Popen] = []
         self.is_windows = platform.system() == "Windows"
+        self.timings: List[Tuple[str, float]] = []
+        self.log_pumps: List[LogPump] = []
+        self.timings_lock = threading.Lock()
         
         # Set up signal handlers
         signal.signal(signal.SIGINT, self.cleanup)
@@ -74,6 +137,48 @@ class DevServer:
         print_info("Cleanup complete")
         sys.exit(0)
     
+    @contextmanager
+    def phase(self, name: str):
+        """Time a startup phase for the summary"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            with self.timings_lock:
+                self.timings.append((name, time.monotonic() - started))
+    
+    def show_timings(self):
+        """Print how long each startup phase took"""
+        if not self.timings:
+            return
+        print_info("Startup phases:")
+        for name, seconds in self.timings:
+            print_info(f"  {name:<24} {seconds:6.1f}s")
+    
+    @staticmethod
+    def deps_hash(*sources: Path) -> str:
+        """Hash of the dependency manifests that exist"""
+        digest = hashlib.sha256()
+        for source in sources:
+            if source.exists():
+                digest.update(source.name.encode())
+                digest.update(source.read_bytes())
+        return digest.hexdigest()
+    
+    def deps_current(self, stamp: Path, *sources: Path) -> bool:
+        """Whether dependencies were installed from the current manifests"""
+        return stamp.exists() and stamp.read_text().strip() == self.deps_hash(*sources)
+    
+    def backend_stamp(self) -> Tuple[Path, Path]:
+        return self.venv_dir / ".requirements.sha256", self.backend_dir / "requirements.txt"
+    
+    def frontend_stamp(self) -> Tuple[Path, Path, Path]:
+        return (
+            self.frontend_dir / "node_modules" / ".dependencies.sha256",
+            self.frontend_dir / "package.json",
+            self.frontend_dir / "package-lock.json",
+        )
+    
     def kill_port(self, port: int):
         """Kill process on given port"""
         try:
@@ -170,80 +275,100 @@ class DevServer:
             return str(self.venv_dir / "Scripts" / "uvicorn.exe")
         return str(self.venv_dir / "bin" / "uvicorn")
     
+    def get_gunicorn_path(self) -> str:
+        """Get gunicorn executable path"""
+        return str(self.venv_dir / "bin" / "gunicorn")
+    
+    def backend_command(self, prod: bool, port: int = 8000) -> List[str]:
+        """Command line for the dev (auto-reload) or production backend"""
+        if prod:
+            return [self.get_gunicorn_path(), "-c", "gunicorn.conf.py", "--bind", f"0.0.0.0:{port}", "app.main:app"]
+        return [self.get_uvicorn_path(), "app.main:app", "--reload", "--host", "0.0.0.0", "--port", str(port)]
+    
+    def backend_env(self, prod: bool, workers: Optional[int] = None) -> dict:
+        """Environment for the backend process"""
+        env = dict(os.environ)
+        # Output goes through a pipe; flush each line so logs follow live
+        env["PYTHONUNBUFFERED"] = "1"
+        if prod and workers:
+            env["WEB_CONCURRENCY"] = str(workers)
+        return env
+    
     def install_backend_deps(self) -> bool:
         """Install backend dependencies"""
-        if not self.venv_dir.exists():
+        if not self.venv_dir.exists() or not Path(self.get_pip_path()).exists():
             if not self.create_venv():
                 return False
-        
-        pip_path = self.get_pip_path()
-        
-        if not Path(pip_path).exists():
-            print_error(f"Pip not found at {pip_path}")
-            if not self.create_venv():
+            try:
+                # Only a fresh venv needs a newer pip
+                print_info("Upgrading pip...")
+                subprocess.run(
+                    [self.get_pip_path(), "install", "--upgrade", "pip"],
+                    check=True,
+                    cwd=self.backend_dir,
+                    capture_output=True
+                )
+            except subprocess.CalledProcessError as e:
+                print_error("Failed to upgrade pip")
+                print(e.stderr.decode())
                 return False
-            pip_path = self.get_pip_path()
         
-        print_warning("Backend dependencies not found. Installing...")
+        print_warning("Backend dependencies missing or requirements.txt changed. Installing...")
         print_info("This may take a few minutes...")
         
         try:
-            # Upgrade pip
-            print_info("Upgrading pip...")
+            # Output is captured because the frontend may be installing at the same time
             subprocess.run(
-                [pip_path, "install", "--upgrade", "pip"],
+                [self.get_pip_path(), "install", "-r", "requirements.txt"],
                 check=True,
                 cwd=self.backend_dir,
                 capture_output=True
             )
-            
-            # Install requirements
-            print_info("Installing backend packages...")
-            subprocess.run(
-                [pip_path, "install", "-r", "requirements.txt"],
-                check=True,
-                cwd=self.backend_dir
-            )
+            stamp, *sources = self.backend_stamp()
+            stamp.write_text(self.deps_hash(*sources))
             print_success("Backend dependencies installed")
             return True
         except subprocess.CalledProcessError as e:
             print_error(f"Failed to install backend dependencies")
             if e.stderr:
-                print(e.stderr.decode())
+                print(e.stderr.decode()[-4000:])
             return False
     
     def install_frontend_deps(self) -> bool:
         """Install frontend dependencies"""
-        print_warning("Frontend dependencies not found. Installing...")
+        print_warning("Frontend dependencies missing or package files changed. Installing...")
         print_info("This may take a few minutes...")
         try:
             subprocess.run(
                 ["npm", "install"],
                 check=True,
-                cwd=self.frontend_dir
+                cwd=self.frontend_dir,
+                capture_output=True
             )
+            stamp, *sources = self.frontend_stamp()
+            stamp.write_text(self.deps_hash(*sources))
             print_success("Frontend dependencies installed")
             return True
         except subprocess.CalledProcessError as e:
             print_error("Failed to install frontend dependencies")
+            if e.stderr:
+                print(e.stderr.decode()[-4000:])
             return False
     
     def check_backend_deps(self) -> bool:
-        """Check if backend dependencies are installed"""
+        """Check if backend dependencies are installed from the current requirements.txt"""
         uvicorn_path = self.get_uvicorn_path()
-        return Path(uvicorn_path).exists()
+        return Path(uvicorn_path).exists() and self.deps_current(*self.backend_stamp())
     
     def check_frontend_deps(self) -> bool:
-        """Check if frontend dependencies are installed"""
-        return (self.frontend_dir / "node_modules").exists()
+        """Check if frontend dependencies are installed from the current package files"""
+        return (self.frontend_dir / "node_modules").exists() and self.deps_current(*self.frontend_stamp())
     
     def setup_database(self) -> bool:
-        """Set up database with migrations"""
-        db_file = self.backend_dir / "pharmabot.db"
-        if db_file.exists():
-            return True
-        
-        print_warning("Database not found. Running migrations...")
+        """Bring the database schema up to date with migrations"""
+        # The app does not create tables itself; Alembic owns the schema.
+        # Upgrading an up-to-date database is a no-op.
+        print_info("Applying database migrations...")
         try:
             python_path = self.get_python_path()
             alembic_path = self.venv_dir / "bin" / "alembic"
@@ -255,7 +380,7 @@ class DevServer:
                 check=True,
                 cwd=self.backend_dir
             )
-            print_success("Database created and migrations applied")
+            print_success("Database schema is up to date")
             return True
         except subprocess.CalledProcessError:
             print_error("Failed to run database migrations")
@@ -297,7 +422,10 @@ class DevServer:
         import urllib.request
         import urllib.error
         
-        for i in range(timeout):
+        # Probe quickly at first, backing off to once a second
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+        while True:
             try:
                 urllib.request.urlopen(url, timeout=1)
                 return True
@@ -305,32 +433,35 @@ class DevServer:
                 # HTTP error means server is responding (e.g., 404, 302)
                 return True
             except (urllib.error.URLError, ConnectionError, OSError):
-                if i < timeout - 1:
-                    time.sleep(1)
-        return False
+                if time.monotonic() + delay > deadline:
+                    return False
+                time.sleep(delay)
+                delay = min(delay * 2, 1.0)
     
-    def start_backend(self) -> bool:
+    def start_backend(self, prod: bool = False, workers: Optional[int] = None) -> bool:
         """Start backend server"""
-        print()
-        print_info("=" * 40)
-        print_success("Starting Backend Server (FastAPI)...")
-        print_info("=" * 40)
+        if prod:
+            print_info("Starting Backend Server (FastAPI, production mode)...")
+        else:
+            print_info("Starting Backend Server (FastAPI)...")
         
-        uvicorn_path = self.get_uvicorn_path()
+        if prod and self.is_windows:
+            print_error("Production mode needs gunicorn, which does not run on Windows")
+            return False
         
         # Start backend
         log_file = self.root_dir / "backend.log"
-        with open(log_file, "w") as f:
-            proc = subprocess.Popen(
-                [uvicorn_path, "app.main:app", "--reload", "--host", "0.0.0.0", "--port", "8000"],
-                cwd=self.backend_dir,
-                stdout=f,
-                stderr=subprocess.STDOUT
-            )
-            self.processes.append(proc)
+        proc = subprocess.Popen(
+            self.backend_command(prod),
+            cwd=self.backend_dir,
+            env=self.backend_env(prod, workers),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT
+        )
+        self.processes.append(proc)
+        self.log_pumps.append(LogPump("backend", proc.stdout, log_file, Colors.BLUE).start())
         
         # Wait for backend to start
-        print_info("Waiting for backend to start...")
         if self.wait_for_server("http://localhost:8000/health"):
             print_success("Backend is ready at http://localhost:8000")
             print_info("API Docs available at http://localhost:8000/docs")
@@ -344,26 +475,142 @@ class DevServer:
                     print(line.rstrip())
             return False
     
+    def worker_pids(self, master_pid: int) -> set:
+        """Pids of the gunicorn workers under a master"""
+        result = subprocess.run(["pgrep", "-P", str(master_pid)], capture_output=True, text=True)
+        return {int(pid) for pid in result.stdout.split()}
+    
+    def wait_for_worker(self, pid: int, url: str, timeout: int = 30) -> bool:
+        """Wait until worker `pid` has itself answered a health check"""
+        import urllib.request
+        import urllib.error
+        
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            # Each probe is a new connection, so the workers take turns answering
+            try:
+                with urllib.request.urlopen(url, timeout=2) as response:
+                    if json.load(response).get("worker") == pid:
+                        return True
+            except (urllib.error.URLError, ConnectionError, OSError, ValueError):
+                pass
+            time.sleep(0.05)
+        return False
+    
+    def rolling_restart(self, timeout: int = 30) -> bool:
+        """Replace production workers one at a time, gated on /health"""
+        pid_file = self.backend_dir / "gunicorn.pid"
+        if not pid_file.exists():
+            print_error("No running production server (backend/gunicorn.pid not found)")
+            return False
+        master_pid = int(pid_file.read_text().strip())
+        old_workers = self.worker_pids(master_pid)
+        if not old_workers:
+            print_error(f"No workers found under gunicorn master {master_pid}")
+            return False
+        
+        print_info(f"Replacing {len(old_workers)} worker(s) of gunicorn master {master_pid}...")
+        remaining = set(old_workers)
+        while remaining:
+            before = self.worker_pids(master_pid)
+            # TTIN starts one extra worker; TTOU then stops the oldest one
+            os.kill(master_pid, signal.SIGTTIN)
+            new_pid = None
+            deadline = time.monotonic() + timeout
+            while new_pid is None and time.monotonic() < deadline:
+                time.sleep(0.1)
+                started = self.worker_pids(master_pid) - before
+                new_pid = min(started) if started else None
+            if new_pid is None or not self.wait_for_worker(new_pid, "http://localhost:8000/health", timeout):
+                print_error(f"New worker {new_pid or '(not started)'} did not become healthy; stopping the rollout")
+                print_info(f"Old workers still serving: {sorted(remaining)}. Send TTOU to {master_pid} to drop the extra worker.")
+                return False
+            os.kill(master_pid, signal.SIGTTOU)
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline and not (remaining - self.worker_pids(master_pid)):
+                time.sleep(0.1)
+            retired = remaining - self.worker_pids(master_pid)
+            remaining -= retired
+            print_success(f"Worker {new_pid} healthy, retired {', '.join(map(str, sorted(retired))) or 'none'}")
+        
+        print_success("All workers replaced")
+        return True
+    
+    def benchmark(self, workers: Optional[int] = None, duration: float = 15.0) -> bool:
+        """Load test the dev and production backends and compare them"""
+        if self.is_windows:
+            print_error("The benchmark runs production mode, which does not run on Windows")
+            return False
+        port = 8001
+        results_dir = self.backend_dir / "results"
+        results_dir.mkdir(exist_ok=True)
+        dev_results = results_dir / "dev.json"
+        prod_results = results_dir / "prod.json"
+        
+        with tempfile.TemporaryDirectory() as scratch:
+            # Both servers use the same freshly migrated scratch database and the fake model
+            env = self.backend_env(True, workers)
+            env["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+            env["MODEL_BACKEND"] = "fake"
+            env["GUNICORN_PID_FILE"] = os.path.join(scratch, "gunicorn.pid")
+            subprocess.run(
+                [self.get_python_path(), "-m", "alembic", "upgrade", "head"],
+                check=True, cwd=self.backend_dir, env=env, capture_output=True
+            )
+            
+            for name, prod, output in (("dev", False, dev_results), ("prod", True, prod_results)):
+                print()
+                print_info(f"Benchmarking {name} server: {' '.join(self.backend_command(prod, port)[1:])}")
+                log_path = results_dir / f"{name}-server.log"
+                with open(log_path, "w") as log:
+                    # Own process group, so reloader and gunicorn workers stop with it
+                    proc = subprocess.Popen(
+                        self.backend_command(prod, port),
+                        cwd=self.backend_dir, env=env, stdout=log, stderr=subprocess.STDOUT,
+                        start_new_session=True
+                    )
+                self.processes.append(proc)
+                try:
+                    if not self.wait_for_server(f"http://localhost:{port}/health"):
+                        print_error(f"The {name} server did not start; see {log_path}")
+                        return False
+                    command = [
+                        self.get_python_path(), "scripts/loadtest.py",
+                        "--url", f"http://localhost:{port}", "--server-pid", str(proc.pid),
+                        "--duration", str(duration), "--output", str(output),
+                    ]
+                    if prod:
+                        command += ["--compare", str(dev_results)]
+                    subprocess.run(command, cwd=self.backend_dir, env=env)
+                finally:
+                    os.killpg(proc.pid, signal.SIGTERM)
+                    try:
+                        proc.wait(timeout=30)
+                    except subprocess.TimeoutExpired:
+                        os.killpg(proc.pid, signal.SIGKILL)
+                        proc.wait()
+                    self.processes.remove(proc)
+        
+        print()
+        print_success(f"Results saved to {dev_results} and {prod_results}")
+        return True
+    
     def start_frontend(self) -> bool:
         """Start frontend server"""
-        print()
-        print_info("=" * 40)
-        print_success("Starting Frontend Server (Next.js)...")
-        print_info("=" * 40)
+        print_info("Starting Frontend Server (Next.js)...")
         
         # Start frontend
         log_file = self.root_dir / "frontend.log"
-        with open(log_file, "w") as f:
-            proc = subprocess.Popen(
-                ["npm", "run", "dev"],
-                cwd=self.frontend_dir,
-                stdout=f,
-                stderr=subprocess.STDOUT
-            )
-            self.processes.append(proc)
+        proc = subprocess.Popen(
+            ["npm", "run", "dev"],
+            cwd=self.frontend_dir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT
+        )
+        self.processes.append(proc)
+        self.log_pumps.append(LogPump("frontend", proc.stdout, log_file, Colors.GREEN).start())
         
         # Wait for frontend to start
-        print_info("Waiting for frontend to start...")
         if self.wait_for_server("http://localhost:3000", timeout=60):
             print_success("Frontend is ready at http://localhost:3000")
             return True
@@ -376,7 +623,7 @@ class DevServer:
                     print(line.rstrip())
             return False
     
-    def show_running_info(self, backend: bool = True, frontend: bool = True):
+    def show_running_info(self, backend: bool = True, frontend: bool = True, prod: bool = False):
         """Show information about running servers"""
         print()
         print_info("=" * 40)
@@ -389,38 +636,69 @@ class DevServer:
         if backend:
             print_info("Backend:  http://localhost:8000")
             print_info("API Docs: http://localhost:8000/docs")
+            if prod:
+                print_info("Rolling restart: python3 dev.py --rolling-restart")
+        
+        self.show_timings()
         
         print()
-        print_info("Logs:")
+        print_info("Logs (shown below, rotated at 5 MB):")
         if backend:
-            print_info("  Backend:  tail -f backend.log")
+            print_info("  Backend:  backend.log")
         if frontend:
-            print_info("  Frontend: tail -f frontend.log")
+            print_info("  Frontend: frontend.log")
         
         print()
         print_warning("Press Ctrl+C to stop server(s)")
         print()
     
-    def tail_logs(self, backend: bool = True, frontend: bool = True):
-        """Tail log files"""
+    def follow_logs(self):
+        """Show server output as it arrives until Ctrl+C or a server exits"""
+        for pump in self.log_pumps:
+            pump.following.set()
         try:
-            files = []
-            if backend and (self.root_dir / "backend.log").exists():
-                files.append(str(self.root_dir / "backend.log"))
-            if frontend and (self.root_dir / "frontend.log").exists():
-                files.append(str(self.root_dir / "frontend.log"))
-            
-            if files:
-                if self.is_windows:
-                    # Windows doesn't have tail, just wait
-                    while True:
-                        time.sleep(1)
-                else:
-                    subprocess.run(["tail", "-f"] + files)
+            while True:
+                for proc in self.processes:
+                    if proc.poll() is not None:
+                        print_error(f"Server process exited with code {proc.returncode}")
+                        self.cleanup()
+                time.sleep(0.5)
         except KeyboardInterrupt:
             pass
     
-    def run(self, start_backend: bool = True, start_frontend: bool = True):
+    def timed(self, name: str, func, *args, **kwargs):
+        with self.phase(name):
+            return func(*args, **kwargs)
+    
+    def run_parallel(self, tasks) -> bool:
+        """Run callables concurrently; True if all of them succeeded"""
+        with ThreadPoolExecutor(max_workers=max(1, len(tasks))) as pool:
+            results = list(pool.map(lambda task: task(), tasks))
+        return all(results)
+    
+    def setup_backend(self) -> bool:
+        """Dependencies, migrations and .env for the backend"""
+        with self.phase("backend dependencies"):
+            if not self.check_backend_deps():
+                if not self.install_backend_deps():
+                    return False
+            else:
+                print_success("Backend dependencies up to date")
+        with self.phase("database migrations"):
+            if not self.setup_database():
+                return False
+        return self.check_env_file()
+    
+    def setup_frontend(self) -> bool:
+        """Dependencies for the frontend"""
+        with self.phase("frontend dependencies"):
+            if not self.check_frontend_deps():
+                return self.install_frontend_deps()
+            print_success("Frontend dependencies up to date")
+        return True
+    
+    def run(self, start_backend: bool = True, start_frontend: bool = True,
+            prod: bool = False, workers: Optional[int] = None):
         """Main run function"""
         print_info("🚀 Starting PharmaBot Development Servers...")
         print()
@@ -438,31 +716,15 @@ class DevServer:
             print_info("Please run this script from the pharmabot_tech directory")
             return False
         
-        # Setup backend
+        # Set up backend and frontend at the same time
+        tasks = []
         if start_backend:
-            # Check and install backend dependencies
-            if not self.check_backend_deps():
-                if not self.install_backend_deps():
-                    return False
-            else:
-                print_success("Backend dependencies found")
-            
-            # Check database
-            if not self.setup_database():
-                return False
-            
-            # Check env file
-            if not self.check_env_file():
-                return False
-        
-        # Setup frontend
+            tasks.append(self.setup_backend)
         if start_frontend:
-            # Check and install frontend dependencies
-            if not self.check_frontend_deps():
-                if not self.install_frontend_deps():
-                    return False
-            else:
-                print_success("Frontend dependencies found")
+            tasks.append(self.setup_frontend)
+        with self.phase("setup (total)"):
+            if not self.run_parallel(tasks):
+                return False
         
         # Kill any existing processes on ports
         if start_backend:
@@ -470,20 +732,23 @@ class DevServer:
         if start_frontend:
             self.kill_port(3000)
         
-        # Start servers
+        # Start servers in parallel
+        print()
+        print_info("=" * 40)
+        print_success("Starting servers...")
+        print_info("=" * 40)
+        starts = []
         if start_backend:
-            if not self.start_backend():
-                self.cleanup()
-                return False
-        
+            starts.append(lambda: self.timed("backend start", self.start_backend, prod=prod, workers=workers))
         if start_frontend:
-            if not self.start_frontend():
-                self.cleanup()
-                return False
+            starts.append(lambda: self.timed("frontend start", self.start_frontend))
+        if not self.run_parallel(starts):
+            self.cleanup()
+            return False
         
         # Show info and tail logs
-        self.show_running_info(backend=start_backend, frontend=start_frontend)
-        self.tail_logs(backend=start_backend, frontend=start_frontend)
+        self.show_running_info(backend=start_backend, frontend=start_frontend, prod=prod)
+        self.follow_logs()
         
         return True
 
@@ -498,6 +763,10 @@ Examples:
   python3 dev.py --frontend-only    # Start only frontend
   python3 dev.py -b                 # Short form for backend only
   python3 dev.py -f                 # Short form for frontend only
+  python3 dev.py -b --prod          # Backend with gunicorn, one worker per core
+  python3 dev.py -b --prod --workers 4
+  python3 dev.py --rolling-restart  # Replace running production workers one by one
+  python3 dev.py --bench            # Load test dev vs production mode
         """
     )
     
@@ -513,15 +782,56 @@ Examples:
         help='Start only the frontend server'
     )
     
+    parser.add_argument(
+        '--prod',
+        action='store_true',
+        help='Run the backend with gunicorn and uvicorn workers instead of --reload'
+    )
+    parser.add_argument(
+        '--workers', '-w',
+        type=int,
+        help='Production workers (default: one per CPU core)'
+    )
+    parser.add_argument(
+        '--rolling-restart',
+        action='store_true',
+        help='Replace the workers of a running production backend one at a time'
+    )
+    parser.add_argument(
+        '--bench',
+        action='store_true',
+        help='Load test the dev and production backends and compare the results'
+    )
+    parser.add_argument(
+        '--bench-duration',
+        type=float,
+        default=15.0,
+        help='Seconds per concurrency level for --bench (default: 15)'
+    )
+    
     args = parser.parse_args()
     
+    if args.rolling_restart:
+        sys.exit(0 if DevServer().rolling_restart() else 1)
+    if args.bench:
+        app = DevServer()
+        try:
+            sys.exit(0 if app.benchmark(args.workers, args.bench_duration) else 1)
+        except KeyboardInterrupt:
+            app.cleanup()
+    
     # Determine what to start
     start_backend = not args.frontend_only
     start_frontend = not args.backend_only
     
     app = DevServer()
     try:
-        success = app.run(start_backend=start_backend, start_frontend=start_frontend)
+        success = app.run(
+            start_backend=start_backend,
+            start_frontend=start_frontend,
+            prod=args.prod,
+            workers=args.workers
+        )
         if not success:
             sys.exit(1)
     except KeyboardInterrupt:
@@ -100,15 +100,13 @@ if [ ! -d "frontend/node_modules" ]; then
     print_success "Frontend dependencies installed"
 fi
 
-# Check if database exists
-if [ ! -f "backend/pharmabot.db" ]; then
-    print_warning "Database not found. Running migrations..."
-    cd backend
-    source venv/bin/activate
-    alembic upgrade head
-    cd ..
-    print_success "Database created and migrations applied"
-fi
+# Apply migrations (the app no longer creates tables itself)
+print_info "Applying database migrations..."
+cd backend
+source venv/bin/activate
+alembic upgrade head
+cd ..
+print_success "Database schema is up to date"
 
 # Check backend .env file
 if [ ! -f "backend/.env" ]; then